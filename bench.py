@@ -0,0 +1,310 @@
+import argparse, csv, json, math, os, platform, random, shutil, subprocess, sys, tempfile, time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from pathlib import Path
+
+# Benchmark harness: synthetic corpus generator + per-stage timings.
+#
+#   python3 bench.py gen --n 5000 --out bench_corpus --scanned 0.1 --distractors 0.2
+#   python3 bench.py run --corpus bench_corpus --report out/bench/report.json
+#   python3 bench.py compare out/bench/base.json out/bench/report.json
+#
+# Invoices reuse the reportlab/Faker templates from make_hu_invoices.py.
+
+STAGES = ("text_extraction", "classification", "field_extraction", "routing", "logging")
+DISTRACTORS = {
+    "contract": ("SZERZŐDÉS", "Vállalkozási szerződés"),
+    "manual": ("Használati útmutató", "Telepítés és karbantartás"),
+    "cv": ("Önéletrajz", "Szakmai tapasztalat"),
+    "minutes": ("Jegyzőkönyv", "Az ülés napirendje"),
+}
+
+# ---------- corpus ----------
+def _invoice(path, i, seed, pages, layout):
+    import make_hu_invoices as mk
+    from reportlab.pdfgen import canvas
+    from reportlab.lib.units import mm
+    random.seed(seed); mk.fake.seed_instance(seed)
+    S, B = mk.company(), mk.company()
+    items = mk.rnd_items()
+    vat = random.choice(mk.VAT_RATES)
+    issue = datetime(2024, 11, 5) + timedelta(days=random.randint(0, 120))
+    H = {"szamla": f"ALG-{100000 + i}", "kibocs": issue.strftime("%Y-%m-%d"),
+         "telj": (issue - timedelta(days=random.randint(0, 5))).strftime("%Y-%m-%d"),
+         "hatar": (issue + timedelta(days=random.choice([8, 14, 30]))).strftime("%Y-%m-%d"),
+         "fizmod": random.choice(["Átutalás", "Készpénz", "Bankkártya"])}
+    layout = layout if layout in ("A", "B") else random.choice("AB")
+    c = canvas.Canvas(str(path))
+    netto, afa, brutto = (mk.draw_A if layout == "A" else mk.draw_B)(c, H, S, B, items, vat)
+    c.showPage()
+    for n in range(2, pages + 1):  # attachment pages: long statements / delivery notes
+        c.setFont(mk.FONT_BOLD, 12); c.drawString(20*mm, 280*mm, f"Melléklet – {n}. oldal")
+        c.setFont(mk.FONT, 9)
+        for k in range(45):
+            c.drawString(20*mm, (270 - 5.5*k)*mm, f"{k+1:3d}. {mk.fake.sentence(nb_words=8)}")
+        c.showPage()
+    c.save()
+    return {"file": path.name, "kind": "invoice", "pages": pages, "layout": layout,
+            "szamlaszam": H["szamla"], "kibocsatas_datum": H["kibocs"],
+            "teljesites_datum": H["telj"], "hatarido": H["hatar"], "fizmod": H["fizmod"],
+            "elado_nev": S["nev"], "elado_adoszam": S["adoszam"], "vevo_nev": B["nev"],
+            "vevo_adoszam": B["adoszam"], "afa_kulcs": vat, "netto_osszeg": netto,
+            "afa_osszeg": afa, "brutto_osszeg": brutto, "valuta": "HUF", "tetelszam": len(items)}
+
+def _distractor(path, i, seed, pages):
+    import make_hu_invoices as mk
+    from reportlab.pdfgen import canvas
+    from reportlab.lib.units import mm
+    random.seed(seed); mk.fake.seed_instance(seed)
+    kind = random.choice(sorted(DISTRACTORS))
+    title, subtitle = DISTRACTORS[kind]
+    c = canvas.Canvas(str(path))
+    for n in range(1, pages + 1):
+        c.setFont(mk.FONT_BOLD, 16); c.drawString(20*mm, 275*mm, title)
+        c.setFont(mk.FONT, 10); c.drawString(20*mm, 265*mm, f"{subtitle} – {n}. oldal")
+        for k in range(40):
+            c.drawString(20*mm, (255 - 6*k)*mm, mk.fake.sentence(nb_words=10))
+        c.showPage()
+    c.save()
+    return {"file": path.name, "kind": kind, "pages": pages, "layout": ""}
+
+def _scan(path, dpi=100, noise=0.02, seed=0):
+    """Rasterise a PDF page by page into an image-only PDF that looks scanned."""
+    from PIL import Image, ImageDraw, ImageFont
+    rnd = random.Random(seed)
+    try:
+        from pdf2image import convert_from_path
+        images = convert_from_path(str(path), dpi=dpi)
+    except Exception:  # no poppler: draw the extracted text instead
+        import doctext
+        font = ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf", 14)
+        images = []
+        for page in doctext.load(path, ocr=False).pages or [""]:
+            img = Image.new("L", (827, 1169), 255)
+            d = ImageDraw.Draw(img)
+            for k, line in enumerate(page.splitlines()[:70]):
+                d.text((40, 40 + 16 * k), line, fill=0, font=font)
+            images.append(img)
+    out = []
+    for img in images:
+        img = img.convert("L").rotate(rnd.uniform(-1.5, 1.5), expand=False, fillcolor=255)
+        px = img.load()
+        w, h = img.size
+        for _ in range(int(w * h * noise)):
+            px[rnd.randrange(w), rnd.randrange(h)] = rnd.choice((0, 90, 180))
+        out.append(img)
+    out[0].save(str(path), "PDF", resolution=dpi, save_all=True, append_images=out[1:])
+
+def _make_one(args):
+    i, out_dir, seed, opts = args
+    rnd = random.Random(seed)
+    pages = rnd.randint(opts["min_pages"], opts["max_pages"])
+    if rnd.random() < opts["distractors"]:
+        row = _distractor(Path(out_dir) / f"doc_{i:06d}.pdf", i, seed, pages)
+    else:
+        row = _invoice(Path(out_dir) / f"szamla_{i:06d}.pdf", i, seed, pages, opts["layout"])
+    row["scanned"] = rnd.random() < opts["scanned"]
+    if row["scanned"]:
+        _scan(Path(out_dir) / row["file"], seed=seed)
+    return row
+
+def generate(out_dir, n, seed=42, min_pages=1, max_pages=1, layout="mixed",
+             scanned=0.0, distractors=0.0, workers=1):
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    opts = {"min_pages": min_pages, "max_pages": max(min_pages, max_pages), "layout": layout,
+            "scanned": scanned, "distractors": distractors}
+    jobs = ((i, str(out_dir), seed * 1_000_003 + i, opts) for i in range(1, n + 1))
+    truth_cols = ["file", "szamlaszam", "kibocsatas_datum", "teljesites_datum", "hatarido", "fizmod",
+                  "elado_nev", "elado_adoszam", "vevo_nev", "vevo_adoszam", "afa_kulcs",
+                  "netto_osszeg", "afa_osszeg", "brutto_osszeg", "valuta", "tetelszam"]
+    with open(out_dir / "manifest.csv", "w", newline="", encoding="utf-8") as mf, \
+         open(out_dir / "ground_truth.csv", "w", newline="", encoding="utf-8") as gf:
+        mw = csv.DictWriter(mf, fieldnames=["file", "kind", "pages", "layout", "scanned"],
+                            extrasaction="ignore")
+        gw = csv.DictWriter(gf, fieldnames=truth_cols, extrasaction="ignore")
+        mw.writeheader(); gw.writeheader()
+        pool = ProcessPoolExecutor(workers) if workers > 1 else None
+        try:
+            rows = pool.map(_make_one, jobs, chunksize=16) if pool else map(_make_one, jobs)
+            for k, row in enumerate(rows, 1):
+                mw.writerow(row)
+                if row["kind"] == "invoice":
+                    gw.writerow(row)
+                if k % 500 == 0:
+                    print(f"  {k}/{n} generated", file=sys.stderr)
+        finally:
+            if pool:
+                pool.shutdown()
+    return out_dir
+
+# ---------- measurement ----------
+def percentile(sorted_vals, q):
+    if not sorted_vals:
+        return 0.0
+    k = math.ceil(q / 100.0 * len(sorted_vals)) - 1  # nearest rank
+    return sorted_vals[max(0, min(len(sorted_vals) - 1, k))]
+
+def summarize(samples: dict, wall: float, docs: int) -> dict:
+    out = {}
+    for stage, vals in samples.items():
+        v = sorted(vals)
+        total = sum(v)
+        out[stage] = {"count": len(v), "total_s": round(total, 4),
+                      "mean_ms": round(1000 * total / len(v), 3) if v else 0.0,
+                      "p50_ms": round(1000 * percentile(v, 50), 3),
+                      "p90_ms": round(1000 * percentile(v, 90), 3),
+                      "p99_ms": round(1000 * percentile(v, 99), 3),
+                      "max_ms": round(1000 * (v[-1] if v else 0.0), 3),
+                      "docs_per_s": round(len(v) / total, 2) if total else None}
+    return {"stages": out, "docs": docs, "wall_s": round(wall, 3),
+            "docs_per_s": round(docs / wall, 2) if wall else None}
+
+def _git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"],
+                                       cwd=Path(__file__).parent, stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        return ""
+
+def run(corpus, limit=None, ocr=False):
+    import doctext
+    from classify import classify
+    from middleware_demo import PATTERNS
+    from quick_check import extract_fields, score_invoice
+    from routing import LogWriter, RouteIndex, route
+
+    files = sorted(Path(corpus).glob("*.pdf"))[:limit]
+    samples = {s: [] for s in STAGES}
+    tmp = Path(tempfile.mkdtemp(prefix="bench_"))
+    cfg = {"paths": {"out_root": str(tmp / "out")}, "routing": {"invoices": "invoices", "other": "other"},
+           "run": {"dry_run": False}}
+    inbox = tmp / "inbox"; inbox.mkdir()
+    index = RouteIndex()
+    log = LogWriter(tmp / "out", batch=100)
+    t_start = time.perf_counter()
+    try:
+        for p in files:
+            t0 = time.perf_counter()
+            doc = doctext.load(p, ocr=ocr)
+            t1 = time.perf_counter()
+            hint = classify(str(p), doc)
+            t2 = time.perf_counter()
+            fields = extract_fields(doc.text, PATTERNS)
+            t3 = time.perf_counter()
+            conf = score_invoice(doc.text, fields)
+            doc_type = "invoice" if conf >= 0.6 else "other"
+            t4 = time.perf_counter()
+            staged = inbox / p.name
+            try:
+                os.link(p, staged)
+            except OSError:
+                shutil.copyfile(p, staged)
+            meta = {"doc_type": doc_type, "file": p.name, "confidence": conf, "hint": hint,
+                    "szamlaszam": fields.get("szamlaszam") or "", **doc.meta()}
+            t5 = time.perf_counter()
+            dest = route(str(staged), doc_type, meta, cfg, index=index)
+            t6 = time.perf_counter()
+            log.write({"src": str(staged), "dest": dest, **meta})
+            t7 = time.perf_counter()
+            samples["text_extraction"].append(t1 - t0)
+            samples["classification"].append((t2 - t1) + (t4 - t3))
+            samples["field_extraction"].append(t3 - t2)
+            samples["routing"].append(t6 - t5)
+            samples["logging"].append(t7 - t6)
+        t0 = time.perf_counter()
+        log.close()
+        close_s = time.perf_counter() - t0
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+    report = summarize(samples, time.perf_counter() - t_start, len(files))
+    report["stages"]["logging"]["final_flush_ms"] = round(1000 * close_s, 3)
+    report["meta"] = {"commit": _git_commit(), "python": platform.python_version(),
+                      "platform": platform.platform(), "corpus": str(corpus), "ocr": ocr,
+                      "timestamp": datetime.now().isoformat(timespec="seconds")}
+    return report
+
+# short-lived container runs: interpreter + imports dominate small batches
+COLD_START = {"python": ["-c", "pass"],
+              "import": ["-c", "import middleware_demo"],
+              "cli_help": ["middleware_demo.py", "--help"],
+              "quick_check_help": ["quick_check.py", "--help"]}
+
+def cold_start(repeat=7) -> dict:
+    """Median wall time (ms) of fresh interpreters for each COLD_START command."""
+    out = {}
+    for name, argv in COLD_START.items():
+        times = []
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            subprocess.run([sys.executable, *argv], cwd=Path(__file__).parent,
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=False)
+            times.append(time.perf_counter() - t0)
+        out[name] = round(1000 * sorted(times)[len(times) // 2], 1)
+    return out
+
+def compare(base: dict, new: dict):
+    print(f"{'stage':18} {'p50 base':>10} {'p50 new':>10} {'p99 base':>10} {'p99 new':>10} {'delta p50':>10}")
+    for stage in STAGES:
+        b, n = base["stages"].get(stage), new["stages"].get(stage)
+        if not b or not n:
+            continue
+        delta = (n["p50_ms"] - b["p50_ms"]) / b["p50_ms"] * 100 if b["p50_ms"] else 0.0
+        print(f"{stage:18} {b['p50_ms']:10.3f} {n['p50_ms']:10.3f} {b['p99_ms']:10.3f} "
+              f"{n['p99_ms']:10.3f} {delta:+9.1f}%")
+    print(f"{'throughput':18} {base['docs_per_s']} -> {new['docs_per_s']} docs/s")
+    for name, ms in (new.get("cold_start") or {}).items():
+        b = (base.get("cold_start") or {}).get(name)
+        print(f"{'cold ' + name:22} {b if b is not None else '-':>10} {ms:10} ms")
+
+def main():
+    ap = argparse.ArgumentParser()
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    g = sub.add_parser("gen", help="generate a synthetic corpus")
+    g.add_argument("--out", default="bench_corpus")
+    g.add_argument("--n", type=int, default=1000)
+    g.add_argument("--seed", type=int, default=42)
+    g.add_argument("--min-pages", type=int, default=1)
+    g.add_argument("--max-pages", type=int, default=1)
+    g.add_argument("--layout", choices=["A", "B", "mixed"], default="mixed")
+    g.add_argument("--scanned", type=float, default=0.0, help="fraction of scanned-looking variants")
+    g.add_argument("--distractors", type=float, default=0.0, help="fraction of non-invoice documents")
+    g.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    r = sub.add_parser("run", help="time every pipeline stage over a corpus")
+    r.add_argument("--corpus", default="bench_corpus")
+    r.add_argument("--limit", type=int)
+    r.add_argument("--ocr", action="store_true", help="allow OCR fallback for scans")
+    r.add_argument("--report", default=None, help="JSON report path (default out/bench/<commit>.json)")
+    r.add_argument("--no-cold", action="store_true", help="skip the cold-start measurement")
+    k = sub.add_parser("cold", help="time interpreter startup + imports of the CLIs")
+    k.add_argument("--repeat", type=int, default=7)
+    c = sub.add_parser("compare", help="compare two JSON reports")
+    c.add_argument("base"); c.add_argument("new")
+    args = ap.parse_args()
+
+    if args.cmd == "gen":
+        generate(args.out, args.n, args.seed, args.min_pages, args.max_pages, args.layout,
+                 args.scanned, args.distractors, args.workers)
+        print(f"Generated {args.n} documents -> {args.out}")
+    elif args.cmd == "run":
+        report = run(args.corpus, args.limit, args.ocr)
+        if not args.no_cold:
+            report["cold_start"] = cold_start()
+        path = Path(args.report or f"out/bench/{report['meta']['commit'] or 'report'}.json")
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(report, indent=2), encoding="utf-8")
+        for stage in STAGES:
+            s = report["stages"][stage]
+            print(f"{stage:18} p50 {s['p50_ms']:8.3f} ms  p90 {s['p90_ms']:8.3f} ms  p99 {s['p99_ms']:8.3f} ms")
+        for name, ms in (report.get("cold_start") or {}).items():
+            print(f"{'cold ' + name:22} {ms:8.1f} ms")
+        print(f"{report['docs']} docs in {report['wall_s']} s ({report['docs_per_s']} docs/s) -> {path}")
+    elif args.cmd == "cold":
+        for name, ms in cold_start(args.repeat).items():
+            print(f"{name:22} {ms:8.1f} ms")
+    else:
+        compare(json.loads(Path(args.base).read_text(encoding="utf-8")),
+                json.loads(Path(args.new).read_text(encoding="utf-8")))
+
+if __name__ == "__main__":
+    main()
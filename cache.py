@@ -0,0 +1,113 @@
+import hashlib, json, os, sqlite3, time
+from pathlib import Path
+
+# Content-addressed extraction cache: one SQLite file, rows keyed by
+# (sha256 of the input, consumer kind). Each kind carries a version string
+# derived from its pattern/extractor sources, so editing patterns_hu.json (or
+# an extractor) silently invalidates that kind's rows. Size-bounded LRU.
+DEFAULT_PATH = "out/cache/extract.sqlite"
+DEFAULT_MAX_MB = 256
+EXTRACTOR_VERSION = "3"   # bump when extraction logic changes without a source edit
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    hash TEXT NOT NULL, kind TEXT NOT NULL, version TEXT NOT NULL,
+    text TEXT, fields TEXT, confidence REAL, meta TEXT,
+    size INTEGER NOT NULL, atime REAL NOT NULL,
+    PRIMARY KEY (hash, kind));
+CREATE INDEX IF NOT EXISTS entries_atime ON entries(atime);
+"""
+
+def file_hash(path, chunk=1 << 20) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(chunk), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def source_version(*paths) -> str:
+    """Version tag from the bytes of the files that define extraction."""
+    h = hashlib.sha256(EXTRACTOR_VERSION.encode())
+    for p in paths:
+        h.update(Path(p).read_bytes())
+    return h.hexdigest()[:16]
+
+class ExtractionCache:
+    def __init__(self, path=DEFAULT_PATH, kind="default", version="", max_mb=DEFAULT_MAX_MB):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.kind, self.version = kind, version
+        self.max_bytes = int(float(max_mb) * 1024 * 1024)
+        self.hits = self.misses = 0
+        self._puts = 0
+        self.db = sqlite3.connect(str(self.path), timeout=30)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.executescript(_SCHEMA)
+        # patterns/extractor changed since these rows were written
+        with self.db:
+            self.db.execute("DELETE FROM entries WHERE kind=? AND version!=?", (kind, version))
+
+    def get(self, content_hash: str):
+        row = self.db.execute(
+            "SELECT text, fields, confidence, meta FROM entries WHERE hash=? AND kind=? AND version=?",
+            (content_hash, self.kind, self.version)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        with self.db:
+            self.db.execute("UPDATE entries SET atime=? WHERE hash=? AND kind=?",
+                            (time.time(), content_hash, self.kind))
+        text, fields, confidence, meta = row
+        return {"text": text, "fields": json.loads(fields or "{}"),
+                "confidence": confidence, "meta": json.loads(meta or "{}")}
+
+    def put(self, content_hash: str, text="", fields=None, confidence=None, meta=None):
+        fields_js = json.dumps(fields or {}, ensure_ascii=False)
+        meta_js = json.dumps(meta or {}, ensure_ascii=False)
+        size = len(text or "") + len(fields_js) + len(meta_js)
+        with self.db:
+            self.db.execute(
+                "INSERT OR REPLACE INTO entries VALUES (?,?,?,?,?,?,?,?,?)",
+                (content_hash, self.kind, self.version, text, fields_js, confidence,
+                 meta_js, size, time.time()))
+        self._puts += 1
+        if self._puts % 64 == 1:  # other processes write too; re-check the total now and then
+            self.evict()
+
+    def total_bytes(self) -> int:
+        return self.db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+
+    def evict(self):
+        """Drop least recently used rows until the cache is under 90% of max."""
+        total = self.total_bytes()
+        if total <= self.max_bytes:
+            return 0
+        target, dropped = int(self.max_bytes * 0.9), 0
+        while total > target:
+            rows = self.db.execute(
+                "SELECT rowid, size FROM entries ORDER BY atime LIMIT 256").fetchall()
+            if not rows:
+                break
+            with self.db:
+                for rowid, size in rows:
+                    if total <= target:
+                        break
+                    self.db.execute("DELETE FROM entries WHERE rowid=?", (rowid,))
+                    total -= size; dropped += 1
+        return dropped
+
+    def close(self):
+        self.db.close()
+
+def from_config(cfg: dict, kind: str, version: str):
+    """ExtractionCache for cfg["cache"], or None when disabled."""
+    c = (cfg or {}).get("cache") or {}
+    if not c.get("enabled", False):
+        return None
+    return ExtractionCache(c.get("path", DEFAULT_PATH), kind, version, c.get("max_mb", DEFAULT_MAX_MB))
+
+def from_env(kind: str, version: str, var="EXTRACT_CACHE"):
+    # scripts: EXTRACT_CACHE=path enables the cache, EXTRACT_CACHE="" disables it
+    path = os.environ.get(var, DEFAULT_PATH)
+    return ExtractionCache(path, kind, version) if path else None
@@ -0,0 +1,172 @@
+import os, socket, threading, zlib
+from pathlib import Path
+
+# Claim protocol for several middleware instances sharing one inbox (e.g. NFS).
+#
+# A worker claims inbox/x.pdf by renaming it to inbox/processing/<worker>/x.pdf.
+# rename() within one filesystem is atomic (NFS included): exactly one worker
+# wins, the others get FileNotFoundError and skip the file. No locks are held.
+#
+# Each worker touches processing/<worker>/.heartbeat every lease/3 seconds. A
+# claim dir whose heartbeat is older than `lease` belongs to a dead worker: its
+# files are renamed back into the inbox (atomic again, so only one recoverer
+# moves each file). Ages are compared against our own freshly touched heartbeat,
+# i.e. in the file server's clock, so clock skew between hosts doesn't matter.
+#
+# Sharding (shards > 1): a worker claims files whose crc32(name) % shards equals
+# its shard right away and other shards' files only once they have waited
+# `steal_after` seconds, so a missing node delays its share instead of losing it.
+PROCESSING, FAILED, HEARTBEAT = "processing", "failed", ".heartbeat"
+
+def worker_id() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+def shard_of(name: str, shards: int) -> int:
+    return zlib.crc32(name.encode("utf-8")) % shards if shards > 1 else 0
+
+class Claimer:
+    def __init__(self, inbox, worker=None, lease=60.0, shards=1, shard=0, steal_after=None):
+        self.inbox = Path(inbox)
+        self.worker = worker or worker_id()
+        self.lease = float(lease)
+        self.shards, self.shard = max(1, int(shards)), int(shard) % max(1, int(shards))
+        self.steal_after = self.lease if steal_after is None else float(steal_after)
+        self.root = self.inbox / PROCESSING
+        self.mine = self.root / self.worker
+        self.failed_dir = self.inbox / FAILED
+        self.mine.mkdir(parents=True, exist_ok=True)
+        self.deferred = []  # last claim(): other shards' files left for now
+        self._stop = threading.Event()
+        self._thread = None
+        self.heartbeat()
+
+    def heartbeat(self) -> float:
+        """Touch our heartbeat; returns its mtime (the file server's 'now')."""
+        hb = self.mine / HEARTBEAT
+        hb.touch()
+        return hb.stat().st_mtime
+
+    def _wanted(self, p: Path, now: float) -> bool:
+        if self.shards == 1 or shard_of(p.name, self.shards) == self.shard:
+            return True
+        try:  # another shard's file: only once it has waited too long
+            return now - p.stat().st_mtime >= self.steal_after
+        except FileNotFoundError:
+            return False
+
+    def claim(self, paths) -> list:
+        """Rename the files we win into processing/<worker>/; returns their new paths."""
+        now = self.heartbeat()
+        paths = sorted(paths, key=lambda p: shard_of(Path(p).name, self.shards) != self.shard)
+        claimed, self.deferred = [], []
+        for p in map(Path, paths):
+            dst = self.mine / p.name
+            if dst.exists():
+                continue
+            if not self._wanted(p, now):
+                self.deferred.append(p)
+                continue
+            try:
+                os.rename(p, dst)
+            except FileNotFoundError:  # another worker was faster
+                continue
+            claimed.append(dst)
+        return claimed
+
+    def _move_back(self, p: Path, target_dir: Path):
+        dst = target_dir / p.name
+        if dst.exists():  # a new file with the same name was dropped meanwhile
+            return False
+        try:
+            os.rename(p, dst)
+            return True
+        except FileNotFoundError:
+            return False
+
+    def release(self, paths):
+        """Unprocessed claims go back to the inbox."""
+        for p in paths:
+            self._move_back(Path(p), self.inbox)
+
+    def settle(self, paths, dry_run=False):
+        """After a batch: anything still in our claim dir was not routed.
+        dry_run leaves files in place, so they go back; otherwise it failed."""
+        left = [Path(p) for p in paths if Path(p).exists()]
+        if dry_run:
+            self.release(left)
+        else:
+            self.failed_dir.mkdir(exist_ok=True)
+            for p in left:
+                self._move_back(p, self.failed_dir)
+
+    def recover(self) -> int:
+        """Return files of workers whose lease expired to the inbox."""
+        now, moved = self.heartbeat(), 0
+        for d in self.root.iterdir():
+            if d == self.mine or not d.is_dir():
+                continue
+            hb = d / HEARTBEAT
+            try:
+                beat = (hb if hb.exists() else d).stat().st_mtime
+            except FileNotFoundError:
+                continue
+            if now - beat < self.lease:
+                continue
+            for f in d.iterdir():
+                if f.name != HEARTBEAT:
+                    moved += self._move_back(f, self.inbox)
+            try:
+                hb.unlink(missing_ok=True)
+                d.rmdir()
+            except OSError:  # files left (name clash) or another recoverer: next round
+                pass
+        return moved
+
+    def batches(self, source, dry_run=False, defer=None):
+        """Claimed sub-batches of `source` (lists of inbox paths). A batch is
+        settled once the consumer asks for the next one; if it stops early
+        instead, whatever is left of the batch goes back to the inbox.
+        defer(paths) gets the files left to other shards (InboxWatcher.retry)."""
+        claimed = []
+        try:
+            for batch in source:
+                claimed = self.claim(batch)
+                if defer is not None and self.deferred:
+                    defer(self.deferred)
+                if claimed:
+                    yield claimed
+                    self.settle(claimed, dry_run)
+                claimed = []
+        finally:
+            self.release(p for p in claimed if p.exists())
+
+    def start(self):
+        """Heartbeat + recovery in a daemon thread (every lease/3 seconds)."""
+        def loop():
+            while not self._stop.wait(self.lease / 3):
+                try:
+                    self.recover()
+                except OSError:
+                    pass
+        self._thread = threading.Thread(target=loop, name="claim-heartbeat", daemon=True)
+        self._thread.start()
+        return self
+
+    def close(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.release([p for p in self.mine.iterdir() if p.name != HEARTBEAT])
+        try:
+            (self.mine / HEARTBEAT).unlink(missing_ok=True)
+            self.mine.rmdir()
+        except OSError:
+            pass
+
+def from_config(inbox, cfg):
+    """Claimer for cfg["claim"], or None when disabled."""
+    c = (cfg or {}).get("claim") or {}
+    if not c.get("enabled"):
+        return None
+    return Claimer(inbox, c.get("worker") or None, c.get("lease_seconds", 60),
+                   c.get("shards", 1), c.get("shard", 0), c.get("steal_after"))
@@ -1,7 +1,11 @@
 from pathlib import Path
 
-INVOICE_KEYS = ("számla", "szamla", "számlaszám", "vevő", "eladó", "áfa")
-RECEIPT_KEYS = ("nyugta", "block", "pénztárgép", "vásárlás", "bruttó", "összeg")
+from textnorm import fold
+
+PROBE_PAGES = 2   # only the first 5000 chars are used, so never parse the whole file
+# matched against the accent-folded text: "szamla" covers Számla / SZAMLA / számla
+INVOICE_KEYS = ("szamla", "szamlaszam", "vevo", "elado", "afa")
+RECEIPT_KEYS = ("nyugta", "block", "penztargep", "vasarlas", "brutto", "osszeg")
 
 def _hint_from_name(p: Path) -> str:
     name = p.name.lower()
@@ -10,15 +14,17 @@ def _hint_from_name(p: Path) -> str:
     if "receipt" in name or "nyugta" in name: return "receipt"
     return ""
 
-def classify(path: str) -> str:
+def classify(path: str, doc=None) -> str:
     p = Path(path)
     # filename hints first
     hint = _hint_from_name(p)
     if hint: return "invoice" if hint=="invoice" else ("receipt" if hint=="receipt" else "other")
     # very cheap content sniff (works for PDFs with extractable text; images will fall back)
     try:
-        import pdfminer.high_level as pm
-        text = pm.extract_text(str(p))[:5000].lower()
+        if doc is None:
+            import doctext
+            doc = doctext.load(p, ocr=False, max_pages=PROBE_PAGES)
+        text = fold(doc.head(5000))
     except Exception:
         text = ""
     score_inv = sum(k in text for k in INVOICE_KEYS)
@@ -0,0 +1,182 @@
+import codecs, subprocess, sys, tempfile
+from pathlib import Path
+
+# One extraction per PDF: every stage (classify, score, extract, route) reads this.
+
+class DocText:
+    def __init__(self, path, pages, source="text", layout=True, stats=None, max_pages=None):
+        self.path = str(path)
+        self.pages = list(pages)
+        # loaded with max_pages: one extra page is requested, so seeing it means truncated;
+        # it is kept aside (overflow) for load(resume=...) instead of being read again
+        self.complete = max_pages is None or len(self.pages) <= max_pages
+        self.overflow = self.pages[max_pages:] if not self.complete else []
+        if not self.complete:
+            del self.pages[max_pages:]
+        self.source = source      # "text" (embedded text layer) | "ocr"
+        self.layout = layout      # True when produced by `pdftotext -layout`
+        self.stats = stats or {}  # OCR page counts, peak RSS, ...
+        self._text = self._folded = None
+
+    @property
+    def text(self) -> str:
+        if self._text is None:
+            self._text = "\f".join(self.pages)
+        return self._text
+
+    @property
+    def folded(self):
+        """textnorm.Folded view of text (casefolded, accents stripped), built once."""
+        if self._folded is None:
+            from textnorm import Folded
+            self._folded = Folded(self.text)
+        return self._folded
+
+    def head(self, n=5000) -> str:
+        return self.text[:n]
+
+    def meta(self) -> dict:
+        return {"text_source": self.source, "pages": len(self.pages), "layout": self.layout,
+                "complete": self.complete, **self.stats}
+
+    def __bool__(self):
+        return any(p.strip() for p in self.pages)
+
+def split_pages(raw: str) -> list:
+    # pdftotext/pdfminer terminate every page with a form feed
+    pages = raw.split("\f")
+    if len(pages) > 1 and not pages[-1].strip():
+        pages.pop()
+    return pages
+
+def pdftotext_cmd(pdf_path: str, layout=True, last_page=None, first_page=None) -> list:
+    cmd = ["pdftotext"] + (["-layout"] if layout else [])
+    if first_page or last_page:
+        cmd += ["-f", str(first_page or 1)] + (["-l", str(last_page)] if last_page else [])
+    return cmd + [str(pdf_path), "-"]
+
+class PageSplitter:
+    """Incremental utf-8 decode + form-feed split of pdftotext's stdout."""
+
+    def __init__(self):
+        self._dec = codecs.getincrementaldecoder("utf-8")(errors="ignore")
+        self._parts, self._yielded = [], False
+
+    def feed(self, data: bytes) -> list:
+        *pages, rest = self._dec.decode(data, final=not data).split("\f")
+        out = []
+        for piece in pages:
+            self._parts.append(piece)
+            out.append("".join(self._parts))
+            self._parts = []
+        if rest:
+            self._parts.append(rest)
+        self._yielded = self._yielded or bool(out)
+        return out
+
+    def close(self) -> list:
+        pages = self.feed(b"")
+        tail = "".join(self._parts)
+        if tail.strip() or not (self._yielded or pages):  # same trailing-page rule as split_pages
+            pages.append(tail)
+        return pages
+
+def iter_pdftotext_pages(pdf_path: str, layout=True, last_page=None, chunk=1 << 16, first_page=None):
+    """Yield pdftotext's pages as they come off the pipe (form feed = end of page).
+
+    Holds one chunk of bytes and the current page, never the whole output;
+    closing the generator early (all fields found) terminates pdftotext."""
+    cmd = pdftotext_cmd(pdf_path, layout, last_page, first_page)
+    with tempfile.TemporaryFile() as err:  # a chatty stderr can't fill a pipe and stall us
+        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=err)
+        split = PageSplitter()
+        try:
+            while True:
+                data = proc.stdout.read1(chunk)
+                if not data:
+                    break
+                yield from split.feed(data)
+            if proc.wait():
+                err.seek(0)
+                print(err.read().decode("utf-8", errors="ignore"), file=sys.stderr)
+                raise subprocess.CalledProcessError(proc.returncode, cmd)
+            yield from split.close()
+        finally:
+            if proc.poll() is None:
+                proc.kill()
+            proc.stdout.close()
+            proc.wait()
+
+def pdftotext(pdf_path: str, layout=True, last_page=None) -> str:
+    # whole text, pages joined by "\f"; prefer iter_pdftotext_pages for big files
+    return "\f".join(iter_pdftotext_pages(pdf_path, layout, last_page))
+
+def page_count(pdf_path) -> int:
+    """Page count from pdfinfo (poppler); FileNotFoundError without it."""
+    out = subprocess.run(["pdfinfo", str(pdf_path)], capture_output=True, check=True).stdout
+    for line in out.decode("utf-8", errors="ignore").splitlines():
+        if line.startswith("Pages:"):
+            return int(line.split()[1])
+    return 0
+
+def pdfminer_text(pdf_path: str, last_page=None, first_page=None) -> str:
+    import pdfminer.high_level as pm
+    pages = range(first_page - 1, 1 << 30) if first_page else None  # 0-based page numbers
+    return pm.extract_text(str(pdf_path), maxpages=last_page or 0, page_numbers=pages)
+
+def load(pdf_path, layout=True, ocr=True, ocr_done=None, ocr_opts=None, max_pages=None,
+         resume=None) -> DocText:
+    """Extract a PDF once: embedded text first (pdftotext, pdfminer if poppler
+    is missing), OCR only when the text layer is empty.
+
+    OCR streams page by page (see ocr.py) and stops once ocr_done(text) is
+    true; ocr_opts may set dpi, lang and in_flight. max_pages reads only the
+    first pages (doc.complete tells whether that was the whole file); resume
+    takes such an incomplete DocText and reads only the pages after it.
+
+    An unreadable PDF raises (CalledProcessError from pdftotext, pdfminer's
+    own errors): it is reported as an error, not classified as an empty doc."""
+    p = Path(pdf_path)
+    if resume is not None and not resume.complete:
+        return _load_rest(p, resume, ocr_done, ocr_opts)
+    last = max_pages + 1 if max_pages else None
+    try:
+        doc = DocText(p, iter_pdftotext_pages(str(p), layout=layout, last_page=last),
+                      "text", layout, max_pages=max_pages)
+    except FileNotFoundError:
+        try:
+            doc = DocText(p, split_pages(pdfminer_text(str(p), last_page=last)),
+                          "text", False, max_pages=max_pages)
+        except ImportError:  # no text tool at all: OCR or nothing
+            doc = DocText(p, [], "text", False)
+    if doc or not ocr:
+        return doc
+    try:
+        import ocr as _ocr
+        pages, stats = _ocr.ocr_document(p, done=ocr_done, max_pages=max_pages, **(ocr_opts or {}))
+        doc = DocText(p, pages, "ocr", False, stats)
+        doc.complete = not max_pages or stats["ocr_total_pages"] <= max_pages
+        return doc
+    except Exception as e:  # pdf2image/pytesseract or their binaries missing
+        print(f"OCR unavailable ({e}); {p.name} kept without text", file=sys.stderr)
+        return doc
+
+def _load_rest(p: Path, head: DocText, ocr_done=None, ocr_opts=None) -> DocText:
+    # the pages after a probe: a scanned PDF is not OCR'd twice on its first pages
+    if head.source == "ocr":
+        try:
+            import ocr as _ocr
+            pages, stats = _ocr.ocr_document(p, done=ocr_done, pages=head.pages, **(ocr_opts or {}))
+            return DocText(p, pages, "ocr", False, stats)
+        except Exception as e:
+            print(f"OCR unavailable ({e}); {p.name} kept with its first pages", file=sys.stderr)
+            return head
+    known = head.pages + head.overflow  # the probe already read one page past its end
+    first = len(known) + 1
+    try:  # pdftotext fails on a first page past the end: the overflow page may be the last
+        more = page_count(p) >= first
+        rest = list(iter_pdftotext_pages(str(p), layout=head.layout, first_page=first)) if more else []
+    except FileNotFoundError:
+        raw = pdfminer_text(str(p), first_page=first)
+        rest = split_pages(raw) if raw.strip() else []
+    return DocText(p, known + rest, "text", head.layout)
@@ -0,0 +1,165 @@
+import hashlib, math, os, sqlite3, struct, time
+from pathlib import Path
+
+from extract_invoices import norm_num, norm_date
+
+# Ingest-time duplicate index. Each routed document leaves a few keys:
+#
+#   exact    sha256 of the file (any document type)
+#   invoice  seller tax id + invoice number (a resend with different bytes);
+#            invoice number + gross amount when the seller is unknown
+#   near     seller tax id + gross amount + issue date (invoice number misread)
+#
+# The seller tax id is meta["seller_tax_id"] (layout backend, or the first tax
+# number that is not ours), never the first one in the text: that is usually
+# the buyer's, ours, on every invoice. Without own tax numbers or the layout
+# backend it is empty, and only the exact and invoice-number+amount keys exist.
+#
+# Keys are 16-byte blake2b digests in SQLite (persistent, shared between runs
+# and instances). A fixed-size Bloom filter sits in front, so the common case,
+# a new document, costs k bit probes and no disk read; a hit is confirmed by
+# one primary-key lookup. The filter is saved next to the database together
+# with the last row it has seen, and catches up on rows written after that
+# (a crash, or another instance) when opened and when the database changes.
+DEFAULT_PATH = "out/cache/dupes.sqlite"
+DEFAULT_CAPACITY = 1_000_000   # keys; above this the false-positive rate rises
+DEFAULT_FP_RATE = 0.01
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS dup_keys (
+    seq INTEGER PRIMARY KEY, digest BLOB NOT NULL UNIQUE, kind TEXT NOT NULL,
+    file TEXT, dest TEXT, sha256 TEXT, ts REAL NOT NULL);
+"""
+_HEADER = struct.Struct("<4sQQQ")  # magic, bits, hashes, last seq
+
+class Bloom:
+    def __init__(self, bits, hashes, data=None):
+        self.m, self.k = int(bits), int(hashes)
+        self.bits = bytearray(data) if data is not None else bytearray((self.m + 7) // 8)
+
+    @classmethod
+    def for_capacity(cls, n, fp_rate):
+        m = max(64, int(-n * math.log(fp_rate) / math.log(2) ** 2))
+        return cls(m, max(1, round(m / n * math.log(2))))
+
+    def _probes(self, digest):
+        # double hashing over the two halves of the digest
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:16], "little") | 1
+        return ((h1 + i * h2) % self.m for i in range(self.k))
+
+    def add(self, digest):
+        for i in self._probes(digest):
+            self.bits[i >> 3] |= 1 << (i & 7)
+
+    def __contains__(self, digest):
+        return all(self.bits[i >> 3] & (1 << (i & 7)) for i in self._probes(digest))
+
+def digest(kind, *parts) -> bytes:
+    return hashlib.blake2b("\x1f".join((kind,) + parts).encode("utf-8"), digest_size=16).digest()
+
+def keys(meta: dict) -> list:
+    """[(kind, digest)] for a log record / document meta, strongest first."""
+    out = []
+    if meta.get("sha256"):
+        out.append(("exact", digest("exact", meta["sha256"])))
+    if meta.get("doc_type") != "invoice":
+        return out
+    tax = "".join(ch for ch in str(meta.get("seller_tax_id") or "") if ch.isdigit())[:8]  # törzsszám
+    no = "".join(str(meta.get("szamlaszam") or meta.get("invoice_no") or "").upper().split())
+    gross = norm_num(str(meta.get("osszeg_brutto") or meta.get("gross") or ""))
+    date = norm_date(meta.get("kibocsatas_datum") or meta.get("issue_date") or "")
+    if no and tax:
+        out.append(("invoice", digest("invoice", tax, no)))
+    elif no and gross:
+        out.append(("invoice", digest("invoice", "", no, gross)))
+    if tax and gross and date:
+        out.append(("near", digest("near", tax, gross, date)))
+    return out
+
+class DupeIndex:
+    def __init__(self, path=DEFAULT_PATH, capacity=DEFAULT_CAPACITY, fp_rate=DEFAULT_FP_RATE):
+        self.path = str(path)
+        memory = self.path == ":memory:"
+        if not memory:
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        self.bloom_path = None if memory else Path(self.path + ".bloom")
+        self.db = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.executescript(_SCHEMA)
+        self.bloom, self.seq = self._load_bloom(Bloom.for_capacity(int(capacity), float(fp_rate)))
+        self._version = None
+        self.checked = self.bloom_hits = self.found = 0
+        self._sync()
+
+    def _load_bloom(self, fresh):
+        try:
+            raw = self.bloom_path.read_bytes()
+            magic, m, k, seq = _HEADER.unpack_from(raw)
+            if magic == b"DUP1" and (m, k) == (fresh.m, fresh.k) \
+                    and len(raw) == _HEADER.size + len(fresh.bits):
+                return Bloom(m, k, raw[_HEADER.size:]), seq
+        except (AttributeError, OSError, struct.error):
+            pass
+        return fresh, 0  # no/other-size filter: rebuilt from the table
+
+    def _sync(self):
+        # rows added since the filter last saw the table (crash, other instances)
+        version = self.db.execute("PRAGMA data_version").fetchone()[0]
+        if version == self._version:
+            return
+        self._version = version
+        for seq, d in self.db.execute("SELECT seq, digest FROM dup_keys WHERE seq > ? ORDER BY seq",
+                                      (self.seq,)):
+            self.bloom.add(d)
+            self.seq = seq
+
+    def check(self, meta: dict):
+        """First earlier document sharing a key with meta, or None:
+        {"kind", "file", "dest", "sha256"}."""
+        self._sync()
+        self.checked += 1
+        for kind, d in keys(meta):
+            if d not in self.bloom:
+                continue
+            self.bloom_hits += 1
+            row = self.db.execute("SELECT file, dest, sha256 FROM dup_keys WHERE digest = ?",
+                                  (d,)).fetchone()
+            if row is not None:
+                self.found += 1
+                return {"kind": kind, "file": row[0], "dest": row[1], "sha256": row[2]}
+        return None
+
+    def add(self, meta: dict, dest=None, original=None):
+        """Record meta's keys. A duplicate's new keys point at its original."""
+        ref = original or {"file": meta.get("file"), "dest": dest, "sha256": meta.get("sha256")}
+        now = time.time()
+        with self.db:
+            for kind, d in keys(meta):
+                cur = self.db.execute(
+                    "INSERT OR IGNORE INTO dup_keys (digest, kind, file, dest, sha256, ts)"
+                    " VALUES (?,?,?,?,?,?)", (d, kind, ref["file"], ref["dest"], ref["sha256"], now))
+                if cur.rowcount:  # seq is left to _sync: other writers may sit below ours
+                    self.bloom.add(d)
+
+    def save(self):
+        if self.bloom_path is None:
+            return
+        self._version = None
+        self._sync()  # own rows too, so the saved seq covers everything in the filter
+        tmp = self.bloom_path.with_name(self.bloom_path.name + f".{os.getpid()}.tmp")
+        tmp.write_bytes(_HEADER.pack(b"DUP1", self.bloom.m, self.bloom.k, self.seq) + self.bloom.bits)
+        os.replace(tmp, self.bloom_path)
+
+    def close(self):
+        self.save()
+        self.db.close()
+
+def from_config(cfg: dict):
+    """DupeIndex for cfg["dupes"], or None when disabled. Dry runs move nothing,
+    so they only see duplicates within the run (in-memory index)."""
+    c = (cfg or {}).get("dupes") or {}
+    if not c.get("enabled", False):
+        return None
+    path = ":memory:" if (cfg.get("run") or {}).get("dry_run") else c.get("path", DEFAULT_PATH)
+    return DupeIndex(path, c.get("capacity", DEFAULT_CAPACITY), c.get("fp_rate", DEFAULT_FP_RATE))
@@ -0,0 +1,193 @@
+import argparse, csv, json, os, sys
+from collections import Counter
+from functools import lru_cache
+from itertools import islice
+
+from extract_invoices import norm_num, norm_date, strip_accents
+
+# Evaluate an extractor CSV against ground_truth.csv.
+#
+# Ground truth is indexed once (normalised values only); predictions stream in
+# blocks of CHUNK rows transposed to columns, so memory is bounded by the truth
+# set, not by the prediction file. Each column is normalised with one memoised
+# map (extracted columns repeat the same currencies, dates and amounts) and
+# tallied per distinct (truth, pred) pair.
+MISMATCH_CAP = 10000   # distinct (truth, pred) pairs kept per field for the confusion table
+CHUNK = 65536          # rows per column block
+OUTCOMES = ("correct", "wrong", "missed", "spurious", "both_empty")
+
+def stem(path):
+    # os.path.splitext(os.path.basename(path))[0], minus the per-call overhead
+    b = path.rpartition(os.sep)[2]
+    n, dot, _ = b.rpartition(".")
+    n = (n if dot and n.strip(".") else b).lower()
+    return n if n.isascii() else strip_accents(n)
+
+def _text(v):
+    return v.strip()
+
+def _upper(v):
+    return v.strip().upper()
+
+def normalizer(field: str, strip_only=False):
+    # strip_only: compare_to_truth's plain comparison (dates not reformatted)
+    if strip_only:
+        fn = _text
+    elif "osszeg" in field:
+        fn = norm_num
+    elif field.endswith("_datum") or field == "hatarido":
+        fn = norm_date
+    elif field == "valuta":
+        fn = _upper
+    else:
+        fn = _text
+    return lru_cache(maxsize=1 << 16)(fn)
+
+class Report:
+    def __init__(self, fields):
+        self.fields = list(fields)
+        self.outcomes = {f: Counter() for f in self.fields}
+        self.confusion = {f: Counter() for f in self.fields}  # (truth, pred) -> n, wrong only
+        self.truth_rows = self.pred_rows = self.matched = self.by_stem = 0
+        self.unmatched_preds = self.truth_without_pred = 0
+
+    def add(self, field, truth, pred, n=1):
+        if truth and pred:
+            outcome = "correct" if truth == pred else "wrong"
+        elif truth:
+            outcome = "missed"
+        else:
+            outcome = "spurious" if pred else "both_empty"
+        self.outcomes[field][outcome] += n
+        if outcome not in ("correct", "both_empty"):
+            conf = self.confusion[field]
+            if (truth, pred) in conf or len(conf) < MISMATCH_CAP:
+                conf[(truth, pred)] += n
+
+    def field_summary(self, field) -> dict:
+        c = self.outcomes[field]
+        tp, n = c["correct"], sum(c.values())
+        predicted = tp + c["wrong"] + c["spurious"]
+        expected = tp + c["wrong"] + c["missed"]
+        return {"n": n, **{k: c[k] for k in OUTCOMES},
+                "precision": round(tp / predicted, 4) if predicted else None,
+                "recall": round(tp / expected, 4) if expected else None,
+                "accuracy": round((tp + c["both_empty"]) / n, 4) if n else None}
+
+    def to_dict(self, top=10) -> dict:
+        return {"truth_rows": self.truth_rows, "pred_rows": self.pred_rows,
+                "matched": self.matched, "matched_by_stem": self.by_stem,
+                "unmatched_preds": self.unmatched_preds,
+                "truth_without_pred": self.truth_without_pred,
+                "fields": {f: {**self.field_summary(f), "top_mismatches": [
+                    {"truth": t, "pred": p, "n": n}
+                    for (t, p), n in self.confusion[f].most_common(top)]}
+                    for f in self.fields}}
+
+    def format(self, top=3) -> str:
+        pct = lambda v: "   -  " if v is None else f"{100 * v:5.1f}%"
+        lines = [f"matched {self.matched}/{self.pred_rows} predictions "
+                 f"({self.by_stem} by stem), {self.unmatched_preds} without ground truth, "
+                 f"{self.truth_without_pred}/{self.truth_rows} ground-truth rows not predicted",
+                 "",
+                 f"{'field':20} {'prec':>6} {'recall':>6} {'acc':>6}  "
+                 f"{'correct':>7} {'wrong':>6} {'missed':>6} {'spur':>6}"]
+        for f in self.fields:
+            s = self.field_summary(f)
+            lines.append(f"{f:20} {pct(s['precision'])} {pct(s['recall'])} {pct(s['accuracy'])}  "
+                         f"{s['correct']:7} {s['wrong']:6} {s['missed']:6} {s['spurious']:6}")
+            for (t, p), n in self.confusion[f].most_common(top):
+                lines.append(f"{'':22}{n:6}x  GT: {t or '∅'} | PRED: {p or '∅'}")
+        return "\n".join(lines)
+
+def _dict_chunks(rows, names, size=CHUNK):
+    it = iter(rows)
+    while True:
+        block = list(islice(it, size))
+        if not block:
+            return
+        yield {k: [r.get(k) or "" for r in block] for k in names}
+
+def _csv_chunks(reader, header, names, size=CHUNK):
+    idx = {k: header.index(k) for k in names if k in header}
+    width = len(header)
+    while True:
+        block = list(islice(reader, size))
+        if not block:
+            return
+        if any(len(r) != width for r in block):  # ragged rows: pad/trim before transposing
+            block = [(r + [""] * width)[:width] for r in block]
+        cols = list(zip(*block))
+        yield {k: cols[idx[k]] if k in idx else [""] * len(block) for k in names}
+
+def evaluate_columns(truth_chunks, pred_chunks, fields, stem_join=True, strip_only=False) -> Report:
+    """Core join + tally over {column: [values]} chunks (see evaluate/evaluate_rows)."""
+    norms = [normalizer(f, strip_only) for f in fields]
+    report = Report(fields)
+    exact, by_stem = {}, {}
+    for cols in truth_chunks:
+        vals = list(zip(*(map(n, cols[f]) for f, n in zip(fields, norms)))) or [()] * len(cols["file"])
+        for name, v in zip(cols["file"], vals):
+            exact[name] = (name, v)
+            if stem_join:
+                by_stem[stem(name)] = (name, v)  # duplicate stems: last row wins
+        report.truth_rows += len(cols["file"])
+    seen = set()
+    for cols in pred_chunks:
+        names = cols["file"]
+        report.pred_rows += len(names)
+        hits = [exact.get(n) for n in names]
+        if stem_join:
+            for i, h in enumerate(hits):
+                if h is None:
+                    hits[i] = by_stem.get(stem(names[i]))
+                    report.by_stem += hits[i] is not None
+        keep = [i for i, h in enumerate(hits) if h is not None]
+        report.matched += len(keep)
+        report.unmatched_preds += len(names) - len(keep)
+        seen.update(hits[i][0] for i in keep)
+        for j, (f, n) in enumerate(zip(fields, norms)):
+            col = cols[f]
+            pairs = Counter(zip([hits[i][1][j] for i in keep], map(n, [col[i] for i in keep])))
+            for (truth, pred), cnt in pairs.items():
+                report.add(f, truth, pred, cnt)
+    report.truth_without_pred = len(exact) - len(seen)
+    return report
+
+def evaluate_rows(truth_rows, pred_rows, fields, stem_join=True, strip_only=False) -> Report:
+    """Join predictions to ground truth by file name, then by accent-stripped stem."""
+    names = ["file"] + list(fields)
+    return evaluate_columns(_dict_chunks(truth_rows, names), _dict_chunks(pred_rows, names),
+                            fields, stem_join, strip_only)
+
+def evaluate(truth_path, pred_path, fields=None, stem_join=True, strip_only=False) -> Report:
+    """Stream two CSVs in column chunks; fields default to the columns both share."""
+    with open(truth_path, encoding="utf-8", newline="") as tf, \
+            open(pred_path, encoding="utf-8", newline="") as pf:
+        truth, preds = csv.reader(tf), csv.reader(pf)
+        th, ph = next(truth, []), next(preds, [])
+        if fields is None:
+            fields = [c for c in ph if c in th and c != "file"]
+        names = ["file"] + list(fields)
+        return evaluate_columns(_csv_chunks(truth, th, names), _csv_chunks(preds, ph, names),
+                                fields, stem_join, strip_only)
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Per-field precision/recall/accuracy vs ground truth.")
+    ap.add_argument("--truth", default="invoices_hu/ground_truth.csv")
+    ap.add_argument("--pred", default="invoices_hu/extracted_invoices_v2.csv")
+    ap.add_argument("--fields", help="comma-separated (default: columns shared by both files)")
+    ap.add_argument("--exact", action="store_true", help="join on the exact file name only")
+    ap.add_argument("--top", type=int, default=3, help="most frequent mismatches shown per field")
+    ap.add_argument("--json", help="also write the full report here")
+    args = ap.parse_args(argv)
+    fields = [f.strip() for f in args.fields.split(",")] if args.fields else None
+    report = evaluate(args.truth, args.pred, fields, stem_join=not args.exact)
+    print(report.format(args.top))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report.to_dict(), f, ensure_ascii=False, indent=2)
+    return report
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
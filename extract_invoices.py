@@ -1,4 +1,7 @@
-import re, csv, glob, os, io, unicodedata
+import argparse, re, csv, os, io, hashlib, json
+
+import cache
+from textnorm import Folded, fold, strip_accents
 
 # ---------- helpers ----------
 def norm_num(s: str) -> str:
@@ -14,104 +17,196 @@ def norm_date(s: str) -> str:
         if len(y)==4: return f"{y}-{int(m):02d}-{int(d):02d}"
     return s
 
-def strip_accents(s: str) -> str:
-    return "".join(c for c in unicodedata.normalize("NFD", s) if unicodedata.category(c) != "Mn")
-
 # ---------- regexes ----------
-RX_INVOICE_NO = re.compile(r"(?:Sz[áa]mla(?:\s*sz[aá]ma)?|Sz[áa]mlasz[aá]m|Bizonylat(?:\s*sz[aá]ma)?)\s*[:#]?\s*([A-Z0-9/-]{3,})", re.I)
-RX_DATE_TELJ  = re.compile(r"Teljes[íi]t[ée]s(?:\s*d[aá]tuma)?\s*[:#]?\s*([0-9]{4}[-./][0-9]{2}[-./][0-9]{2})", re.I)
+# All of these run on the accent-folded text (textnorm.fold): lower case, no
+# accents, so "Számla", "SZAMLA" and "Szamla" are all "szamla". Captured
+# values are sliced from the original text. Folding lets [a-z] take accented
+# letters, i.e. label words ("Számlaszám"): invoice numbers need a digit.
+RX_INVOICE_NO = re.compile(r"(?:szamlaszam|szamla(?:\s*(?:sor)?szama)?|bizonylat(?:\s*szama)?)\s*[:#]?\s*"
+                           r"((?=[a-z/-]*\d)[a-z0-9/-]{3,})")
+RX_DATE_TELJ  = re.compile(r"teljesites(?:\s*datuma)?\s*[:#]?\s*([0-9]{4}[-./][0-9]{2}[-./][0-9]{2})")
 
 # Amount candidates: look for labeled totals; allow number on same or next line.
 LABEL_PATTERNS = [
-    (re.compile(r"Fizetend[őo]\b.*", re.I),                         4),
-    (re.compile(r"Brutt[oó].{0,20}(?:v[ée]g[öo]sszeg|összeg)\b", re.I), 4),
-    (re.compile(r"(?:V[ée]g[öo]sszeg|Összesen)\b.*", re.I),         3),
-    (re.compile(r"Brutt[oó]\b.*", re.I),                            3),
+    (re.compile(r"fizetendo\b"),                          4),
+    (re.compile(r"brutto.{0,20}(?:vegosszeg|osszeg)\b"),  4),
+    (re.compile(r"(?:vegosszeg|osszesen)\b"),             3),
+    (re.compile(r"brutto\b"),                             3),
 ]
 # generic number token with optional Ft
-RX_NUM = re.compile(r"([\d][\d\s.,]{1,15})\s*(?:Ft|HUF)?\b", re.I)
-
-NEGATIVE_CONTEXT = re.compile(r"\b(Nett[oó]|ÁFA|AFA|Ad[oó])\b", re.I)
-
-def find_brutto_amount(txt: str) -> str:
-    lines = txt.splitlines()
-    n = len(lines)
-    candidates = []
-
-    for i, line in enumerate(lines):
-        for rx_label, base_score in LABEL_PATTERNS:
-            if rx_label.search(line):
-                # same line amounts
-                for m in RX_NUM.finditer(line):
-                    amt = norm_num(m.group(1))
-                    if not amt: continue
-                    score = base_score
-                    if NEGATIVE_CONTEXT.search(line): score -= 3
-                    candidates.append((score, int(amt), i, "same-line"))
-                # next line amounts (common in PDFs)
-                if i+1 < n:
-                    next_line = lines[i+1]
-                    for m in RX_NUM.finditer(next_line):
-                        amt = norm_num(m.group(1))
-                        if not amt: continue
-                        score = base_score - 1  # slightly lower than same-line
-                        if NEGATIVE_CONTEXT.search(next_line): score -= 3
-                        candidates.append((score, int(amt), i+1, "next-line"))
-
-    # If none found near labels, fallback to global max number ≥ 5_000, downweight NETTÓ/ÁFA contexts
-    if not candidates:
-        best = None
-        for i, line in enumerate(lines):
-            for m in RX_NUM.finditer(line):
-                amt = norm_num(m.group(1))
-                if not amt: continue
-                val = int(amt)
-                if val < 5000:  # ignore tiny line items
-                    continue
-                score = 1
-                if NEGATIVE_CONTEXT.search(line):
-                    score -= 3
-                tup = (score, val, i, "fallback")
-                if best is None or tup > best:
-                    best = tup
-        if best:
-            candidates.append(best)
-
-    if not candidates:
-        return ""
-
-    # choose by score, then by amount
-    candidates.sort(reverse=True)  # sorts by score -> amount -> line idx -> origin
-    return str(candidates[0][1])
-
-def extract_from_text(txt: str) -> dict:
+RX_NUM = re.compile(r"([\d][\d\s.,]{1,15})\s*(?:ft|huf)?\b")
+
+NEGATIVE_CONTEXT = re.compile(r"\b(netto|afa|ado)\b")
+
+# labels by descending score: the first hit on a line is the best one
+_LABELS_BY_SCORE = sorted(LABEL_PATTERNS, key=lambda lp: -lp[1])
+
+def _label_score(line: str):
+    for rx_label, base_score in _LABELS_BY_SCORE:
+        if rx_label.search(line):
+            return base_score
+    return None
+
+def _scan_line(line: str):
+    """(largest amount on the line or None, negative-context flag), computed once."""
+    best = None
+    for m in RX_NUM.finditer(line):
+        amt = norm_num(m.group(1))
+        if amt and (best is None or int(amt) > best):
+            best = int(amt)
+    if best is None:
+        return None, False
+    return best, bool(NEGATIVE_CONTEXT.search(line))
+
+_LINE_BREAK = re.compile(r"\r\n|[\n\r\v\f\x1c-\x1e\x85\u2028\u2029]")  # what str.splitlines splits on
+
+def _iter_lines(txt: str):
+    # txt.splitlines() one line at a time: no list of every line of a long statement
+    start = 0
+    for m in _LINE_BREAK.finditer(txt):
+        yield txt[start:m.start()]
+        start = m.end()
+    if start < len(txt):
+        yield txt[start:]
+
+def find_brutto_amount(txt) -> str:
+    # txt: str or textnorm.Folded; lines are scanned in folded form (amounts
+    # are digits either way).
+    # Candidates are (score, amount, line idx, origin); the max tuple wins.
+    # Each line is tokenised once: a labelled line scores its own amounts
+    # ("same-line") and the following line's ("next-line", one point lower);
+    # NETTÓ/ÁFA context costs 3 points. Without any labelled amount, the
+    # largest number >= 5000 wins ("fallback").
+    best = fallback = None
+    prev_label = None
+    folded = txt.folded if isinstance(txt, Folded) else fold(txt)
+    for i, line in enumerate(_iter_lines(folded)):
+        amt, neg = _scan_line(line)
+        label = _label_score(line)
+        if amt is not None:
+            penalty = 3 if neg else 0
+            if prev_label is not None:
+                cand = (prev_label - 1 - penalty, amt, i, "next-line")
+                if best is None or cand > best: best = cand
+            if label is not None:
+                cand = (label - penalty, amt, i, "same-line")
+                if best is None or cand > best: best = cand
+            if best is None and amt >= 5000:  # ignore tiny line items
+                cand = (1 - penalty, amt, i, "fallback")
+                if fallback is None or cand > fallback: fallback = cand
+        prev_label = label
+    win = best or fallback
+    return str(win[1]) if win else ""
+
+def extract_from_text(txt) -> dict:
+    # txt: str or textnorm.Folded
     out = {}
-    if m := RX_INVOICE_NO.search(txt):
-        out["szamlaszam"] = m.group(1).strip()
-    if m := RX_DATE_TELJ.search(txt):
-        out["teljesites_datum"] = norm_date(m.group(1))
-    brutto = find_brutto_amount(txt)
+    view = txt if isinstance(txt, Folded) else Folded(txt)
+    if m := RX_INVOICE_NO.search(view.folded):
+        out["szamlaszam"] = view.group(m, 1).strip()
+    if m := RX_DATE_TELJ.search(view.folded):
+        out["teljesites_datum"] = norm_date(view.group(m, 1))
+    brutto = find_brutto_amount(view)
     if brutto:
         out["brutto_osszeg"] = brutto
     # default currency if seen
-    out["valuta"] = "HUF" if "HUF" in txt or "Ft" in txt or "ft" in txt else "HUF"
+    out["valuta"] = "HUF" if "HUF" in view.text or "Ft" in view.text or "ft" in view.text else "HUF"
     return out
 
-rows = []
-for path in sorted(glob.glob("invoices_hu/*.txt")):
-    fname = os.path.basename(path)
+OUT_FIELDS = ["file","szamlaszam","teljesites_datum","brutto_osszeg","valuta"]
+MANIFEST = ".extract_manifest.json"
+# what the rows depend on: this file and the text folding its regexes run on
+SOURCES = [os.path.join(os.path.dirname(os.path.abspath(__file__)), f)
+           for f in ("extract_invoices.py", "textnorm.py", "patternset.py")]
+
+def load_manifest(path: str, version: str) -> dict:
+    """fname -> {mtime_ns, size, sha256}; empty when missing or written by another extractor version."""
+    try:
+        with open(path, encoding="utf-8") as f:
+            m = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return m.get("files", {}) if m.get("version") == version else {}
+
+def save_manifest(path: str, version: str, files: dict):
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"version": version, "files": files}, f)
+    os.replace(tmp, path)
+
+def load_rows(out_csv: str) -> dict:
+    try:
+        with open(out_csv, newline="", encoding="utf-8") as f:
+            return {r["file"]: r for r in csv.DictReader(f)}
+    except FileNotFoundError:
+        return {}
+
+def read_text(path: str):
+    """(text, sha256 of the text) for one .txt."""
     with io.open(path, "r", encoding="utf-8", errors="ignore") as f:
         txt = f.read()
-    data = extract_from_text(txt)
+    return txt, hashlib.sha256(txt.encode("utf-8")).hexdigest()
+
+def extract_row(fname: str, txt: str, key: str, store=None) -> dict:
+    hit = store.get(key) if store is not None else None
+    if hit is not None:
+        data = hit["fields"]
+    else:
+        data = extract_from_text(txt)
+        if store is not None:
+            store.put(key, fields=data)
     data.setdefault("szamlaszam", "")
     data.setdefault("teljesites_datum", "")
     data.setdefault("brutto_osszeg", "")
     data.setdefault("valuta", "HUF")
-    rows.append({"file": fname, **data})
+    return {"file": fname, **data}
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--in-dir", default=os.environ.get("IN_DIR", "invoices_hu"))
+    ap.add_argument("--full", action="store_true", help="ignore the manifest and re-extract everything")
+    args = ap.parse_args()
+    in_dir = args.in_dir
+    out_csv = os.path.join(in_dir, "extracted_invoices_v2.csv")
+    manifest_path = os.path.join(in_dir, MANIFEST)
+    version = cache.source_version(*SOURCES)
+    # EXTRACT_CACHE="" disables; rows are keyed by the .txt bytes + the SOURCES
+    store = cache.from_env("extract_invoices", version)
+
+    # unchanged = same size and mtime as last run, or same bytes (touched/copied);
+    # only those rows are taken from the previous output
+    old = {} if args.full else load_manifest(manifest_path, version)
+    prev = load_rows(out_csv) if old else {}
+    manifest, rows, changed = {}, [], 0
+    entries = sorted((e for e in os.scandir(in_dir) if e.name.endswith(".txt") and e.is_file()),
+                     key=lambda e: e.name)
+    for e in entries:
+        st = e.stat()
+        rec = old.get(e.name)
+        row = prev.get(e.name)
+        if rec and row and (rec["mtime_ns"], rec["size"]) == (st.st_mtime_ns, st.st_size):
+            manifest[e.name] = rec
+            rows.append(row)
+            continue
+        txt, sha = read_text(e.path)
+        if not (rec and row and rec["sha256"] == sha):
+            row = extract_row(e.name, txt, sha, store)
+            changed += 1
+        manifest[e.name] = {"mtime_ns": st.st_mtime_ns, "size": st.st_size, "sha256": sha}
+        rows.append(row)
+    removed = len(set(prev) - set(manifest))
+
+    if changed or removed or not os.path.exists(out_csv) or args.full:
+        tmp = out_csv + ".tmp"
+        with open(tmp, "w", newline="", encoding="utf-8") as w:
+            wr = csv.DictWriter(w, fieldnames=OUT_FIELDS, extrasaction="ignore")
+            wr.writeheader()
+            wr.writerows(rows)
+        os.replace(tmp, out_csv)
+    save_manifest(manifest_path, version, manifest)
 
-with open("invoices_hu/extracted_invoices_v2.csv", "w", newline="", encoding="utf-8") as w:
-    wr = csv.DictWriter(w, fieldnames=["file","szamlaszam","teljesites_datum","brutto_osszeg","valuta"])
-    wr.writeheader()
-    wr.writerows(rows)
+    print(f"Wrote {out_csv} with {len(rows)} rows "
+          f"({changed} new/changed, {len(rows) - changed} unchanged, {removed} removed).")
 
-print(f"Wrote invoices_hu/extracted_invoices_v2.csv with {len(rows)} rows.")
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+from importlib import import_module
+
+# Extractor registry. A backend is a "module:function" that takes the document
+# text (with takes="folded" the DocText's shared textnorm.Folded view, with
+# takes="doc" the doctext.DocText itself) and returns
+# {field: value}; the module is imported the first time the backend runs, so
+# pdfminer/OCR/regex-heavy modules cost nothing at startup.
+#
+#   needs  what the text must be: "text" = embedded text layer (exact labels),
+#          "layout" = pdftotext -layout columns, "boxes" = a text-layer PDF to
+#          read word coordinates from. OCR output satisfies none of them.
+#   cost   relative CPU per document; extract() runs the cheapest backend that
+#          can read the document and only asks costlier ones for what is missing.
+#   rename backend field -> canonical name (ground_truth.csv columns).
+#   optional  only runs when named in extract(..., enabled=...) (config
+#          extract.backends), e.g. backends that parse the PDF a second time.
+
+class Backend:
+    def __init__(self, name, target, fields, needs=(), cost=1, doc_types=("invoice",), rename=None,
+                 takes="text", optional=False):
+        self.name, self.target, self.takes, self.optional = name, target, takes, optional
+        self.rename = dict(rename or {})
+        self.fields = frozenset(self.rename.get(f, f) for f in fields)
+        self.needs, self.cost, self.doc_types = frozenset(needs), cost, tuple(doc_types)
+        self._fn = None
+
+    def load(self):
+        if self._fn is None:
+            module, _, attr = self.target.partition(":")
+            self._fn = getattr(import_module(module), attr)
+        return self._fn
+
+    def handles(self, doc, doc_type="invoice", enabled=()) -> bool:
+        return (doc_type in self.doc_types and self.needs <= capabilities(doc)
+                and (not self.optional or self.name in enabled))
+
+    def __call__(self, doc, out=None) -> dict:
+        # out: this backend's result for doc, already computed by the caller
+        if out is None:
+            arg = doc if self.takes == "doc" else doc.folded if self.takes == "folded" else doc.text
+            out = self.load()(arg) or {}
+        return {self.rename.get(k, k): v for k, v in out.items()}
+
+    def __repr__(self):
+        return f"Backend({self.name!r}, cost={self.cost}, needs={sorted(self.needs)}" \
+               + (", optional)" if self.optional else ")")
+
+REGISTRY = {}
+
+def register(name, target, fields, needs=(), cost=1, doc_types=("invoice",), rename=None,
+             takes="text", optional=False) -> Backend:
+    REGISTRY[name] = Backend(name, target, fields, needs, cost, doc_types, rename, takes, optional)
+    return REGISTRY[name]
+
+def capabilities(doc) -> frozenset:
+    caps = set()
+    if getattr(doc, "source", "text") == "text":
+        caps.add("text")
+        if getattr(doc, "layout", False):
+            caps.add("layout")
+        if str(getattr(doc, "path", "")).lower().endswith(".pdf"):
+            caps.add("boxes")
+    return frozenset(caps)
+
+def candidates(doc, doc_type="invoice", fields=None, enabled=()) -> list:
+    """Backends that can read doc (and produce any of fields), cheapest first;
+    optional ones only when named in enabled."""
+    want = set(fields) if fields else None
+    order = {name: i for i, name in enumerate(REGISTRY)}  # ties: registration order
+    return sorted((b for b in REGISTRY.values()
+                   if b.handles(doc, doc_type, enabled) and (want is None or b.fields & want)),
+                  key=lambda b: (b.cost, order[b.name]))
+
+def extract(doc, doc_type="invoice", fields=None, enabled=(), results=None, extra=()):
+    """(fields, backend names used): cheapest backend first, the next ones only
+    for wanted fields that are still empty. extra: fields reported when found,
+    but asked of the cheapest backend offering them only; a miss there runs no
+    other backend. results: {backend name: output} the caller already has for
+    doc (e.g. "patterns" from classification)."""
+    cands = candidates(doc, doc_type, set(fields) | set(extra) if fields else None, enabled)
+    want = set(fields) if fields else set().union(*(b.fields for b in cands))
+    extra = set(extra) - want
+    out, used, tried = {}, [], set()
+    for b in cands:
+        missing = {f for f in want if out.get(f) in (None, "")} | (extra - tried)
+        if not missing:
+            break
+        if not b.fields & missing:
+            continue
+        got = b(doc, (results or {}).get(b.name))
+        used.append(b.name)
+        tried |= b.fields
+        for f in want | extra:
+            if out.get(f) in (None, "") and got.get(f) not in (None, ""):
+                out[f] = got[f]
+    return out, used
+
+register("patterns", "quick_check:extract_text_fields", cost=1, takes="folded",
+         fields=("szamlaszam", "kibocsatas_datum", "teljesites_datum", "fizetesi_hatarido",
+                 "adoszam_any", "osszeg_brutto", "osszeg_netto", "afa_osszeg", "afa_kulcs", "valuta"),
+         rename={"osszeg_brutto": "brutto_osszeg", "osszeg_netto": "netto_osszeg",
+                 "fizetesi_hatarido": "hatarido"})
+register("amounts", "extract_invoices:extract_from_text", cost=2, takes="folded",
+         fields=("szamlaszam", "teljesites_datum", "brutto_osszeg", "valuta"))
+# opt-in (extract.backends: [layout]): it parses the PDF again for word boxes,
+# costing about as much as the text extraction itself, so it comes after the
+# text backends; the only one that tells the seller's tax number from the buyer's
+register("layout", "layout:extract_doc", needs=("boxes",), cost=4, takes="doc", optional=True,
+         fields=("szamlaszam", "kibocsatas_datum", "teljesites_datum", "hatarido", "fizmod",
+                 "afa_kulcs", "netto_osszeg", "afa_osszeg", "brutto_osszeg",
+                 "elado_nev", "elado_adoszam", "vevo_nev", "vevo_adoszam"))
+register("labels", "invoice_extract_hu_v2:extract_fields", needs=("text",), cost=2, takes="folded",
+         fields=("szamlaszam", "kibocsatas_datum", "teljesites_datum", "hatarido", "fizmod",
+                 "netto_osszeg", "afa_osszeg", "brutto_osszeg", "elado_nev", "vevo_nev"))
+register("ocr_tolerant", "invoice_extract_hu:extract_fields", cost=3, takes="folded",
+         fields=("szamlaszam", "kibocsatas_datum", "teljesites_datum", "hatarido", "fizmod",
+                 "netto_osszeg", "afa_osszeg", "brutto_osszeg", "elado_nev", "vevo_nev"))
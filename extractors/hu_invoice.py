@@ -1,20 +1,42 @@
 from pathlib import Path
 from datetime import datetime
 
-# TODO: replace with your real logic from invoice_extract_hu_v2.py
-def extract_invoice(path: str) -> dict:
+import extractors
+
+# canonical fields this extractor reports (see extractors/__init__.py); a
+# missing WANT field runs the next backend, EXTRA ones get a single try
+WANT = ("szamlaszam", "kibocsatas_datum", "netto_osszeg", "afa_osszeg", "brutto_osszeg", "valuta")
+EXTRA = ("elado_nev", "elado_adoszam")
+SCORED = ("elado_nev",) + WANT  # elado_adoszam: only the opt-in layout backend finds it
+
+def _amount(v):
+    if v in (None, ""):
+        return None
+    digits = "".join(ch for ch in str(v) if ch.isdigit())
+    return int(digits) if digits else None
+
+def extract_invoice(path: str, doc=None, backends=(), results=None) -> dict:
+    # doc: doctext.DocText already extracted by the caller (avoids re-parsing);
+    # backends: optional registry backends to enable (config extract.backends);
+    # results: backend outputs the caller already has, see extractors.extract
     p = Path(path)
-    # Minimal stub result; integrate your regex/OCR ASAP
+    if doc is None:
+        import doctext
+        doc = doctext.load(p)
+    # cheapest registered backend that can read this doc; costlier ones fill gaps
+    f, used = extractors.extract(doc, "invoice", WANT, backends, results, EXTRA)
     return {
         "doc_type": "invoice",
         "file": p.name,
-        "seller": None,
-        "invoice_no": None,
-        "issue_date": None,   # "YYYY-MM-DD"
-        "net": None,
-        "vat": None,
-        "gross": None,
-        "currency": "HUF",
-        "confidence": 0.4,
+        "seller": f.get("elado_nev"),
+        "seller_tax_id": f.get("elado_adoszam"),
+        "invoice_no": f.get("szamlaszam"),
+        "issue_date": f.get("kibocsatas_datum"),   # "YYYY-MM-DD"
+        "net": _amount(f.get("netto_osszeg")),
+        "vat": _amount(f.get("afa_osszeg")),
+        "gross": _amount(f.get("brutto_osszeg")),
+        "currency": f.get("valuta") or "HUF",
+        "confidence": round(sum(1 for k in SCORED if f.get(k)) / len(SCORED), 3),
+        "extractor": "+".join(used),
         "extracted_at": datetime.utcnow().isoformat(timespec="seconds")
     }
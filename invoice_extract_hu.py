@@ -1,25 +1,29 @@
 import os, re, sys, csv
-from pdf2image import convert_from_path
-import pytesseract
+
+import ocr
+from textnorm import Folded
 
 IN_DIR = "invoices_hu"
 OUT_CSV = "extracted_invoices.csv"
 LANG = "hun+eng"  # fallback to "eng" if you didn't install the hu pack
 
-# Robust-ish patterns for Hungarian invoices
+# Robust-ish patterns for Hungarian invoices, matched against the accent-folded
+# text (textnorm): OCR that drops or mangles accents still hits. Values are
+# taken from the original text; invoice numbers need a digit, so a label word
+# ("SZÁMLA\nSzámlaszám") is not taken as one.
 PATTERNS = {
-    "szamlaszam": re.compile(r"(Számlaszám|Számla(?:szám)?)[:\s]*([A-Z0-9\-_/]+)", re.I),
-    "kibocsatas_datum": re.compile(r"(Kibocsátás(?:\s+dátuma)?|Kelt)[:\s]*([0-9]{4}[-./][0-9]{2}[-./][0-9]{2})", re.I),
-    "teljesites_datum": re.compile(r"(Teljesítés(?:\s+dátuma)?)[:\s]*([0-9]{4}[-./][0-9]{2}[-./][0-9]{2})", re.I),
-    "hatarido": re.compile(r"(Fizetési\s+határidő|Határidő)[:\s]*([0-9]{4}[-./][0-9]{2}[-./][0-9]{2})", re.I),
-    "fizmod": re.compile(r"(Fizetési\s+mód|Fizetési\s+mod)[:\s]*([A-Za-zÁÉÍÓÖŐÚÜŰáéíóöőúüű]+)", re.I),
+    "szamlaszam": re.compile(r"(szamlaszam|szamla(?:szam)?)[:\s]*((?=[a-z_/-]*\d)[a-z0-9\-_/]+)"),
+    "kibocsatas_datum": re.compile(r"(kibocsatas(?:\s+datuma)?|kelt)[:\s]*([0-9]{4}[-./][0-9]{2}[-./][0-9]{2})"),
+    "teljesites_datum": re.compile(r"(teljesites(?:\s+datuma)?)[:\s]*([0-9]{4}[-./][0-9]{2}[-./][0-9]{2})"),
+    "hatarido": re.compile(r"(fizetesi\s+hatarido|hatarido)[:\s]*([0-9]{4}[-./][0-9]{2}[-./][0-9]{2})"),
+    "fizmod": re.compile(r"(fizetesi\s+mod)[:\s]*([a-z]+)"),
     # Totals: grab the last number near the word
-    "netto_osszeg": re.compile(r"(Nettó)[^\d]*(\d[\d\s.,]*)", re.I),
-    "afa_osszeg": re.compile(r"(ÁFA)[^\d]*(\d[\d\s.,]*)", re.I),
-    "brutto_osszeg": re.compile(r"(Végösszeg|Bruttó)[^\d]*(\d[\d\s.,]*)", re.I),
+    "netto_osszeg": re.compile(r"(netto)[^\d]*(\d[\d\s.,]*)"),
+    "afa_osszeg": re.compile(r"(afa)[^\d]*(\d[\d\s.,]*)"),
+    "brutto_osszeg": re.compile(r"(vegosszeg|brutto)[^\d]*(\d[\d\s.,]*)"),
     # Parties
-    "elado_nev": re.compile(r"(Eladó.*?\n)(.+)", re.I),
-    "vevo_nev": re.compile(r"(Vevő.*?\n)(.+)", re.I),
+    "elado_nev": re.compile(r"(elado.*?\n)(.+)"),
+    "vevo_nev": re.compile(r"(vevo.*?\n)(.+)"),
 }
 
 def normnum(s):
@@ -28,6 +32,8 @@ def normnum(s):
     return int(s) if s.isdigit() else None
 
 def extract_fields(text):
+    view = text if isinstance(text, Folded) else Folded(text)
+    text = view.folded
     out = {}
     for k, rgx in PATTERNS.items():
         m = None
@@ -40,7 +46,7 @@ def extract_fields(text):
         if not m:
             out[k] = None
         else:
-            val = m.group(2) if m.lastindex and m.lastindex >= 2 else m.group(0)
+            val = view.group(m, 2 if m.lastindex and m.lastindex >= 2 else 0)
             val = val.strip()
             out[k] = val
     # Clean up numbers
@@ -49,12 +55,11 @@ def extract_fields(text):
     return out
 
 def ocr_pdf(path):
-    pages = convert_from_path(path, dpi=200)
-    txt = []
-    for p in pages:
-        t = pytesseract.image_to_string(p, lang=LANG)
-        txt.append(t)
-    return "\n".join(txt)
+    # one page rendered at a time (see ocr.py); peak RSS goes to stderr
+    pages, stats = ocr.ocr_document(path, dpi=200, lang=LANG)
+    print(f"{os.path.basename(path)}: {stats['ocr_pages']} pages, peak RSS {stats['peak_rss_kb']} KiB",
+          file=sys.stderr)
+    return "\n".join(pages)
 
 def main():
     files = [f for f in os.listdir(IN_DIR) if f.lower().endswith(".pdf")]
@@ -1,18 +1,25 @@
-import os, re, sys, csv, subprocess
+import os, re, sys, csv
+
+import cache
+import doctext
+from textnorm import Folded
 
 IN_DIR = "invoices_hu"
 OUT_CSV = "extracted_invoices_v2.csv"
 
+# matched against the accent-folded text (textnorm); values come from the original
 RX = {
-    "szamlaszam": re.compile(r"Számlaszám:\s*([A-Z0-9\-_/]+)", re.I),
-    "kibocsatas_datum": re.compile(r"(Kibocsátás dátuma|Kelt):\s*([0-9]{4}[-./][0-9]{2}[-./][0-9]{2})", re.I),
-    "teljesites_datum": re.compile(r"Teljesítés dátuma:\s*([0-9]{4}[-./][0-9]{2}[-./][0-9]{2})", re.I),
-    "hatarido": re.compile(r"(Fizetési határidő|Határidő):\s*([0-9]{4}[-./][0-9]{2}[-./][0-9]{2})", re.I),
-    "fizmod": re.compile(r"Fizetési mód:\s*([A-Za-zÁÉÍÓÖŐÚÜŰáéíóöőúüű]+)", re.I),
-    "netto_osszeg": re.compile(r"Nettó:\s*([\d\s\.,]+)\s*Ft", re.I),
-    "afa_osszeg": re.compile(r"ÁFA\s*\(\d+%\):\s*([\d\s\.,]+)\s*Ft", re.I),
-    "brutto_osszeg": re.compile(r"Végösszeg\s*\(bruttó\):\s*([\d\s\.,]+)\s*Ft", re.I),
+    "szamlaszam": re.compile(r"szamlaszam:\s*((?=[a-z_/-]*\d)[a-z0-9\-_/]+)"),
+    "kibocsatas_datum": re.compile(r"(kibocsatas datuma|kelt):\s*([0-9]{4}[-./][0-9]{2}[-./][0-9]{2})"),
+    "teljesites_datum": re.compile(r"teljesites datuma:\s*([0-9]{4}[-./][0-9]{2}[-./][0-9]{2})"),
+    "hatarido": re.compile(r"(fizetesi hatarido|hatarido):\s*([0-9]{4}[-./][0-9]{2}[-./][0-9]{2})"),
+    "fizmod": re.compile(r"fizetesi mod:\s*([a-z]+)"),
+    "netto_osszeg": re.compile(r"netto:\s*([\d\s\.,]+)\s*ft"),
+    "afa_osszeg": re.compile(r"afa\s*\(\d+%\):\s*([\d\s\.,]+)\s*ft"),
+    "brutto_osszeg": re.compile(r"vegosszeg\s*\(brutto\):\s*([\d\s\.,]+)\s*ft"),
 }
+RX_ELADO = re.compile(r"elado\s*\(kibocsato\)\s*\n([^\n].*)")
+RX_VEVO = re.compile(r"vevo\s*\n([^\n].*)")
 
 def normint(s):
     if not s: return None
@@ -21,31 +28,19 @@ def normint(s):
 
 def pdftotext_text(pdf_path: str) -> str:
     # requires: poppler-utils (pdftotext)
-    res = subprocess.run(
-        ["pdftotext", "-layout", pdf_path, "-"],
-        capture_output=True, check=True
-    )
-    return res.stdout.decode("utf-8", errors="ignore")
+    return doctext.pdftotext(pdf_path, layout=True)
 
 def extract_text(pdf_path: str) -> str:
-    # Try embedded text first
-    try:
-        txt = pdftotext_text(pdf_path)
-        if txt.strip():
-            return txt
-    except Exception:
-        pass
-    # Fallback to OCR (for scans)
-    from pdf2image import convert_from_path
-    import pytesseract
-    pages = convert_from_path(pdf_path, dpi=200)
-    return "\n".join(pytesseract.image_to_string(p, lang="hun+eng") for p in pages)
+    # Embedded text first, OCR fallback for scans (see doctext.load)
+    return doctext.load(pdf_path).text
 
 def find_one(rx, text, grp=1, last=False):
-    m = (list(rx.finditer(text)) or [None])[-1] if last else rx.search(text)
-    return m.group(grp).strip() if m else None
+    # text: a textnorm.Folded view
+    m = (list(rx.finditer(text.folded)) or [None])[-1] if last else rx.search(text.folded)
+    return text.group(m, grp).strip() if m else None
 
-def extract_fields(text: str):
+def extract_fields(text):
+    text = text if isinstance(text, Folded) else Folded(text)
     d = {}
     d["szamlaszam"] = find_one(RX["szamlaszam"], text)
     d["kibocsatas_datum"] = find_one(RX["kibocsatas_datum"], text, grp=2)
@@ -58,12 +53,8 @@ def extract_fields(text: str):
     d["brutto_osszeg"] = normint(find_one(RX["brutto_osszeg"], text, last=True))
 
     # Parties: first non-empty line after headers
-    d["elado_nev"] = None
-    d["vevo_nev"] = None
-    m = re.search(r"Eladó\s*\(Kibocsátó\)\s*\n([^\n].*)", text, re.I)
-    if m: d["elado_nev"] = m.group(1).strip()
-    m = re.search(r"Vevő\s*\n([^\n].*)", text, re.I)
-    if m: d["vevo_nev"] = m.group(1).strip()
+    d["elado_nev"] = find_one(RX_ELADO, text)
+    d["vevo_nev"] = find_one(RX_VEVO, text)
     return d
 
 def main():
@@ -71,11 +62,22 @@ def main():
     if not files:
         print("No PDFs in", IN_DIR); sys.exit(1)
 
+    # EXTRACT_CACHE="" disables; a hit skips pdftotext and OCR entirely
+    here = os.path.dirname(os.path.abspath(__file__))  # its regexes run on textnorm's folded text
+    store = cache.from_env("invoice_extract_hu_v2", cache.source_version(
+        __file__, os.path.join(here, "textnorm.py"), os.path.join(here, "patternset.py")))
     rows = []
     for f in files:
         path = os.path.join(IN_DIR, f)
-        text = extract_text(path)
-        data = extract_fields(text)
+        key = cache.file_hash(path)
+        hit = store.get(key) if store is not None else None
+        if hit is not None:
+            data = hit["fields"]
+        else:
+            text = extract_text(path)
+            data = extract_fields(text)
+            if store is not None:
+                store.put(key, text, data)
         data["file"] = f
         rows.append(data)
         print(f"{f} -> {data}")
@@ -0,0 +1,201 @@
+import html, re, subprocess, sys
+from collections import defaultdict, namedtuple
+
+# Layout-aware field lookup. Words come with their boxes (`pdftotext -bbox`, or
+# pdfminer text lines when poppler is missing), are merged into phrases (words
+# on one line with no column gap between them) and put into a per-page grid.
+# All labels are found in one pass over the phrases; each value is then read
+# from the rest of the label's phrase or from the nearest phrase to its right
+# or below: grid lookups instead of one regex pass over the whole text per
+# field. "Below" only looks at the label's own column, so the seller/buyer
+# blocks that make_hu_invoices.py draws side by side don't get mixed up the
+# way they do in flattened or -layout text.
+Box = namedtuple("Box", "x0 y0 x1 y1 text")   # points, y grows downwards
+CELL = 48.0          # grid cell size in points (~17 mm)
+GAP = 1.0            # word gap (in line heights) that still belongs to one phrase
+SEP = re.compile(r"\s+[|•]\s+")
+
+_DATE = r"[0-9]{4}[-./][0-9]{2}[-./][0-9]{2}"
+_AMOUNT = r"\d[\d  .,]*\d|\d"
+# field: (label, value, last) -- last: the final occurrence wins (totals)
+LABELS = {
+    "szamlaszam": (r"Számlaszám", r"[A-Z0-9][A-Z0-9\-_/]{2,}", False),
+    "kibocsatas_datum": (r"Kibocsátás dátuma|Kelt", _DATE, False),
+    "teljesites_datum": (r"Teljesítés(?: dátuma)?", _DATE, False),
+    "hatarido": (r"Fizetési határidő|Határidő", _DATE, False),
+    "fizmod": (r"Fizetési mód", r"[A-Za-zÁÉÍÓÖŐÚÜŰáéíóöőúüű]+", False),
+    "afa_kulcs": (r"ÁFA kulcs", r"\d{1,2}(?=\s*%)", False),
+    "netto_osszeg": (r"Nettó(?=\s*:)", _AMOUNT, True),
+    "afa_osszeg": (r"ÁFA\s*\(\d+\s*%\)", _AMOUNT, True),
+    "brutto_osszeg": (r"Végösszeg\s*\(bruttó\)", _AMOUNT, True),
+}
+PARTIES = {"elado": r"Eladó(?:\s*\(Kibocsátó\))?", "vevo": r"Vevő"}
+AMOUNTS = ("netto_osszeg", "afa_osszeg", "brutto_osszeg")
+FIELDS = tuple(LABELS) + tuple(f"{p}_{k}" for p in PARTIES for k in ("nev", "adoszam"))
+
+_LABEL_RX = re.compile("|".join(f"(?P<{f}>{lab})" for f, (lab, _, _) in LABELS.items()))
+_VALUE_RX = {f: re.compile(r"[\s:.\-]*(" + val + ")") for f, (_, val, _) in LABELS.items()}
+_PARTY_RX = {p: re.compile(rf"\s*(?:{rx})\s*:?\s*") for p, rx in PARTIES.items()}
+_TAXNO = re.compile(r"Adószám\s*:?\s*(\d{8}-\d-\d{2})")
+
+class PageIndex:
+    """Phrases of one page in a uniform grid; each box is listed in every cell
+    it covers, so a rectangle query only looks at the boxes near it."""
+
+    def __init__(self, boxes, cell=CELL):
+        self.boxes, self.cell = list(boxes), cell
+        self.grid = defaultdict(list)
+        for i, b in enumerate(self.boxes):
+            for cx in range(int(b.x0 // cell), int(b.x1 // cell) + 1):
+                for cy in range(int(b.y0 // cell), int(b.y1 // cell) + 1):
+                    self.grid[cx, cy].append(i)
+
+    def query(self, x0, y0, x1, y1):
+        c = self.cell
+        ids = set()
+        for cx in range(int(x0 // c), int(x1 // c) + 1):
+            for cy in range(int(y0 // c), int(y1 // c) + 1):
+                ids.update(self.grid.get((cx, cy), ()))
+        return [self.boxes[i] for i in sorted(ids)]
+
+    def right_of(self, b, max_dx=250.0):
+        """Nearest phrase starting right of b on the same line."""
+        h = b.y1 - b.y0
+        cands = [c for c in self.query(b.x1, b.y0, b.x1 + max_dx, b.y1)
+                 if c.x0 >= b.x1 - 1 and min(c.y1, b.y1) - max(c.y0, b.y0) >= h / 2]
+        return min(cands, key=lambda c: c.x0, default=None)
+
+    def below(self, b, max_dy=40.0):
+        """Nearest phrase under b that overlaps its column."""
+        cands = [c for c in self.query(b.x0, b.y1, b.x1, b.y1 + max_dy)
+                 if c.y0 >= b.y1 - 1 and c is not b and min(c.x1, b.x1) > max(c.x0, b.x0)]
+        return min(cands, key=lambda c: (c.y0, abs(c.x0 - b.x0)), default=None)
+
+def phrases(words, gap=GAP):
+    """Merge word boxes into phrases: same line, gap below `gap` line heights."""
+    out, cur = [], None
+    for w in sorted(words, key=lambda w: (round((w.y0 + w.y1) / 2), w.x0)):
+        h = w.y1 - w.y0
+        if cur is not None and abs((cur.y0 + cur.y1) - (w.y0 + w.y1)) / 2 < h / 2 \
+                and 0 <= w.x0 - cur.x1 < gap * h:
+            cur = Box(cur.x0, min(cur.y0, w.y0), w.x1, max(cur.y1, w.y1),
+                      cur.text + ("  " if w.x0 - cur.x1 > h / 2 else " ") + w.text)
+            continue
+        if cur is not None:
+            out.append(cur)
+        cur = w
+    if cur is not None:
+        out.append(cur)
+    return out
+
+_PAGE = re.compile(r"<page\b")
+_WORD = re.compile(r'<word xMin="([\d.]+)" yMin="([\d.]+)" xMax="([\d.]+)" yMax="([\d.]+)">([^<]*)</word>')
+
+def parse_bbox(xhtml: str) -> list:
+    """Word boxes per page from `pdftotext -bbox` output."""
+    pages = []
+    for chunk in _PAGE.split(xhtml)[1:]:
+        pages.append([Box(float(a), float(b), float(c), float(d), html.unescape(t))
+                      for a, b, c, d, t in _WORD.findall(chunk)])
+    return pages
+
+def pdftotext_words(pdf_path, last_page=None) -> list:
+    cmd = ["pdftotext", "-bbox", "-enc", "UTF-8"]
+    if last_page:
+        cmd += ["-l", str(last_page)]
+    out = subprocess.run(cmd + [str(pdf_path), "-"], capture_output=True, check=True)
+    return parse_bbox(out.stdout.decode("utf-8", errors="ignore"))
+
+def pdfminer_lines(pdf_path, last_page=None) -> list:
+    # pdfminer's text lines already stop at column gaps; used as phrases directly
+    from pdfminer.high_level import extract_pages
+    from pdfminer.layout import LTTextLine
+    pages = []
+    for layout in extract_pages(str(pdf_path), maxpages=last_page or 0):
+        boxes, stack = [], list(layout)
+        while stack:
+            o = stack.pop()
+            if isinstance(o, LTTextLine):
+                t = o.get_text().strip()
+                if t:
+                    boxes.append(Box(o.x0, layout.height - o.y1, o.x1, layout.height - o.y0, t))
+            elif hasattr(o, "__iter__"):
+                stack.extend(o)
+        pages.append(sorted(boxes, key=lambda b: (b.y0, b.x0)))  # reading order
+    return pages
+
+def page_indexes(doc, last_page=None) -> list:
+    """PageIndex per page of doc (a doctext.DocText or a PDF path), built once
+    per DocText."""
+    cached = getattr(doc, "_layout_pages", None)
+    if cached is not None:
+        return cached
+    path = getattr(doc, "path", doc)
+    try:
+        pages = [PageIndex(phrases(words)) for words in pdftotext_words(path, last_page)]
+    except FileNotFoundError:  # no poppler
+        pages = [PageIndex(boxes) for boxes in pdfminer_lines(path, last_page)]
+    if hasattr(doc, "pages"):
+        doc._layout_pages = pages
+    return pages
+
+def _normint(s):
+    digits = "".join(ch for ch in s if ch.isdigit())
+    return int(digits) if digits else None
+
+def _value(idx, box, end, field):
+    # rest of the label's phrase (up to the next "|" / "•"), else right, else below
+    rest = SEP.split(box.text[end:], 1)[0]
+    m = _VALUE_RX[field].match(rest)
+    if m:
+        return m.group(1)
+    for other in (idx.right_of(box), idx.below(box)):
+        if other is not None:
+            m = _VALUE_RX[field].match(SEP.split(other.text, 1)[0])
+            if m:
+                return m.group(1)
+    return None
+
+def _party(idx, header):
+    # name = first phrase under the header in its column; tax number within the next lines
+    name = tax = None
+    b = idx.below(header)
+    for _ in range(4):
+        if b is None:
+            break
+        parts = SEP.split(b.text)
+        if name is None:
+            name = parts[0].strip()
+        m = _TAXNO.search(b.text)
+        if m:
+            tax = m.group(1)
+            break
+        b = idx.below(b)
+    return name, tax
+
+def extract_pages(pages) -> dict:
+    """Fields from PageIndex pages (see page_indexes)."""
+    d = dict.fromkeys(FIELDS)
+    for idx in pages:
+        for box in idx.boxes:
+            for p, rx in _PARTY_RX.items():
+                if d[f"{p}_nev"] is None and rx.fullmatch(box.text):
+                    d[f"{p}_nev"], d[f"{p}_adoszam"] = _party(idx, box)
+            for m in _LABEL_RX.finditer(box.text):
+                f = m.lastgroup
+                if d[f] is not None and not LABELS[f][2]:
+                    continue
+                v = _value(idx, box, m.end(), f)
+                if v is not None:
+                    d[f] = _normint(v) if f in AMOUNTS else v
+    return d
+
+def extract_doc(doc) -> dict:
+    """Registry backend ("layout"): doc is a doctext.DocText of a PDF."""
+    last = None if getattr(doc, "complete", True) else len(doc.pages)  # probe: same pages
+    return extract_pages(page_indexes(doc, last))
+
+if __name__ == "__main__":
+    import json
+    for path in sys.argv[1:]:
+        print(json.dumps({"file": path, **extract_doc(path)}, ensure_ascii=False))
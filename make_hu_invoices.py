@@ -17,7 +17,6 @@ FONT = "DejaVu"; FONT_BOLD = "DejaVu-Bold"
 pdfmetrics.registerFont(TTFont(FONT, "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf"))
 pdfmetrics.registerFont(TTFont(FONT_BOLD, "/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf"))
 
-os.makedirs(OUT_DIR, exist_ok=True)
 VAT_RATES = [27, 5, 0]
 
 def rnd_items():
@@ -68,7 +67,12 @@ def table(c, x, y, items, vat):
     return int(netto), int(afa), int(brutto)
 
 def page_A(path, H, S, B, items, vat):
-    c = canvas.Canvas(path, pagesize=A4); w,h = A4; watermark(c,w,h)
+    c = canvas.Canvas(path, pagesize=A4)
+    netto, afa, brutto = draw_A(c, H, S, B, items, vat)
+    c.showPage(); c.save(); return netto, afa, brutto
+
+def draw_A(c, H, S, B, items, vat):
+    w,h = A4; c.setPageSize(A4); watermark(c,w,h)
     c.setFont(FONT_BOLD, 18); c.drawString(20*mm, 270*mm, "SZÁMLA")
     c.setFont(FONT, 10)
     c.drawString(20*mm,262*mm,f"Számlaszám: {H['szamla']}"); c.drawString(20*mm,256*mm,f"Kibocsátás dátuma: {H['kibocs']}")
@@ -83,10 +87,15 @@ def page_A(path, H, S, B, items, vat):
     c.drawString(20*mm,198*mm,f"ÁFA kulcs: {vat}%")
     netto, afa, brutto = table(c,20*mm,190*mm,items,vat)
     c.setFont(FONT,9); c.drawString(20*mm,20*mm,"Megjegyzés: Minta számla bemutató célokra.")
-    c.showPage(); c.save(); return netto, afa, brutto
+    return netto, afa, brutto
 
 def page_B(path, H, S, B, items, vat):
-    c = canvas.Canvas(path, pagesize=landscape(A4)); w,h = landscape(A4); watermark(c,w,h)
+    c = canvas.Canvas(path, pagesize=landscape(A4))
+    netto, afa, brutto = draw_B(c, H, S, B, items, vat)
+    c.showPage(); c.save(); return netto, afa, brutto
+
+def draw_B(c, H, S, B, items, vat):
+    w,h = landscape(A4); c.setPageSize(landscape(A4)); watermark(c,w,h)
     c.setFont(FONT_BOLD, 18); c.drawString(15*mm, h-20*mm, "SZÁMLA"); c.setFont(FONT, 10)
     c.drawString(15*mm, h-28*mm, f"Számlaszám: {H['szamla']}  |  Kelt: {H['kibocs']}  |  Teljesítés: {H['telj']}  |  Határidő: {H['hatar']}  |  {H['fizmod']}")
     c.setFont(FONT_BOLD,12); c.drawString(15*mm,h-40*mm,"Eladó"); c.setFont(FONT,10)
@@ -96,9 +105,10 @@ def page_B(path, H, S, B, items, vat):
     c.setFont(FONT,10); c.drawString(15*mm,h-76*mm,f"ÁFA kulcs: {vat}%")
     netto, afa, brutto = table(c,15*mm,h-86*mm,items,vat)
     c.setFont(FONT,9); c.drawString(15*mm,10*mm,"Megjegyzés: Minta számla bemutató célokra.")
-    c.showPage(); c.save(); return netto, afa, brutto
+    return netto, afa, brutto
 
 def main():
+    os.makedirs(OUT_DIR, exist_ok=True)
     truth=[]
     base = datetime(2024,11,5)
     for i in range(1,N_FILES+1):
@@ -0,0 +1,126 @@
+import cProfile, json, math, os, time
+from collections import Counter, deque
+from contextlib import contextmanager
+from pathlib import Path
+
+# Per-stage timers and counters for middleware runs. Workers time their own
+# stages into a plain dict (picklable) which the parent merges via add_doc().
+SAMPLES = 10000   # latency samples kept per stage (count/sum stay exact)
+PREFIX = "invoice_middleware"
+
+@contextmanager
+def timed(timings: dict, stage: str):
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[stage] = timings.get(stage, 0.0) + (time.perf_counter() - t0)
+
+def _quantile(vals, q):
+    if not vals:
+        return 0.0
+    return vals[max(0, min(len(vals) - 1, math.ceil(q * len(vals)) - 1))]
+
+class Metrics:
+    def __init__(self):
+        self.started = time.time()
+        self.counters = Counter()
+        self._samples = {}   # stage -> deque of seconds
+        self._count = Counter()
+        self._sum = Counter()
+
+    def observe(self, stage: str, seconds: float):
+        self._samples.setdefault(stage, deque(maxlen=SAMPLES)).append(seconds)
+        self._count[stage] += 1
+        self._sum[stage] += seconds
+
+    @contextmanager
+    def stage(self, name: str):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - t0)
+
+    def inc(self, name: str, n=1):
+        self.counters[name] += n
+
+    def add_doc(self, meta: dict):
+        """Fold one analysed document (meta from analyze_pdf) into the totals."""
+        self.inc("documents")
+        for stage, ms in (meta.get("timings_ms") or {}).items():
+            self.observe(stage, ms / 1000.0)
+        if meta.get("cache_hit"):  # the cached meta describes the first run's OCR
+            self.inc("cache_hits")
+        elif meta.get("text_source") == "ocr":
+            self.inc("ocr_fallbacks")
+        if meta.get("doc_type"):
+            self.inc(f"doc_type_{meta['doc_type']}")
+        prof = meta.get("profile")
+        if prof and not meta.get("cache_hit"):  # supplier profiles (profiles.py)
+            self.inc("profile_docs_no_supplier" if not prof["supplier"] else
+                     "profile_docs_known" if prof["known"] else "profile_docs_new")
+            self.inc("profile_hint_hits", prof["hint_hits"])
+            self.inc("profile_hint_misses", prof["hint_misses"])
+            self.inc("pattern_probes", prof["probes"])
+            self.inc("pattern_fields", prof["fields"])
+
+    def summary(self) -> dict:
+        stages = {}
+        for stage, dq in self._samples.items():
+            v = sorted(dq)
+            n, total = self._count[stage], self._sum[stage]
+            stages[stage] = {"count": n, "total_s": round(total, 4),
+                             "mean_ms": round(1000 * total / n, 3) if n else 0.0,
+                             "p50_ms": round(1000 * _quantile(v, 0.5), 3),
+                             "p90_ms": round(1000 * _quantile(v, 0.9), 3),
+                             "p99_ms": round(1000 * _quantile(v, 0.99), 3),
+                             "max_ms": round(1000 * (v[-1] if v else 0.0), 3)}
+        return {"started": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.started)),
+                "wall_s": round(time.time() - self.started, 3),
+                "counters": dict(self.counters), "stages": stages}
+
+    def write_json(self, path):
+        _atomic_write(path, json.dumps(self.summary(), indent=2, ensure_ascii=False))
+
+    def write_prometheus(self, path):
+        """Text exposition format, e.g. for node_exporter's textfile collector."""
+        s = self.summary()
+        lines = [f"# TYPE {PREFIX}_stage_seconds summary"]
+        for stage, st in sorted(s["stages"].items()):
+            for q, key in (("0.5", "p50_ms"), ("0.9", "p90_ms"), ("0.99", "p99_ms")):
+                lines.append(f'{PREFIX}_stage_seconds{{stage="{stage}",quantile="{q}"}} {st[key] / 1000:.6f}')
+            lines.append(f'{PREFIX}_stage_seconds_sum{{stage="{stage}"}} {st["total_s"]:.6f}')
+            lines.append(f'{PREFIX}_stage_seconds_count{{stage="{stage}"}} {st["count"]}')
+        lines.append(f"# TYPE {PREFIX}_events_total counter")
+        for name, n in sorted(s["counters"].items()):
+            lines.append(f'{PREFIX}_events_total{{event="{name}"}} {n}')
+        lines.append(f"# TYPE {PREFIX}_start_time_seconds gauge")
+        lines.append(f"{PREFIX}_start_time_seconds {self.started:.0f}")
+        _atomic_write(path, "\n".join(lines) + "\n")
+
+def _atomic_write(path, text):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(text, encoding="utf-8")
+    os.replace(tmp, path)
+
+class SlowProfiler:
+    """cProfile every document, keep the .prof only when it took > threshold."""
+
+    def __init__(self, out_dir, threshold_ms):
+        self.out_dir, self.threshold = Path(out_dir), float(threshold_ms) / 1000.0
+
+    @contextmanager
+    def profile(self, name: str):
+        prof = cProfile.Profile()
+        t0 = time.perf_counter()
+        prof.enable()
+        try:
+            yield
+        finally:
+            prof.disable()
+            if time.perf_counter() - t0 > self.threshold:
+                self.out_dir.mkdir(parents=True, exist_ok=True)
+                prof.dump_stats(str(self.out_dir / f"{name}.prof"))
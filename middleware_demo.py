@@ -1,37 +1,380 @@
 import argparse
-import yaml
+import signal
+import sys
+import time
+from functools import partial
 from pathlib import Path
 
-from classify import classify  # kept for compatibility
+# yaml, notify (smtplib/email), watch and the process pool are imported where
+# they are used: short-lived container runs only pay for what they touch
 from extractors.hu_invoice import extract_invoice
-from extractors.receipt_basic import extract_receipt  # retained
-from routing import route, append_logs, ensure_dirs
-from notify import send_email
+from routing import route, append_logs, ensure_dirs, LogWriter
 
 # === HU invoice scorer integration ===
+import hashlib
 import json
 import re
-from quick_check import run_pdftotext, load_patterns, extract_fields, score_invoice
+import doctext
+import cache
+from metrics import Metrics, SlowProfiler, timed
+from quick_check import PATTERN_FILE, load_patterns, extract_fields, score_invoice
 
 PATTERNS = load_patterns()  # loads patterns_hu.json
+PATTERNS_VERSION = cache.source_version(PATTERN_FILE)  # supplier profiles store pattern indices
+# cached meta depends on the patterns and on the code that reads, scores and extracts
+_HERE = Path(__file__).resolve().parent
+SOURCES = [PATTERN_FILE] + [str(_HERE / f) for f in (
+    "middleware_demo.py", "quick_check.py", "patternset.py", "textnorm.py", "doctext.py", "ocr.py",
+    "layout.py", "classify.py", "profiles.py", "extractors/__init__.py", "extractors/hu_invoice.py",
+    "extractors/receipt_basic.py")]
+CACHE_VERSION = cache.source_version(*SOURCES)
+_CACHES = {}  # per process; each pool worker opens its own SQLite connection
+_DUPES = {}   # parent only: duplicate checks run where documents are routed
+_NOTIFIERS = {}  # parent only: routed records -> background digest mail
+_PROFILES = {}   # per process: profiles.path -> supplier profiles (pattern hints)
+# scanned PDFs: stop OCR once these are found (ocr.required_fields)
+REQUIRED_FIELDS = ("szamlaszam", "kibocsatas_datum", "osszeg_brutto")
+# tiered classification: score the first pages, read the rest only when needed
+CLASSIFY_TIERS = {"probe_pages": 2, "low": 0.2}
 _CURRENCY_RX = re.compile(r"(?i)\b(Ft|HUF|EUR|\u20AC|USD|\$)\b")  # \u20AC = €
 
-def classify_pdf_with_hu_scorer(pdf_path):
-    text = run_pdftotext(str(pdf_path))
-    fields = extract_fields(text, PATTERNS)
-    confidence = score_invoice(text, fields)
+def classify_pdf_with_hu_scorer(pdf_path, doc=None, timings=None, profiles=None):
+    timings = timings if timings is not None else {}
+    doc = doc if doc is not None else doctext.load(pdf_path)
+    view = doc.folded  # accent-folded once, shared by extraction and scoring
+    with timed(timings, "field_extraction"):
+        if profiles is not None and doc.complete:  # known suppliers: their patterns first
+            fields, doc.stats["profile"] = profiles.extract(PATTERNS, view)
+        else:
+            fields = extract_fields(view, PATTERNS)
+    with timed(timings, "classification"):
+        confidence = score_invoice(view, fields)
     doc_type = "invoice" if confidence >= 0.6 else "other"
-    currency = "HUF" if _CURRENCY_RX.search(text) else None
+    currency = "HUF" if _CURRENCY_RX.search(view.text) else None
     return doc_type, float(round(confidence, 3)), currency, fields
 
+def __getattr__(name):
+    # classify / extract_receipt used to be imported here; kept importable, lazily
+    if name == "classify":
+        from classify import classify
+        return classify
+    if name == "extract_receipt":
+        from extractors.receipt_basic import extract_receipt
+        return extract_receipt
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def _has_fields(required, text):
+    found = PATTERNS.extract(text)
+    return all(found.get(k) for k in required)
+
+def analysis_opts(cfg) -> dict:
+    # the picklable subset of cfg that worker processes need
+    ocr_cfg = dict(cfg.get("ocr") or {})
+    required = tuple(ocr_cfg.pop("required_fields", REQUIRED_FIELDS) or ())
+    early = ocr_cfg.pop("early_stop", True)
+    slow_ms = (cfg.get("metrics") or {}).get("profile_slow_ms") or 0
+    out_root = cfg.get("paths", {}).get("out_root", "./out")
+    opts = {"ocr_opts": ocr_cfg, "required": required if early else (),
+            "cache": cfg.get("cache") or {},
+            "profiles": cfg.get("profiles") or {},
+            "backends": tuple((cfg.get("extract") or {}).get("backends") or ()),
+            "own_tax_numbers": tuple((cfg.get("profiles") or {}).get("own_tax_numbers") or ()),
+            "classify": {**CLASSIFY_TIERS, **(cfg.get("classify") or {})},
+            "profile": {"dir": str(Path(out_root) / "logs" / "profiles"), "slow_ms": slow_ms}
+                       if slow_ms else None}
+    opts["digest"] = opts_digest(opts)
+    return opts
+
+def opts_digest(opts) -> str:
+    # the options that change a document's meta; cache/profiling settings do not
+    keep = {k: v for k, v in (opts or {}).items() if k not in ("cache", "profile", "digest")}
+    return hashlib.sha256(json.dumps(keep, sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+def cache_key(content_hash, opts) -> str:
+    # same bytes analysed with other backends, own tax numbers, tiers or OCR
+    # settings are a different entry
+    opts = opts or {}
+    return f"{content_hash}:{opts.get('digest') or opts_digest(opts)}"
+
+def cache_put(store, key, doc, scored, meta, opts):
+    # the middleware never reads the text back: stored only with cache.store_text
+    text = doc.text if ((opts or {}).get("cache") or {}).get("store_text") else ""
+    store.put(key, text, scored[3], scored[1], meta)
+
+def _get_cache(cache_cfg):
+    if not (cache_cfg or {}).get("enabled"):
+        return None
+    key = cache_cfg.get("path", cache.DEFAULT_PATH)
+    if key not in _CACHES:
+        _CACHES[key] = cache.from_config({"cache": cache_cfg}, "middleware", CACHE_VERSION)
+    return _CACHES[key]
+
+def _get_profiles(conf):
+    if not (conf or {}).get("enabled"):
+        return None
+    key = conf.get("path")
+    if key not in _PROFILES:
+        import profiles
+        _PROFILES[key] = profiles.from_config({"profiles": conf}, PATTERNS_VERSION)
+    return _PROFILES[key]
+
+def close_profiles():
+    for store in _PROFILES.values():
+        store.close()
+    _PROFILES.clear()
+
+def report_profiles(metrics):
+    c = metrics.counters
+    if not c["pattern_fields"]:
+        return
+    known, hinted = c["profile_docs_known"], c["profile_hint_hits"] + c["profile_hint_misses"]
+    rate = f"{c['profile_hint_hits'] / hinted:.1%}" if hinted else "-"
+    print(f"📇 Supplier profiles: {known}/{known + c['profile_docs_new']} documents from known "
+          f"suppliers, hint hit rate {rate}, {c['pattern_probes'] / c['pattern_fields']:.2f} "
+          f"regex probes per field")
+
+def analyze_pdf(p: Path, opts=None) -> dict:
+    # CPU/subprocess-bound part of the pipeline; safe to run in a worker process
+    opts = opts or {}
+    timings = {}  # stage -> seconds, reported as timings_ms
+    with timed(timings, "hash"):
+        content_hash = cache.file_hash(p)
+    store = _get_cache(opts.get("cache"))
+    with timed(timings, "cache_lookup"):
+        hit = store.get(cache_key(content_hash, opts)) if store is not None else None
+    if hit is not None:  # same bytes seen before (resend, renamed duplicate)
+        return {**hit["meta"], "file": p.name, "cache_hit": True, "timings_ms": _ms(timings)}
+
+    required = opts.get("required", REQUIRED_FIELDS)
+    load = partial(doctext.load, p, ocr_done=partial(_has_fields, required) if required else None,
+                   ocr_opts=opts.get("ocr_opts"))
+    tiers = opts.get("classify") or CLASSIFY_TIERS
+    with timed(timings, "text_extraction"):
+        doc = load(max_pages=int(tiers.get("probe_pages") or 0) or None)
+    profiles = _get_profiles(opts.get("profiles"))
+    scored = classify_pdf_with_hu_scorer(p, doc, timings, profiles)
+    probe = not doc.complete
+    if needs_full_text(doc, scored[1], tiers):
+        with timed(timings, "text_extraction"):
+            full = load(resume=doc)  # continues after the probe pages
+        scored = classify_pdf_with_hu_scorer(p, full, timings, profiles)  # the full text decides
+        doc = full
+
+    meta = document_meta(p, doc, scored, content_hash, probe, timings, opts)
+    if store is not None:
+        cache_put(store, cache_key(content_hash, opts), doc, scored, meta, opts)
+    meta["timings_ms"] = _ms(timings)
+    return meta
+
+def needs_full_text(doc, confidence, tiers) -> bool:
+    # clearly low stays "other" unread; likely invoices need every page for
+    # their fields, and both they and the ambiguous middle band are re-scored
+    # on the full text (later pages can lower the score too)
+    return not doc.complete and confidence > tiers.get("low", 0.2)
+
+def document_meta(p: Path, doc, scored, content_hash, probe, timings, opts=None) -> dict:
+    doc_type, confidence, currency, fields = scored
+    with timed(timings, "invoice_extraction"):
+        if doc_type == "invoice":
+            # the scorer's fields are what the "patterns" backend would return: not matched twice
+            meta = extract_invoice(str(p), doc=doc, backends=(opts or {}).get("backends", ()),
+                                   results={"patterns": fields}) or {}
+            if not meta.get("seller_tax_id"):  # set by the layout backend (extract.backends)
+                meta["seller_tax_id"] = seller_tax_id(doc, opts)
+        else:
+            meta = {}
+
+    meta.update({
+        "doc_type": doc_type,
+        "file": p.name,
+        "confidence": confidence,
+        "currency": currency or "",
+        "szamlaszam": fields.get("szamlaszam") or "",
+        "kibocsatas_datum": fields.get("kibocsatas_datum") or "",
+        "teljesites_datum": fields.get("teljesites_datum") or "",
+        "osszeg_netto": fields.get("osszeg_netto") or "",
+        "osszeg_brutto": fields.get("osszeg_brutto") or "",
+        "adoszam": fields.get("adoszam_any") or "",
+        "sha256": content_hash,
+        "probe_only": probe and not doc.complete,
+        **doc.meta()
+    })
+    return meta
+
+def seller_tax_id(doc, opts) -> str:
+    # first tax number that is not ours (profiles.own_tax_numbers); unknown ("")
+    # without them: the buyer's, i.e. ours, is usually the first one in the text
+    own = (opts or {}).get("own_tax_numbers")
+    if not own:
+        return ""
+    import profiles
+    return profiles.seller_tax_id(PATTERNS, doc.folded, profiles.own_keys(own))
+
+def seller_known(cfg) -> bool:
+    # seller_tax_id needs our own tax numbers, or the layout backend's seller column
+    return bool((cfg.get("profiles") or {}).get("own_tax_numbers")
+                or "layout" in ((cfg.get("extract") or {}).get("backends") or ()))
+
+def _ms(timings: dict) -> dict:
+    return {k: round(v * 1000, 3) for k, v in timings.items()}
+
+def _analyze_safe(p: Path, opts=None):
+    # exceptions are reported by the parent, so only ship their message back
+    prof = (opts or {}).get("profile")
+    try:
+        if prof:
+            with SlowProfiler(prof["dir"], prof["slow_ms"]).profile(p.name):
+                return p, analyze_pdf(p, opts), None
+        return p, analyze_pdf(p, opts), None
+    except Exception as e:
+        return p, None, str(e)
+
+def analyze_all(inputs, pool=None, opts=None):
+    """Yield (path, meta, error) in input order, serially or from a process pool."""
+    fn = partial(_analyze_safe, opts=opts)
+    if pool is None:
+        yield from map(fn, inputs)
+    else:
+        yield from pool.map(fn, inputs, chunksize=4)
+
+def open_log_writer(cfg) -> LogWriter:
+    return LogWriter.from_config(cfg)
+
+def _get_dupes(cfg):
+    key = ((cfg.get("dupes") or {}).get("path"), bool(cfg["run"].get("dry_run")))
+    if key not in _DUPES:
+        import dupes
+        _DUPES[key] = dupes.from_config(cfg)
+    return _DUPES[key]
+
+def close_dupes():
+    for index in _DUPES.values():
+        if index is not None:
+            index.close()
+    _DUPES.clear()
+
+def _get_notifier(cfg):
+    n = cfg.get("notify") or {}
+    key = (n.get("smtp_host"), n.get("smtp_port"), n.get("mail_to"))
+    if key not in _NOTIFIERS:
+        import notify
+        _NOTIFIERS[key] = notify.from_config(cfg)
+    return _NOTIFIERS[key]
+
+def close_notifiers():
+    # the last digest goes out here (bounded by notify.flush_timeout)
+    for notifier in _NOTIFIERS.values():
+        if notifier is not None:
+            notifier.close()
+    _NOTIFIERS.clear()
+
+def route_and_log(p: Path, meta: dict, cfg, log=None, metrics=None):
+    metrics = metrics if metrics is not None else Metrics()
+    doc_type, confidence = meta["doc_type"], meta["confidence"]
+    dupes = _get_dupes(cfg)
+    t0 = time.perf_counter()
+    dup = dupes.check(meta) if dupes is not None else None
+    if dup is not None:  # seen before: goes to routing.duplicates, not its type's folder
+        meta["duplicate_of"] = dup
+        doc_type = "duplicate"
+        metrics.inc("duplicates")
+    dest = route(str(p), doc_type, meta, cfg)
+    if dupes is not None:
+        dupes.add(meta, dest, dup)
+    dt = time.perf_counter() - t0
+    metrics.observe("routing", dt)
+    meta.setdefault("timings_ms", {})["routing"] = round(dt * 1000, 3)
+    rec = {"src": str(p), "dest": dest, **meta}
+    with metrics.stage("logging"):
+        if log is not None:
+            log.write(rec)
+        else:
+            append_logs(rec, cfg)
+    notifier = _get_notifier(cfg)
+    if notifier is not None:  # queued; never waits on SMTP
+        notifier.add(rec)
+    print(f"✅ {p.name} → {doc_type.upper()} ({confidence:.2f})")
+    return dest
+
+def process_batch(inputs, cfg, pool=None, log=None, metrics=None):
+    metrics = metrics if metrics is not None else Metrics()
+    # Results arrive in input order, so route() collision suffixes are deterministic
+    for p, meta, err in analyze_all(inputs, pool, analysis_opts(cfg)):
+        if err is not None:
+            metrics.inc("errors")
+            print(f"❌ Error processing {p.name}: {err}")
+            continue
+        metrics.add_doc(meta)
+        try:
+            route_and_log(p, meta, cfg, log, metrics)
+        except Exception as e:
+            metrics.inc("errors")
+            print(f"❌ Error processing {p.name}: {e}")
+    if log is not None:
+        log.flush()  # checkpoint: a finished batch is on disk
+    return metrics
+
+def _metrics_paths(cfg):
+    m = cfg.get("metrics") or {}
+    logs = Path(cfg.get("paths", {}).get("out_root", "./out")) / "logs"
+    return (m.get("summary", str(logs / "metrics.json")),
+            m.get("prometheus", str(logs / "metrics.prom")))
+
+def run_async(batches, cfg, log=None, metrics=None, on_batch=None, on_stop=None):
+    # asyncio pipeline (pipeline_async.py) instead of the worker pool
+    import pipeline_async
+    return pipeline_async.run(sys.modules[__name__], batches, cfg, log, metrics, on_batch, on_stop)
+
+def run_continuous(inbox: Path, cfg, pool=None, log=None, metrics=None, use_async=False, claimer=None):
+    # config, patterns and the worker pool were loaded once by main() and stay warm
+    run_cfg = cfg.get("run", {})
+    from watch import InboxWatcher
+    # a shared (NFS) inbox is polled: inotify misses files other hosts drop there
+    watcher = InboxWatcher(inbox, interval=run_cfg.get("poll_interval", 2.0),
+                           settle=run_cfg.get("settle_seconds", 1.0), use_inotify=claimer is None,
+                           on_idle=log.tick if log is not None else None)  # logs.flush_seconds
+    print(f"👀 Watching {inbox} ({watcher.mode}); Ctrl+C to stop")
+    prom = _metrics_paths(cfg)[1]
+    on_batch = (lambda: metrics.write_prometheus(prom)) if metrics is not None and prom else None
+    batches = watcher.batches()
+    if claimer is not None:  # shared inbox: only the files this instance wins
+        batches = claimer.batches(batches, run_cfg.get("dry_run"), defer=watcher.retry)
+    try:
+        if use_async:  # installs its own SIGTERM/SIGINT handling
+            run_async(batches, cfg, log, metrics, on_batch, on_stop=watcher.stop)
+            return
+        signal.signal(signal.SIGTERM, lambda *_: watcher.stop())
+        for batch in batches:
+            process_batch(batch, cfg, pool, log, metrics)
+            if on_batch is not None:
+                on_batch()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        batches.close()
+        watcher.close()
+
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument("--config", required=True)
+    parser.add_argument("--workers", type=int, default=None,
+                        help="analyze PDFs in N processes (routing/logging stay serial)")
+    parser.add_argument("--watch", action="store_true",
+                        help="keep running and process files as they land (run.continuous)")
+    parser.add_argument("--async", dest="use_async", action="store_true",
+                        help="asyncio pipeline with bounded queues between stages (run.async)")
+    parser.add_argument("--shard", metavar="K/N",
+                        help="claim mode on a shared inbox, preferring shard K of N (claim.*)")
     args = parser.parse_args()
 
     # Load YAML configuration
+    import yaml
     with open(args.config, "r", encoding="utf-8") as f:
         cfg = yaml.safe_load(f)
+    run_cfg = cfg.get("run", {})
+    workers = args.workers or int(run_cfg.get("workers", 1) or 1)
+    continuous = args.watch or bool(run_cfg.get("continuous"))
+    use_async = args.use_async or bool(run_cfg.get("async"))
 
     # Map your config (paths/routing schema)
     inbox = Path(cfg.get("paths", {}).get("inbox", "./samples"))
@@ -40,44 +383,62 @@ def main():
     # Ensure output dirs/logs exist (your helper expects out_root + routing)
     ensure_dirs(out_root, cfg.get("routing", {}))
 
-    # Collect PDFs from inbox
-    inputs = sorted(inbox.glob("*.pdf"))
-    if not inputs:
-        print(f"⚠️  No PDF files found in input folder: {inbox}")
-        return
+    if args.shard:
+        k, n = args.shard.split("/")
+        cfg["claim"] = {**(cfg.get("claim") or {}), "enabled": True, "shard": int(k), "shards": int(n)}
+    claimer = pool = log = None
+    metrics = Metrics()
+    try:  # a failed startup (e.g. SMTP credentials) still drops our claim dir
+        if (cfg.get("claim") or {}).get("enabled"):
+            import claim
+            claimer = claim.from_config(inbox, cfg)
+            claimer.recover()  # files left by crashed instances go back first
+            claimer.start()
 
-    for p in inputs:
-        try:
-            doc_type, confidence, currency, fields = classify_pdf_with_hu_scorer(p)
+        if (cfg.get("notify") or {}).get("enabled"):
+            _get_notifier(cfg)  # missing SMTP credentials fail here, before any document moves
 
-            if doc_type == "invoice":
-                meta = extract_invoice(str(p)) or {}
-            else:
-                meta = {}
-
-            meta.update({
-                "doc_type": doc_type,
-                "file": p.name,
-                "confidence": confidence,
-                "currency": currency or "",
-                "szamlaszam": fields.get("szamlaszam") or "",
-                "kibocsatas_datum": fields.get("kibocsatas_datum") or "",
-                "teljesites_datum": fields.get("teljesites_datum") or "",
-                "osszeg_netto": fields.get("osszeg_netto") or "",
-                "osszeg_brutto": fields.get("osszeg_brutto") or ""
-            })
-
-            dest = route(str(p), doc_type, meta, cfg)
-            rec = {"src": str(p), "dest": dest, **meta}
-            append_logs(rec, cfg)
-            print(f"✅ {p.name} → {doc_type.upper()} ({confidence:.2f})")
+        if workers > 1 and not use_async:
+            from concurrent.futures import ProcessPoolExecutor
+            pool = ProcessPoolExecutor(max_workers=workers)
+        log = open_log_writer(cfg)
+        if not seller_known(cfg):
+            uses = [name for name, on in (("the result store (store.py --adoszam)", log.store is not None),
+                                          ("duplicate checks (seller keys)",
+                                           (cfg.get("dupes") or {}).get("enabled"))) if on]
+            if uses:
+                print(f"⚠️  profiles.own_tax_numbers is empty: no seller tax number for {' and '.join(uses)}")
 
-        except Exception as e:
-            print(f"❌ Error processing {p.name}: {e}")
-
-    # Only send email if enabled in config (notify.enabled)
-    if cfg.get("notify", {}).get("enabled"):
-        send_email(cfg)
+        if continuous:
+            run_continuous(inbox, cfg, pool, log, metrics, use_async, claimer)
+        else:
+            # Collect PDFs from inbox
+            inputs = sorted(inbox.glob("*.pdf"))
+            if not inputs:
+                print(f"⚠️  No PDF files found in input folder: {inbox}")
+                return
+            batches = [inputs]
+            if claimer is not None:
+                batches = claimer.batches(batches, run_cfg.get("dry_run"))
+            if use_async:
+                run_async(batches, cfg, log, metrics)
+            else:
+                for batch in batches:
+                    process_batch(batch, cfg, pool, log, metrics)
+    finally:
+        if claimer is not None:
+            claimer.close()
+        close_dupes()
+        if log is not None:
+            log.close()
+        close_notifiers()
+        if pool is not None:
+            pool.shutdown()
+        close_profiles()
+        report_profiles(metrics)
+        summary_path = _metrics_paths(cfg)[0]
+        if summary_path and metrics.counters:
+            metrics.write_json(summary_path)
 
 if __name__ == "__main__":
     main()
@@ -1,23 +1,194 @@
-import os, smtplib
+import os, queue, random, smtplib, sys, threading, time
+from collections import Counter
 from email.mime.text import MIMEText
 
-def send_email(summary_rows, cfg):
-    if not cfg["notify"]["enabled"]:
-        return
-    body = "Processed documents:\n\n" + "\n".join(
-        f"- {r.get('doc_type','?')}: {r.get('file','?')} -> {r.get('dest','?')}" for r in summary_rows
-    )
-    msg = MIMEText(body, "plain", "utf-8")
-    msg["Subject"] = "Middleware Demo — Processing Summary"
-    msg["From"] = cfg["notify"]["mail_from"]
-    msg["To"] = cfg["notify"]["mail_to"]
+# Digest notifications. Routed records go into a bounded queue (add() never
+# blocks the pipeline); one background thread collects them into digests of at
+# most `digest_max` records or `digest_seconds` seconds and sends them over a
+# single SMTP connection that stays logged in between digests (closed after
+# `idle_seconds`). Transient failures (dropped connection, 4xx replies, network
+# errors) are retried with exponential backoff while new records keep queueing;
+# permanent ones (5xx, bad credentials) drop that digest and are reported.
+#
+# Local stand-in server for testing: `python -m aiosmtpd -n -l localhost:1025`
+# with notify: {smtp_host: localhost, smtp_port: 1025, use_tls: false, username: ""}.
+DEFAULTS = {"digest_max": 200, "digest_seconds": 300, "queue_size": 10000, "retries": 6,
+            "backoff": 2.0, "backoff_max": 300, "idle_seconds": 60, "timeout": 30,
+            "flush_timeout": 30}
 
-    password = os.environ.get(cfg["notify"]["password_env"], "")
+class PermanentError(Exception):
+    pass
+
+def _password(conf):
+    if not conf.get("username"):
+        return ""
+    env = conf.get("password_env", "SMTP_PASS")
+    password = os.environ.get(env, "")
     if not password:
-        raise RuntimeError(f"Missing env var {cfg['notify']['password_env']} for SMTP password")
+        raise RuntimeError(f"Missing env var {env} for SMTP password")
+    return password
+
+def format_digest(rows, conf) -> MIMEText:
+    counts = Counter(r.get("doc_type", "?") for r in rows)
+    dupes = sum(1 for r in rows if r.get("duplicate_of"))
+    parts = [f"{n} {t}" for t, n in sorted(counts.items())] + ([f"{dupes} duplicate"] if dupes else [])
+    body = f"Processed documents ({', '.join(parts)}):\n\n" + "\n".join(
+        f"- {r.get('doc_type', '?')}: {r.get('file', '?')} -> {r.get('dest', '?')}"
+        + (" (duplicate)" if r.get("duplicate_of") else "") for r in rows)
+    msg = MIMEText(body, "plain", "utf-8")
+    msg["Subject"] = f"Middleware Demo — Processing Summary ({len(rows)} documents)"
+    msg["From"] = conf["mail_from"]
+    msg["To"] = conf["mail_to"]
+    return msg
+
+class Mailer:
+    """One SMTP connection (STARTTLS + login once), reused while it stays up."""
+
+    def __init__(self, conf):
+        self.conf = {**DEFAULTS, **conf}
+        self.password = _password(self.conf)
+        self.smtp = None
+
+    def _connect(self):
+        c = self.conf
+        s = smtplib.SMTP(c["smtp_host"], int(c["smtp_port"]), timeout=float(c["timeout"]))
+        try:
+            if c.get("use_tls"):
+                s.starttls()
+            if c.get("username"):
+                s.login(c["username"], self.password)
+        except Exception:
+            s.close()
+            raise
+        self.smtp = s
+
+    def send(self, msg):
+        """Send msg, reconnecting once if the kept connection went stale.
+        Raises PermanentError for failures a retry cannot fix."""
+        for attempt in (0, 1):
+            if self.smtp is None:
+                try:
+                    self._connect()
+                except smtplib.SMTPAuthenticationError as e:
+                    raise PermanentError(f"SMTP login failed: {e}") from e
+            try:
+                self.smtp.send_message(msg)
+                return
+            except smtplib.SMTPServerDisconnected:
+                self.close()  # server timed the idle connection out: reconnect once
+                if attempt:
+                    raise
+            except smtplib.SMTPRecipientsRefused as e:
+                raise PermanentError(f"recipients refused: {e.recipients}") from e
+            except smtplib.SMTPResponseException as e:
+                if e.smtp_code >= 500:
+                    raise PermanentError(f"SMTP {e.smtp_code}: {e.smtp_error!r}") from e
+                raise
 
-    with smtplib.SMTP(cfg["notify"]["smtp_host"], cfg["notify"]["smtp_port"]) as s:
-        if cfg["notify"]["use_tls"]:
-            s.starttls()
-        s.login(cfg["notify"]["username"], password)
-        s.send_message(msg)
+    def close(self):
+        if self.smtp is not None:
+            try:
+                self.smtp.quit()
+            except (smtplib.SMTPException, OSError):
+                self.smtp.close()
+            self.smtp = None
+
+class Notifier:
+    def __init__(self, conf, mailer=None):
+        self.conf = {**DEFAULTS, **conf}
+        self.mailer = mailer or Mailer(self.conf)
+        self.q = queue.Queue(maxsize=int(self.conf["queue_size"]))
+        self.sent = self.failed = self.dropped = self.digests = 0
+        self._stop, self._abort = threading.Event(), threading.Event()
+        self._thread = threading.Thread(target=self._run, name="notify", daemon=True)
+        self._thread.start()
+
+    def add(self, rec: dict):
+        """Queue a routed record; never blocks (a full queue drops it)."""
+        try:
+            self.q.put_nowait(rec)
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        c = self.conf
+        size, window = int(c["digest_max"]), float(c["digest_seconds"])
+        pending, due = [], None
+        while True:
+            stopping = self._stop.is_set()
+            try:
+                if stopping:
+                    rec = self.q.get_nowait()  # drain what is left, then exit
+                else:
+                    wait = due - time.monotonic() if pending else float(c["idle_seconds"])
+                    rec = self.q.get(timeout=max(0.0, wait))
+            except queue.Empty:
+                rec = None  # (None is also close()'s wake-up call)
+            if rec is not None:
+                if not pending:
+                    due = time.monotonic() + window
+                pending.append(rec)
+            if pending and (len(pending) >= size or time.monotonic() >= due
+                            or rec is None and stopping):
+                rows, pending = pending[:size], pending[size:]
+                due = time.monotonic() + window if pending else None
+                self._deliver(rows)
+            elif rec is None and not pending:
+                if stopping:
+                    break
+                self.mailer.close()  # idle: don't hold the connection open
+        self.mailer.close()
+
+    def _deliver(self, rows):
+        c, delay = self.conf, float(self.conf["backoff"])
+        msg = format_digest(rows, c)
+        retries = int(c["retries"])
+        for attempt in range(retries + 1):
+            try:
+                self.mailer.send(msg)
+                self.sent += len(rows)
+                self.digests += 1
+                return
+            except PermanentError as e:
+                print(f"📧 digest of {len(rows)} records not sent: {e}", file=sys.stderr)
+                break
+            except (smtplib.SMTPException, OSError) as e:  # transient: back off, records keep queueing
+                if not isinstance(e, smtplib.SMTPResponseException):
+                    self.mailer.close()  # a 4xx reply leaves the session usable
+                if attempt == retries or self._abort.wait(delay * random.uniform(0.5, 1.0)):
+                    print(f"📧 digest of {len(rows)} records not sent after {attempt + 1} "
+                          f"attempts: {e}", file=sys.stderr)
+                    break
+                delay = min(delay * 2, float(c["backoff_max"]))
+        self.failed += len(rows)
+
+    def close(self, timeout=None):
+        """Send what is queued, waiting up to notify.flush_timeout seconds."""
+        self._stop.set()
+        try:
+            self.q.put_nowait(None)  # wake the worker if it waits for records
+        except queue.Full:
+            pass
+        self._thread.join(float(self.conf["flush_timeout"]) if timeout is None else timeout)
+        if self._thread.is_alive():
+            self._abort.set()  # stop backing off; the daemon thread ends with the process
+            print(f"📧 notifications still pending after the flush timeout; "
+                  f"{self.q.qsize()} queued records not sent", file=sys.stderr)
+        if self.dropped:
+            print(f"📧 {self.dropped} records dropped (notify.queue_size full)", file=sys.stderr)
+
+def from_config(cfg):
+    """Notifier for cfg["notify"], or None when disabled."""
+    conf = (cfg or {}).get("notify") or {}
+    return Notifier(conf) if conf.get("enabled") else None
+
+def send_email(summary_rows, cfg):
+    # one digest, sent synchronously (scripts); the pipeline uses Notifier
+    conf = cfg["notify"]
+    if not conf["enabled"]:
+        return
+    mailer = Mailer(conf)
+    try:
+        mailer.send(format_digest(list(summary_rows), conf))
+    finally:
+        mailer.close()
@@ -0,0 +1,76 @@
+import os, resource
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+# Page-at-a-time OCR: render one page, recognise it, drop the image. At most
+# `in_flight` rendered pages exist at once, so memory no longer grows with
+# page count (convert_from_path(path) used to rasterise the whole scan).
+LANG = "hun+eng"
+DPI = 200
+IN_FLIGHT = 2
+
+def rss_kb() -> int:
+    """Current resident set size of this process in KiB."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") // 1024
+    except (OSError, ValueError, IndexError):  # non-Linux: lifetime peak is the best we have
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+def page_count(pdf_path: str) -> int:
+    from pdf2image import pdfinfo_from_path
+    return int(pdfinfo_from_path(str(pdf_path))["Pages"])
+
+def _ocr_page(pdf_path, n, dpi, lang, peak):
+    from pdf2image import convert_from_path
+    import pytesseract
+    img = convert_from_path(str(pdf_path), dpi=dpi, first_page=n, last_page=n)[0]
+    try:
+        peak.append(rss_kb())  # the rendered bitmap is alive right now
+        return pytesseract.image_to_string(img, lang=lang)
+    finally:
+        img.close()
+
+def iter_pages(pdf_path, dpi=DPI, lang=LANG, in_flight=IN_FLIGHT, peak=None, total=None, first=1):
+    """Yield OCR text page by page, in order, with <= in_flight pages rendered."""
+    peak = peak if peak is not None else []
+    total = total if total is not None else page_count(pdf_path)
+    in_flight = max(1, int(in_flight))
+    with ThreadPoolExecutor(max_workers=in_flight) as pool:
+        pending, nxt = deque(), first
+        try:
+            while nxt <= total and len(pending) < in_flight:
+                pending.append(pool.submit(_ocr_page, pdf_path, nxt, dpi, lang, peak)); nxt += 1
+            while pending:
+                text = pending.popleft().result()
+                if nxt <= total:
+                    pending.append(pool.submit(_ocr_page, pdf_path, nxt, dpi, lang, peak)); nxt += 1
+                yield text
+        finally:
+            for fut in pending:  # early stop: don't render pages nobody will read
+                fut.cancel()
+
+def ocr_document(pdf_path, done=None, dpi=DPI, lang=LANG, in_flight=IN_FLIGHT, max_pages=None,
+                 pages=()):
+    """OCR a PDF (or its first max_pages); stop as soon as done(text_so_far) is true.
+    pages: text of the first pages, already OCR'd (a probe); OCR goes on after them.
+
+    Returns (pages, stats) where stats has the pages read/total and the peak
+    RSS (KiB) sampled while page bitmaps were alive."""
+    peak = [rss_kb()]
+    doc_pages = page_count(pdf_path)
+    pages, total = list(pages), min(doc_pages, max_pages) if max_pages else doc_pages
+    stopped = bool(pages) and done is not None and len(pages) < total and done("\f".join(pages))
+    gen = iter_pages(pdf_path, dpi=dpi, lang=lang, in_flight=in_flight, peak=peak,
+                     total=0 if stopped else total, first=len(pages) + 1)
+    try:
+        for text in gen:
+            pages.append(text)
+            if done is not None and len(pages) < total and done("\f".join(pages)):
+                stopped = True
+                break
+    finally:
+        gen.close()
+    peak.append(rss_kb())
+    return pages, {"ocr_pages": len(pages), "ocr_total_pages": doc_pages,
+                   "ocr_stopped_early": stopped, "peak_rss_kb": max(peak)}
@@ -0,0 +1,311 @@
+import json, re
+from functools import lru_cache
+
+from textnorm import Folded, fold_pattern
+
+# Compiled view of patterns_hu.json ({field: [regex, ...]}, first match wins).
+#
+# Every pattern that starts with a literal word ("Számlaszám", "Kelt", ...) can
+# only match where that word occurs. The text is casefolded once and each anchor
+# word located with str.find; patterns whose anchor is absent are skipped and the
+# rest start searching at the anchor's first offset. Patterns without a usable
+# anchor (leading group, top-level "|") are always searched, as before.
+#
+# With fold=True patterns run against the accent-folded view (textnorm): the
+# sources are folded at compile time ("Számla" -> "szamla", (?i) dropped), so
+# "Számla", "SZAMLA" and "Szamla" all match without variant classes, and the
+# returned matches give their groups back in the original text. Only the label
+# part is matched folded: from its first capturing group on, a pattern is
+# matched again on the original text (value_pattern), so a value class like
+# [A-Z0-9] still stops at "Á" and label words are not taken as values.
+
+_FLAGS = re.compile(r"^\(\?([aiLmsux]+)\)")
+_META = set("\\.^$*+?{}[]|()")
+MIN_ANCHOR = 3
+
+def _top_level_alternation(body: str) -> bool:
+    depth, in_class, i = 0, False, 0
+    while i < len(body):
+        c = body[i]
+        if c == "\\":
+            i += 2
+            continue
+        if in_class:
+            in_class = c != "]"
+        elif c == "[":
+            in_class = True
+            if body[i + 1:i + 2] == "]":  # "[]...]" keeps the first "]" literal
+                i += 1
+        elif c == "(":
+            depth += 1
+        elif c == ")":
+            depth -= 1
+        elif c == "|" and depth == 0:
+            return True
+        i += 1
+    return False
+
+def literal_anchor(src: str):
+    """Literal word every match of `src` must start with, or None."""
+    m = _FLAGS.match(src)
+    if m and "x" in m.group(1):
+        return None
+    body = src[m.end():] if m else src
+    if _top_level_alternation(body):
+        return None
+    while body.startswith(r"\b"):
+        body = body[2:]
+    lit, i = [], 0
+    while i < len(body):
+        c = body[i]
+        if c == "\\":
+            nxt = body[i + 1:i + 2]
+            if not nxt or nxt.isalnum():  # \s, \d, \b ... end the literal
+                break
+            lit.append(nxt)
+            i += 2
+            continue
+        if c in _META:
+            break
+        lit.append(c)
+        i += 1
+    if i < len(body) and body[i] in "*?{":  # quantifier makes the last char optional
+        lit = lit[:-1]
+    anchor = "".join(lit)
+    return anchor if len(anchor) >= MIN_ANCHOR else None
+
+def value_pattern(src: str):
+    """src from its first capturing group on (leading flags kept), or None
+    when there is none or it sits inside a group or an alternation."""
+    m = _FLAGS.match(src)
+    flags, body = (m.group(0), src[m.end():]) if m else ("", src)
+    if _top_level_alternation(body):
+        return None
+    depth, in_class, i = 0, False, 0
+    while i < len(body):
+        c = body[i]
+        if c == "\\":
+            i += 2
+            continue
+        if in_class:
+            in_class = c != "]"
+        elif c == "[":
+            in_class = True
+            if body[i + 1:i + 2] == "]":
+                i += 1
+        elif c == "(":
+            if body[i + 1:i + 2] != "?" or body.startswith("(?P<", i):
+                return flags + body[i:] if depth == 0 else None
+            depth += 1
+        elif c == ")":
+            depth -= 1
+        i += 1
+    return None
+
+class PatternSet(dict):
+    """patterns_hu.json, validated and compiled once.
+
+    Still a plain {field: [pattern, ...]} dict for callers that inspect it."""
+
+    def __init__(self, patterns: dict, fold=False):
+        super().__init__(patterns)
+        self.fold = fold
+        self.compiled = {}    # field -> [(compiled regex, anchor id | None), ...]
+        self._value_rx = {}   # fold mode: field -> [value_pattern compiled | None, ...]
+        anchors = {}          # anchor word -> id
+        for key, plist in self.items():
+            if not isinstance(plist, list) or not plist:
+                raise ValueError(f"patterns: {key!r} must be a non-empty list of regexes")
+            entries, values = [], []
+            for i, p in enumerate(plist):
+                if not isinstance(p, str):
+                    raise ValueError(f"patterns: {key}[{i}] is not a string")
+                if fold:
+                    v = value_pattern(p)
+                    values.append(re.compile(v) if v else None)
+                    p = fold_pattern(p)
+                try:
+                    rx = re.compile(p)
+                except re.error as e:
+                    raise ValueError(f"patterns: {key}[{i}] does not compile: {e}") from None
+                a = literal_anchor(p)
+                aid = anchors.setdefault(a, len(anchors)) if a else None
+                entries.append((rx, aid))
+            self.compiled[key] = entries
+            self._value_rx[key] = values
+
+        self._anchors = [(w.casefold(), re.compile("(?i)" + re.escape(w)), aid)
+                         for w, aid in anchors.items()]
+        self._field_anchors = {key: {aid for _, aid in entries if aid is not None}
+                               for key, entries in self.compiled.items()}
+        self._words = {aid: w for w, _, aid in self._anchors}
+
+    def anchor_offsets(self, text: str, aids=None) -> dict:
+        """anchor id -> first offset of that word (case-insensitive); only the
+        anchors in aids when given."""
+        first = {}
+        anchors = self._anchors if aids is None else [a for a in self._anchors if a[2] in aids]
+        folded = text if self.fold else text.casefold()
+        if len(folded) == len(text):
+            for w, _, aid in anchors:
+                i = folded.find(w)
+                if i >= 0:
+                    first[aid] = i
+        else:  # casefolding shifted offsets (e.g. "ß" -> "ss"): use the regex form
+            for _, rx, aid in anchors:
+                m = rx.search(text)
+                if m:
+                    first[aid] = m.start()
+        return first
+
+    def search(self, text, keys=None, hints=None, stats=None) -> dict:
+        """field -> (pattern index, match) of the first pattern that matches.
+        In fold mode text may be a textnorm.Folded view (built once per text).
+
+        hints: {field: (pattern index, start, end)} from a supplier profile
+        (profiles.py): that pattern is tried first, on text[start:end] only
+        (offsets in the searched text, i.e. the folded one in fold mode); on a
+        miss the field falls back to the full list. stats (a Counter, or a dict
+        with these keys) counts regex "probes", "hint_hits" and "hint_misses"."""
+        if self.fold:
+            view = text if isinstance(text, Folded) else Folded(text)
+            return self._search(view.folded, keys, hints, stats, view)
+        return self._search(text.text if isinstance(text, Folded) else text, keys, hints, stats)
+
+    def _search(self, text: str, keys=None, hints=None, stats=None, view=None) -> dict:
+        first = None  # anchor offsets: only needed once a field is not hinted (or missed)
+        out, probes = {}, 0
+        keys = self.compiled if keys is None else keys
+        for key in keys:
+            entries = self.compiled[key]
+            hint = hints.get(key) if hints else None
+            if hint is not None and hint[0] < len(entries):
+                idx, start, end = hint
+                probes += 1
+                m = self._probe(text, key, idx, start, end, view)
+                if stats is not None:
+                    stats["hint_hits" if m else "hint_misses"] += 1
+                if m:
+                    out[key] = (idx, m)
+                    continue
+            if first is None:  # the anchors of every field of this call, in one go
+                first = self.anchor_offsets(text, None if keys is self.compiled else
+                                            set().union(*(self._field_anchors[k] for k in keys)))
+            for idx, (rx, aid) in enumerate(entries):
+                if aid is None:
+                    m = self._match(text, key, idx, 0, len(text), view)
+                elif aid in first:
+                    m = self._match(text, key, idx, first[aid], len(text), view)
+                else:
+                    continue
+                probes += 1
+                if m:
+                    out[key] = (idx, m)
+                    break
+        if stats is not None:
+            stats["probes"] += probes
+        return out
+
+    def probe(self, text, key, idx, start=0, end=None):
+        """One regex probe: pattern idx of field key on text[start:end] (the
+        searched text: folded in fold mode, where text may be a Folded view),
+        starting at its anchor word."""
+        if self.fold:
+            view = text if isinstance(text, Folded) else Folded(text)
+            return self._probe(view.folded, key, idx, start, end, view)
+        return self._probe(text.text if isinstance(text, Folded) else text, key, idx, start, end)
+
+    def _probe(self, text: str, key, idx, start=0, end=None, view=None):
+        aid = self.compiled[key][idx][1]
+        end = len(text) if end is None else end
+        if aid is not None and self.fold:  # folded text: the anchor is a plain find
+            start = text.find(self._words[aid], start, end)
+            if start < 0:
+                return None
+        return self._match(text, key, idx, start, end, view)
+
+    def _match(self, text: str, key, idx, start, end, view=None):
+        # fold mode: the folded match only places the label; its value part
+        # must also match the original text (value_pattern), else search on.
+        # A blank value ("Vegosszeg HUF" -> " ") is no match either.
+        rx = self.compiled[key][idx][0]
+        vrx = self._value_rx[key][idx] if view is not None else None
+        m = rx.search(text, start, end)
+        while m is not None:
+            if view is None:
+                found = m
+            elif vrx is None:
+                found = view.match(m)
+            else:
+                vm = vrx.match(view.text, *view.span(m.start(1), end))
+                found = view.match(m, vm) if vm is not None else None
+            if found is not None and _value(found).strip():
+                return found
+            m = rx.search(text, m.start() + 1, end)
+        return None
+
+    def finditer(self, text, key):
+        """Every match of field key: pattern by pattern, each in text order."""
+        for idx in range(len(self.compiled[key])):
+            m = self.probe(text, key, idx)
+            while m is not None:
+                yield m
+                s, e = getattr(m, "m", m).span()  # offsets in the searched text
+                m = self.probe(text, key, idx, max(e, s + 1))
+
+    def extract(self, text) -> dict:
+        return self._values(self.search(text))
+
+    def _values(self, found: dict) -> dict:
+        out = {}
+        for key in self.compiled:
+            m = found.get(key, (None, None))[1]
+            out[key] = _value(m).strip() if m else None
+        return out
+
+    def extract_pages(self, pages, fields=None, carry=1):
+        """extract() over pages as they arrive; stops pulling pages once every
+        field in `fields` (default: all) is settled. Returns (values, pages read).
+
+        Pattern priority holds across pages, as in extract() on the whole
+        text: a field found by pattern i on one page is still looked for with
+        patterns 0..i-1 on the pages after it, and only a match of its first
+        pattern settles it. Matches must fit in one page plus the last `carry`
+        lines of the page before, so labels and values split across a page
+        break are still found."""
+        want = set(fields or self.compiled)
+        found, tail, n = {}, "", 0
+        for page in pages:
+            n += 1
+            text = tail + page
+            view = Folded(text) if self.fold else text  # folded once per page
+            for key, entries in self.compiled.items():
+                for idx in range(found[key][0] if key in found else len(entries)):
+                    m = self.probe(view, key, idx)
+                    if m:
+                        found[key] = (idx, m)
+                        break
+            if all(found.get(k, (1,))[0] == 0 for k in want):
+                break
+            if carry:
+                tail = "\n".join(page.rstrip("\n").rsplit("\n", carry)[-carry:]) + "\n"
+        return self._values(found), n
+
+    def matched(self, text) -> set:
+        return set(self.search(text))
+
+def _value(m) -> str:
+    return m.group(1 if m.re.groups else 0) or ""
+
+def signal_set(patterns: list, fold=False) -> PatternSet:
+    # each signal regex becomes its own field so hits can be counted
+    return PatternSet({f"s{i}": [p] for i, p in enumerate(patterns)}, fold)
+
+@lru_cache(maxsize=8)
+def _from_json(blob: str, fold: bool) -> PatternSet:
+    return PatternSet(json.loads(blob), fold)
+
+def as_pattern_set(patterns, fold=False) -> PatternSet:
+    if isinstance(patterns, PatternSet):
+        return patterns
+    return _from_json(json.dumps(patterns), fold)
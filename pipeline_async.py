@@ -0,0 +1,310 @@
+import asyncio, heapq, signal, subprocess, sys
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from pathlib import Path
+
+import cache
+import doctext
+from ocr import rss_kb
+
+# asyncio pipeline for middleware_demo --async:
+#
+#   feed -> q -> [extract x N] -> q -> [analyze x M] -> q -> [route x 1]
+#
+# pdftotext and OCR (pdftoppm | tesseract) run as asyncio subprocesses, so many
+# documents wait on poppler/tesseract at once while the regex scoring of the
+# ones already read runs on the loop. Queues are bounded (backpressure), each
+# stage has its own concurrency, and route()/log writes go to one I/O thread.
+PIPELINE = {"extract": 4, "ocr": 2, "analyze": 2, "queue_size": 16}
+
+class Limits:
+    def __init__(self, conf):
+        self.conf = {**PIPELINE, **(conf or {})}
+        self.text = asyncio.Semaphore(max(1, int(self.conf["extract"])))  # pdftotext processes
+        self.ocr = asyncio.Semaphore(max(1, int(self.conf["ocr"])))       # pages being OCR'd
+
+async def _run(cmd, data=None) -> bytes:
+    proc = await asyncio.create_subprocess_exec(
+        *cmd, stdin=subprocess.PIPE if data is not None else subprocess.DEVNULL,
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    try:
+        out, err = await proc.communicate(data)
+    except asyncio.CancelledError:  # SIGTERM / early stop: don't leave children behind
+        if proc.returncode is None:
+            proc.kill()
+            await proc.wait()
+        raise
+    if proc.returncode:
+        raise subprocess.CalledProcessError(proc.returncode, cmd, out, err)
+    return out
+
+async def pdftotext_pages(pdf_path, layout=True, last_page=None, chunk=1 << 16, first_page=None) -> list:
+    # stdout is split into pages as it arrives, never held as one bytes blob
+    cmd = doctext.pdftotext_cmd(pdf_path, layout, last_page, first_page)
+    proc = await asyncio.create_subprocess_exec(*cmd, stdin=subprocess.DEVNULL,
+                                                stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    split, pages = doctext.PageSplitter(), []
+    err = asyncio.ensure_future(proc.stderr.read())
+    try:
+        while data := await proc.stdout.read(chunk):
+            pages += split.feed(data)
+        if await proc.wait():
+            print((await err).decode("utf-8", errors="ignore"), file=sys.stderr)
+            raise subprocess.CalledProcessError(proc.returncode, cmd)
+        await err
+    except asyncio.CancelledError:
+        err.cancel()
+        if proc.returncode is None:
+            proc.kill()
+            await proc.wait()
+        raise
+    return pages + split.close()
+
+async def page_count(pdf_path) -> int:
+    out = (await _run(["pdfinfo", str(pdf_path)])).decode("utf-8", errors="ignore")
+    for line in out.splitlines():
+        if line.startswith("Pages:"):
+            return int(line.split()[1])
+    return 0
+
+async def ocr_page(pdf_path, n, dpi, lang, limit, peak=None) -> str:
+    async with limit:
+        png = await _run(["pdftoppm", "-png", "-r", str(dpi), "-f", str(n), "-l", str(n),
+                          "-singlefile", str(pdf_path)])
+        if peak is not None:
+            peak.append(rss_kb())  # the rendered page is alive right now, as in ocr.py
+        out = await _run(["tesseract", "stdin", "stdout", "-l", lang], png)
+    return out.decode("utf-8", errors="ignore")
+
+async def ocr_document(pdf_path, limit, done=None, dpi=200, lang="hun+eng", in_flight=2,
+                       max_pages=None, pages=()):
+    """Async ocr.ocr_document: pages in order, <= in_flight per document;
+    pages: the probe's pages, OCR goes on after them."""
+    peak = [rss_kb()]
+    doc_pages = await page_count(pdf_path)
+    total = min(doc_pages, max_pages) if max_pages else doc_pages
+    pages, pending = list(pages), deque()
+    nxt = len(pages) + 1
+    stopped = bool(pages) and done is not None and len(pages) < total and done("\f".join(pages))
+    if stopped:
+        total = 0
+    task = lambda n: asyncio.ensure_future(ocr_page(pdf_path, n, dpi, lang, limit, peak))
+    try:
+        while nxt <= total and len(pending) < max(1, int(in_flight)):
+            pending.append(task(nxt)); nxt += 1
+        while pending:
+            pages.append(await pending.popleft())
+            if done is not None and len(pages) < total and done("\f".join(pages)):
+                stopped = True
+                break
+            if nxt <= total:
+                pending.append(task(nxt)); nxt += 1
+    finally:
+        for t in pending:  # early stop or cancellation kills the page subprocesses
+            t.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+    peak.append(rss_kb())
+    doc = doctext.DocText(pdf_path, pages, "ocr", False,
+                          {"ocr_pages": len(pages), "ocr_total_pages": doc_pages,
+                           "ocr_stopped_early": stopped, "peak_rss_kb": max(peak)})
+    doc.complete = not max_pages or doc_pages <= max_pages
+    return doc
+
+async def load(p: Path, limits: Limits, ocr_done=None, ocr_opts=None, max_pages=None, resume=None):
+    """doctext.load() with the poppler/tesseract calls awaited instead of blocking."""
+    if resume is not None and not resume.complete:
+        return await load_rest(p, limits, resume, ocr_done, ocr_opts)
+    last = max_pages + 1 if max_pages else None
+    try:
+        async with limits.text:
+            pages = await pdftotext_pages(p, last_page=last)
+        doc = doctext.DocText(p, pages, "text", True, max_pages=max_pages)
+    except FileNotFoundError:  # no poppler: the blocking pdfminer/OCR path, off the loop
+        return await asyncio.get_running_loop().run_in_executor(None, partial(
+            doctext.load, p, ocr_done=ocr_done, ocr_opts=ocr_opts, max_pages=max_pages))
+    if doc:
+        return doc
+    try:
+        return await ocr_document(p, limits.ocr, done=ocr_done, max_pages=max_pages,
+                                  **(ocr_opts or {}))
+    except (OSError, subprocess.CalledProcessError) as e:
+        print(f"OCR unavailable ({e}); {p.name} kept without text", file=sys.stderr)
+        return doc
+
+async def load_rest(p: Path, limits: Limits, head, ocr_done=None, ocr_opts=None):
+    # doctext.load(resume=head): only the pages after the probe
+    if head.source == "ocr":
+        try:
+            return await ocr_document(p, limits.ocr, done=ocr_done, pages=head.pages, **(ocr_opts or {}))
+        except (OSError, subprocess.CalledProcessError) as e:
+            print(f"OCR unavailable ({e}); {p.name} kept with its first pages", file=sys.stderr)
+            return head
+    known = head.pages + head.overflow  # the probe's extra page is not read again
+    first = len(known) + 1
+    try:
+        async with limits.text:
+            more = await page_count(p) >= first
+            rest = await pdftotext_pages(p, layout=head.layout, first_page=first) if more else []
+    except FileNotFoundError:  # no poppler: pdfminer, off the loop
+        return await asyncio.get_running_loop().run_in_executor(None, partial(
+            doctext.load, p, ocr_done=ocr_done, ocr_opts=ocr_opts, resume=head))
+    return doctext.DocText(p, known + rest, "text", head.layout)
+
+class Pipeline:
+    def __init__(self, md, cfg, log, metrics):
+        # md is the middleware_demo module (scorer, meta and route helpers)
+        self.md, self.cfg, self.log, self.metrics = md, cfg, log, metrics
+        self.opts = md.analysis_opts(cfg)
+        self.limits = Limits(cfg.get("pipeline"))
+        size = max(1, int(self.limits.conf["queue_size"]))
+        self.q_extract, self.q_analyze, self.q_route = (asyncio.Queue(size) for _ in range(3))
+        self.io = ThreadPoolExecutor(max_workers=1, thread_name_prefix="route")
+        self._seq = 0
+        self._ready, self._next = [], 0  # reorder buffer: route in input order
+
+    async def extract(self, item):
+        seq, p = item
+        loop, timings = asyncio.get_running_loop(), {}
+        with self.md.timed(timings, "hash"):
+            content_hash = await loop.run_in_executor(None, cache.file_hash, p)
+        store = self.md._get_cache(self.opts.get("cache"))  # loop thread only
+        with self.md.timed(timings, "cache_lookup"):
+            hit = store.get(self.md.cache_key(content_hash, self.opts)) if store is not None else None
+        if hit is not None:
+            meta = {**hit["meta"], "file": p.name, "cache_hit": True,
+                    "timings_ms": self.md._ms(timings)}
+            return self.q_route, (seq, p, meta, None)
+        tiers = self.opts.get("classify") or self.md.CLASSIFY_TIERS
+        with self.md.timed(timings, "text_extraction"):
+            doc = await self._load(p, max_pages=int(tiers.get("probe_pages") or 0) or None)
+        return self.q_analyze, (seq, p, doc, content_hash, timings)
+
+    async def analyze(self, item):
+        seq, p, doc, content_hash, timings = item
+        md, tiers = self.md, self.opts.get("classify") or self.md.CLASSIFY_TIERS
+        profiles = md._get_profiles(self.opts.get("profiles"))
+        scored = md.classify_pdf_with_hu_scorer(p, doc, timings, profiles)
+        probe = not doc.complete
+        if md.needs_full_text(doc, scored[1], tiers):
+            with md.timed(timings, "text_extraction"):
+                full = await self._load(p, resume=doc)
+            scored = md.classify_pdf_with_hu_scorer(p, full, timings, profiles)  # the full text decides
+            doc = full
+        # invoice extraction may parse the PDF again (extract.backends: layout): off the loop
+        meta = await asyncio.get_running_loop().run_in_executor(None, partial(
+            md.document_meta, p, doc, scored, content_hash, probe, timings, self.opts))
+        store = md._get_cache(self.opts.get("cache"))
+        if store is not None:
+            md.cache_put(store, md.cache_key(content_hash, self.opts), doc, scored, meta, self.opts)
+        meta["timings_ms"] = md._ms(timings)
+        return self.q_route, (seq, p, meta, None)
+
+    async def route(self, item):
+        # results finish out of order; route() in input order keeps name suffixes stable
+        heapq.heappush(self._ready, (item[0], item))
+        while self._ready and self._ready[0][0] == self._next:
+            _, (_, p, meta, err) = heapq.heappop(self._ready)
+            self._next += 1
+            if err is not None:
+                self.metrics.inc("errors")
+                print(f"❌ Error processing {p.name}: {err}")
+                continue
+            self.metrics.add_doc(meta)
+            fut = asyncio.get_running_loop().run_in_executor(
+                self.io, self.md.route_and_log, p, meta, self.cfg, self.log, self.metrics)
+            try:
+                await asyncio.shield(fut)
+            except asyncio.CancelledError:
+                await asyncio.wait([fut])  # a move already started completes; then stop
+                raise
+            except Exception as e:
+                self.metrics.inc("errors")
+                print(f"❌ Error processing {p.name}: {e}")
+        return None, None
+
+    def _load(self, p, max_pages=None, resume=None):
+        required = self.opts.get("required")
+        done = partial(self.md._has_fields, required) if required else None
+        return load(p, self.limits, ocr_done=done, ocr_opts=self.opts.get("ocr_opts"),
+                    max_pages=max_pages, resume=resume)
+
+    async def _worker(self, q_in, fn):
+        while True:
+            item = await q_in.get()
+            try:
+                try:
+                    q_out, out = await fn(item)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:  # forward the failure so the reorder buffer moves on
+                    q_out, out = self.q_route, (item[0], item[1], None, str(e))
+                if q_out is not None:
+                    await q_out.put(out)
+            finally:
+                q_in.task_done()
+
+    async def feed(self, batches, on_batch=None):
+        loop = asyncio.get_running_loop()
+        it = iter(batches)
+        while True:
+            pull = loop.run_in_executor(None, next, it, None)  # watcher blocks
+            try:
+                batch = await asyncio.shield(pull)
+            except asyncio.CancelledError:
+                # next() can't be interrupted: let it return (on_stop ends the
+                # watcher) so the caller's batches.close() does not find the
+                # generator still executing in the thread
+                await asyncio.wait([pull])
+                raise
+            if batch is None:
+                return
+            for p in batch:
+                await self.q_extract.put((self._seq, Path(p)))  # blocks while the pipeline is full
+                self._seq += 1
+            for q in (self.q_extract, self.q_analyze, self.q_route):
+                await q.join()
+            if self.log is not None:  # checkpoint: a finished batch is on disk
+                await loop.run_in_executor(self.io, self.log.flush)
+            if on_batch is not None:
+                on_batch()
+
+    async def run(self, batches, on_batch=None, on_stop=None):
+        loop, stop = asyncio.get_running_loop(), asyncio.Event()
+
+        def _stop():
+            stop.set()
+            if on_stop is not None:
+                on_stop()
+
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(sig, _stop)
+        n = lambda k: max(1, int(self.limits.conf[k]))
+        workers = ([asyncio.ensure_future(self._worker(self.q_extract, self.extract))
+                    for _ in range(n("extract"))] +
+                   [asyncio.ensure_future(self._worker(self.q_analyze, self.analyze))
+                    for _ in range(n("analyze"))] +
+                   [asyncio.ensure_future(self._worker(self.q_route, self.route))])
+        feeder = asyncio.ensure_future(self.feed(batches, on_batch))
+        stopper = asyncio.ensure_future(stop.wait())
+        try:
+            await asyncio.wait([feeder, stopper], return_when=asyncio.FIRST_COMPLETED)
+            if stop.is_set():
+                print("🛑 Stopping; unrouted files stay in the inbox")
+            else:
+                feeder.result()  # re-raise a feeder error
+        finally:
+            for t in workers + [feeder, stopper]:
+                t.cancel()
+            await asyncio.gather(*workers, feeder, stopper, return_exceptions=True)
+            for sig in (signal.SIGTERM, signal.SIGINT):
+                loop.remove_signal_handler(sig)
+            if self.log is not None:
+                await loop.run_in_executor(self.io, self.log.flush)
+            self.io.shutdown()
+        return self.metrics
+
+def run(md, batches, cfg, log=None, metrics=None, on_batch=None, on_stop=None):
+    """Drive the pipeline over an iterable of input batches (a list, or watcher.batches())."""
+    metrics = metrics if metrics is not None else md.Metrics()
+    return asyncio.run(Pipeline(md, cfg, log, metrics).run(batches, on_batch, on_stop))
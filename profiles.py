@@ -0,0 +1,205 @@
+import argparse, sqlite3, sys, time
+from collections import Counter
+from pathlib import Path
+
+from textnorm import Folded
+
+# Supplier profiles. Most invoices come from a few hundred suppliers, and one
+# supplier's invoices always match the same pattern of patterns_hu.json at
+# about the same place. Per seller tax number (its 8-digit törzsszám, read
+# with the adoszam_any patterns, skipping profiles.own_tax_numbers: without
+# them the buyer, i.e. us, is not told apart and no profile is used) and field
+# a profile keeps the pattern index
+# that matched and where: the range of match offsets from the top of the text
+# and from its bottom (totals move with the length of the item list).
+#
+# For a known supplier each field first tries its own pattern on that region
+# only (plus SLACK characters); a miss falls back to the full pattern list in
+# JSON order and re-learns the field. Recurring suppliers cost about one regex
+# probe per field and skip the anchor scan. Profiles live in SQLite, shared by
+# runs, workers and instances; counters are added up, so concurrent writers
+# don't lose hits.
+DEFAULT_PATH = "out/cache/profiles.sqlite"
+KEY_FIELD = "adoszam_any"
+SLACK = 200          # characters searched beyond the offsets seen so far
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS profiles (
+    supplier TEXT NOT NULL, field TEXT NOT NULL, version TEXT NOT NULL, pattern INTEGER NOT NULL,
+    lo INTEGER NOT NULL, hi INTEGER NOT NULL, lo_end INTEGER NOT NULL, hi_end INTEGER NOT NULL,
+    width INTEGER NOT NULL, docs INTEGER NOT NULL, hits INTEGER NOT NULL, misses INTEGER NOT NULL,
+    ts REAL NOT NULL, PRIMARY KEY (supplier, field));
+"""
+# region columns: match start offset from the top (lo..hi) and from the end
+# (lo_end..hi_end), longest match (width). A new pattern or version restarts them.
+_UPSERT = """
+INSERT INTO profiles VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?)
+ON CONFLICT (supplier, field) DO UPDATE SET
+    lo = CASE WHEN pattern = excluded.pattern AND version = excluded.version THEN min(lo, excluded.lo) ELSE excluded.lo END,
+    hi = CASE WHEN pattern = excluded.pattern AND version = excluded.version THEN max(hi, excluded.hi) ELSE excluded.hi END,
+    lo_end = CASE WHEN pattern = excluded.pattern AND version = excluded.version THEN min(lo_end, excluded.lo_end) ELSE excluded.lo_end END,
+    hi_end = CASE WHEN pattern = excluded.pattern AND version = excluded.version THEN max(hi_end, excluded.hi_end) ELSE excluded.hi_end END,
+    width = CASE WHEN pattern = excluded.pattern AND version = excluded.version THEN max(width, excluded.width) ELSE excluded.width END,
+    pattern = excluded.pattern, version = excluded.version,
+    docs = docs + excluded.docs, hits = hits + excluded.hits, misses = misses + excluded.misses,
+    ts = excluded.ts
+"""
+_COLS = ("pattern", "lo", "hi", "lo_end", "hi_end", "width")
+
+def supplier_key(adoszam) -> str:
+    # "12345678-2-42" -> "12345678" (törzsszám: every suffix is the same supplier)
+    digits = "".join(filter(str.isdigit, str(adoszam or "")))
+    return digits[:8] if len(digits) >= 8 else ""
+
+def window(region: dict, n: int):
+    """(pattern, start, end) to search in a text of length n."""
+    if region["hi"] - region["lo"] <= region["hi_end"] - region["lo_end"]:
+        start, end = region["lo"], region["hi"]                  # same distance from the top
+    else:
+        start, end = n - region["hi_end"], n - region["lo_end"]  # same distance from the bottom
+    return region["pattern"], max(0, start - SLACK), min(n, end + region["width"] + SLACK)
+
+def seller_tax_id(ps, text, own=()) -> str:
+    """First tax number in text (adoszam_any) whose törzsszám is not in own;
+    "" without own: the first one is usually the buyer's."""
+    if own and KEY_FIELD in ps.compiled:
+        for m in ps.finditer(text, KEY_FIELD):
+            v = m.group(1 if m.re.groups else 0)
+            key = supplier_key(v)
+            if key and key not in own:
+                return v
+    return ""
+
+def own_keys(tax_numbers) -> set:
+    return {supplier_key(t) for t in tax_numbers or ()} - {""}
+
+class ProfileStore:
+    def __init__(self, path=DEFAULT_PATH, version="", own_tax_numbers=()):
+        self.path, self.version = str(path), version
+        # our own tax number(s): the buyer on incoming invoices, never the supplier
+        self.own = own_keys(own_tax_numbers)
+        if self.path != ":memory:":
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        self.db = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")  # a lost update only costs a re-learn
+        self.db.executescript(_SCHEMA)
+        self.profiles = {}   # supplier -> {field: region dict}, loaded on first use
+        self._pending = {}   # (supplier, field) -> [region, docs, hits, misses] not yet written
+        self.stats = Counter()  # this process: documents, known, probes, hint_hits, hint_misses
+
+    def get(self, supplier: str) -> dict:
+        prof = self.profiles.get(supplier)
+        if prof is None:
+            prof = self.profiles[supplier] = {
+                field: dict(zip(_COLS, row)) for field, *row in self.db.execute(
+                    "SELECT field, " + ", ".join(_COLS) + " FROM profiles"
+                    " WHERE supplier = ? AND version = ?", (supplier, self.version))}
+        return prof
+
+    def extract(self, ps, text, learn=True):
+        """(values, info) like ps.extract(text), guided by the supplier's
+        profile. ps: a PatternSet; text: str or textnorm.Folded. learn=False
+        for partial text (probe pages): its offsets from the end are not the
+        document's."""
+        view = text if isinstance(text, Folded) or not ps.fold else Folded(text)
+        searched = view.folded if ps.fold else getattr(view, "text", view)
+        n, stats = len(searched), {"probes": 0, "hint_hits": 0, "hint_misses": 0}
+        found = ps.search(view, [KEY_FIELD], stats=stats) if KEY_FIELD in ps.compiled else {}
+        supplier = self.supplier(ps, view, found)
+        prof = self.get(supplier) if supplier else {}
+        hints = {f: window(r, n) for f, r in prof.items() if f in ps.compiled}
+        found.update(ps.search(view, [k for k in ps.compiled if k != KEY_FIELD], hints, stats))
+        if supplier and learn:
+            self._learn(supplier, prof, hints, found)
+        self.stats.update(stats, documents=1, known=bool(hints))
+        info = {"supplier": supplier or None, "known": bool(hints), "fields": len(ps.compiled), **stats}
+        return ps._values(found), info
+
+    def supplier(self, ps, text, found) -> str:
+        """Supplier key: the first tax number that is not one of ours; ""
+        (no profile) when our own are not configured."""
+        if not self.own:
+            return ""
+        m = found.get(KEY_FIELD, (None, None))[1]
+        key = supplier_key(m and m.group(1 if m.re.groups else 0))
+        if key not in self.own:
+            return key
+        return supplier_key(seller_tax_id(ps, text, self.own))  # ours came first: look further down
+
+    def _learn(self, supplier, prof, hints, found):
+        for field in hints.keys() - found.keys():  # hinted, but nothing matched at all
+            p = self._pending.setdefault((supplier, field), [prof[field], 0, 0, 0])
+            p[1] += 1
+            p[3] += 1
+        for field, (idx, m) in found.items():
+            if field == KEY_FIELD:
+                continue
+            s, e = getattr(m, "m", m).span()  # offsets in the searched (folded) text
+            n_end = len(getattr(m, "m", m).string) - s
+            hint = hints.get(field)
+            hit = hint is not None and hint[0] == idx and hint[1] <= s and e <= hint[2]
+            r = prof.get(field)
+            if r is None or r["pattern"] != idx:
+                r = prof[field] = {"pattern": idx, "lo": s, "hi": s, "lo_end": n_end,
+                                   "hi_end": n_end, "width": e - s}
+            else:
+                r.update(lo=min(r["lo"], s), hi=max(r["hi"], s), lo_end=min(r["lo_end"], n_end),
+                         hi_end=max(r["hi_end"], n_end), width=max(r["width"], e - s))
+            p = self._pending.setdefault((supplier, field), [r, 0, 0, 0])
+            p[0] = r
+            p[1] += 1
+            p[2] += hit
+            p[3] += hint is not None and not hit
+        self.flush()  # small transaction; workers of a process pool never get to close()
+
+    def flush(self):
+        if not self._pending:
+            return
+        now = time.time()
+        with self.db:  # one transaction per batch
+            self.db.executemany(_UPSERT, [
+                (sup, field, self.version, r["pattern"], r["lo"], r["hi"], r["lo_end"], r["hi_end"],
+                 r["width"], docs, hits, misses, now)
+                for (sup, field), (r, docs, hits, misses) in self._pending.items()])
+        self._pending.clear()
+
+    def report(self) -> list:
+        """Per supplier: documents seen, profiled fields, hint hit rate."""
+        return [{"supplier": sup, "docs": docs, "fields": fields, "hits": hits, "misses": misses,
+                 "hit_rate": round(hits / (hits + misses), 3) if hits + misses else None}
+                for sup, docs, fields, hits, misses in self.db.execute(
+                    "SELECT supplier, max(docs), count(*), sum(hits), sum(misses) FROM profiles"
+                    " WHERE version = ? GROUP BY supplier ORDER BY max(docs) DESC", (self.version,))]
+
+    def close(self):
+        self.flush()
+        self.db.close()
+
+def from_config(cfg: dict, version=""):
+    """ProfileStore for cfg["profiles"], or None when disabled."""
+    c = (cfg or {}).get("profiles") or {}
+    if not c.get("enabled", False):
+        return None
+    return ProfileStore(c.get("path", DEFAULT_PATH), version, c.get("own_tax_numbers") or ())
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Supplier profiles: hint hit rates per supplier.")
+    ap.add_argument("--db", default=DEFAULT_PATH)
+    ap.add_argument("--top", type=int, default=20, help="0 = all suppliers")
+    args = ap.parse_args(argv)
+    import cache
+    from quick_check import PATTERN_FILE
+    st = ProfileStore(args.db, cache.source_version(PATTERN_FILE))
+    rows = st.report()
+    hits, misses = sum(r["hits"] for r in rows), sum(r["misses"] for r in rows)
+    print(f"{len(rows)} suppliers, hint hit rate "
+          f"{hits / (hits + misses):.1%} ({hits} hits, {misses} misses)" if hits + misses
+          else f"{len(rows)} suppliers, no hinted lookups yet")
+    for r in rows[:args.top or None]:
+        rate = "-" if r["hit_rate"] is None else f"{r['hit_rate']:.1%}"
+        print(f"{r['supplier']}  docs {r['docs']:6}  fields {r['fields']:2}  hit rate {rate}")
+    st.close()
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -1,21 +1,21 @@
-import json, re, subprocess, sys, pathlib
+import glob, itertools, json, os, re, sys, pathlib
+from collections import deque
+from functools import lru_cache, partial
+
+import doctext
+from patternset import PatternSet, as_pattern_set, signal_set
+from textnorm import Folded
 
 PATTERN_FILE = "patterns_hu.json"
 
 def run_pdftotext(pdf_path: str) -> str:
-    try:
-        out = subprocess.check_output(
-            ["pdftotext", "-layout", pdf_path, "-"],
-            stderr=subprocess.STDOUT
-        )
-        return out.decode("utf-8", errors="ignore")
-    except subprocess.CalledProcessError as e:
-        print(e.output.decode("utf-8", errors="ignore"), file=sys.stderr)
-        raise
-
-def load_patterns(path=PATTERN_FILE):
+    return doctext.pdftotext(pdf_path, layout=True)
+
+def load_patterns(path=PATTERN_FILE) -> PatternSet:
+    # validated + compiled once; raises ValueError on a broken pattern file.
+    # Matched against the accent-folded text: "Számla" also finds "SZAMLA".
     with open(path, "r", encoding="utf-8") as f:
-        return json.load(f)
+        return PatternSet(json.load(f), fold=True)
 
 POS_SIGNALS = [
     r"(?i)\bSzámla\b",
@@ -30,14 +30,19 @@ NEG_SIGNALS = [
     r"(?i)\bÖnéletrajz\b",
     r"(?i)\bSzerződés\b(?!.*Számla)",
 ]
+_POS = signal_set(POS_SIGNALS, fold=True)
+_NEG = signal_set(NEG_SIGNALS, fold=True)
+_MONEY_RX = re.compile(r"(?i)\b(HUF|Ft|EUR|€|USD|\$)\b")
 
-def score_invoice(text: str, fields: dict) -> float:
+def score_invoice(text, fields: dict) -> float:
+    # text: str, or a textnorm.Folded view shared with extract_fields
+    view = text if isinstance(text, Folded) else Folded(text)
     score = 0.0
     # Heuristic signals
-    seen = sum(bool(re.search(p, text)) for p in POS_SIGNALS)
+    seen = len(_POS.matched(view))
     if seen:
         score += min(0.2 * seen, 0.6)
-    if any(re.search(n, text) for n in NEG_SIGNALS):
+    if _NEG.matched(view):
         score -= 0.2
 
     # Field presence bonuses
@@ -47,39 +52,130 @@ def score_invoice(text: str, fields: dict) -> float:
     if date_hits >= 2:
         score += 0.2
     money_hit = (any(fields.get(k) for k in ("osszeg_brutto","osszeg_netto"))
-                 and re.search(r"(?i)\b(HUF|Ft|EUR|€|USD|\$)\b", text))
+                 and _MONEY_RX.search(view.text))
     if money_hit:
         score += 0.2
 
     return max(0.0, min(1.0, score))
-def extract_fields(text: str, patterns: dict) -> dict:
-    out = {}
-    for key, plist in patterns.items():
-        val = None
-        for p in plist:
-            m = re.search(p, text)
-            if m:
-                val = m.group(1) if m.groups() else m.group(0)
-                break
-        out[key] = val
-    return out
-def main():
-    if len(sys.argv) != 2:
-        print("Usage: python3 quick_check.py /path/to/file.pdf", file=sys.stderr)
-        sys.exit(2)
-    pdf = sys.argv[1]
-    if not pathlib.Path(pdf).exists():
-        print(f"File not found: {pdf}", file=sys.stderr)
-        sys.exit(2)
-
-    text = run_pdftotext(pdf)
-    patterns = load_patterns()
-    fields = extract_fields(text, patterns)
+def extract_fields(text, patterns: dict) -> dict:
+    # first pattern (in JSON order) that matches wins, per field
+    return as_pattern_set(patterns, fold=True).extract(text)
+
+@lru_cache(maxsize=1)
+def default_patterns() -> PatternSet:
+    return load_patterns()
+
+def extract_text_fields(text) -> dict:
+    # "patterns" backend in the extractors registry
+    return default_patterns().extract(text)
+def stream_fields(pdf_path, patterns=None, fields=None):
+    """(values, pages read) straight off pdftotext's pipe; pdftotext is stopped
+    as soon as every wanted field is found (see PatternSet.extract_pages)."""
+    ps = as_pattern_set(patterns, fold=True) if patterns is not None else default_patterns()
+    pages = doctext.iter_pdftotext_pages(pdf_path)
+    try:
+        return ps.extract_pages(pages, fields)
+    finally:
+        pages.close()
+
+def check_file(pdf, patterns=None) -> dict:
+    text = doctext.load(pdf).folded  # folded once for fields and scoring
+    fields = extract_fields(text, patterns if patterns is not None else load_patterns())
     conf = score_invoice(text, fields)
     kind = "invoice" if conf >= 0.6 else "other"
-    print(json.dumps(
-        {"file": pdf, "kind": kind, "confidence": round(conf, 3), "fields": fields},
-        ensure_ascii=False, indent=2))
+    return {"file": str(pdf), "kind": kind, "confidence": round(conf, 3), "fields": fields}
+
+# --- batch mode: many files, one JSON line each, patterns compiled once per worker ---
+_WORKER_PATTERNS = None
+
+def _init_worker(pattern_file):
+    global _WORKER_PATTERNS
+    _WORKER_PATTERNS = load_patterns(pattern_file)
+
+def _check_safe(pdf, fields=None):
+    try:
+        if not pathlib.Path(pdf).is_file():
+            return {"file": str(pdf), "error": "file not found"}
+        if fields:  # fields only: no scoring, so the text can stream and stop early
+            values, n = stream_fields(pdf, _WORKER_PATTERNS, fields)
+            return {"file": str(pdf), "fields": {k: values.get(k) for k in fields}, "pages_read": n}
+        return check_file(pdf, _WORKER_PATTERNS)
+    except Exception as e:
+        return {"file": str(pdf), "error": str(e)}
+
+def iter_inputs(args, stdin=None):
+    """Paths from directories (*.pdf, recursive), glob patterns, files and "-" (stdin list)."""
+    for a in args:
+        if a == "-":
+            for line in stdin or sys.stdin:
+                if line.strip():
+                    yield line.strip()
+        elif os.path.isdir(a):
+            for root, dirs, files in os.walk(a):  # lazy: one directory listing at a time
+                dirs.sort()
+                for f in sorted(files):
+                    if f.lower().endswith(".pdf"):
+                        yield os.path.join(root, f)
+        elif glob.has_magic(a):
+            yield from sorted(glob.iglob(a, recursive=True))
+        else:
+            yield a
+
+def check_many(paths, workers=1, ordered=False, window=None, pattern_file=PATTERN_FILE, fields=None):
+    """Yield one result dict per path as soon as it is ready (input order if ordered).
+
+    At most `window` files are in flight, so memory does not grow with the input."""
+    if workers <= 1:
+        _init_worker(pattern_file)
+        yield from map(partial(_check_safe, fields=fields), paths)
+        return
+    from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+    window = window or workers * 4
+    check = partial(_check_safe, fields=fields)
+    paths = iter(paths)
+    with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(pattern_file,)) as pool:
+        pending = deque(pool.submit(check, p) for p in itertools.islice(paths, window))
+        while pending:
+            if ordered:
+                fut = pending.popleft()
+            else:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                fut = done.pop()
+                pending.remove(fut)
+            for p in itertools.islice(paths, 1):
+                pending.append(pool.submit(check, p))
+            yield fut.result()
+
+def main():
+    import argparse
+    ap = argparse.ArgumentParser(
+        description="Score PDFs as HU invoices. One file: pretty JSON; otherwise JSON lines.")
+    ap.add_argument("inputs", nargs="+", help='PDF files, directories, globs, or "-" to read paths from stdin')
+    ap.add_argument("-j", "--workers", type=int, default=os.cpu_count() or 1)
+    ap.add_argument("--ordered", action="store_true", help="emit results in input order")
+    ap.add_argument("--jsonl", action="store_true", help="JSON lines even for a single file")
+    ap.add_argument("--patterns", default=PATTERN_FILE)
+    ap.add_argument("--fields", help="comma-separated: extract only these, no scoring; "
+                                     "pdftotext is stopped once all are found")
+    args = ap.parse_args()
+
+    single = args.inputs[0]
+    fields = [f.strip() for f in args.fields.split(",")] if args.fields else None
+    if len(args.inputs) == 1 and not args.jsonl and not fields and single != "-" \
+            and not os.path.isdir(single) and not glob.has_magic(single):
+        if not pathlib.Path(single).exists():
+            print(f"File not found: {single}", file=sys.stderr)
+            sys.exit(2)
+        print(json.dumps(check_file(single, load_patterns(args.patterns)), ensure_ascii=False, indent=2))
+        return
+
+    failed = 0
+    for rec in check_many(iter_inputs(args.inputs), args.workers, args.ordered,
+                          pattern_file=args.patterns, fields=fields):
+        failed += "error" in rec
+        sys.stdout.write(json.dumps(rec, ensure_ascii=False) + "\n")
+        sys.stdout.flush()
+    sys.exit(1 if failed else 0)
 
 if __name__ == "__main__":
     main()
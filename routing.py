@@ -1,4 +1,4 @@
-import csv, json, os, re
+import csv, json, os, re, threading, time
 from pathlib import Path
 from datetime import datetime
 
@@ -14,35 +14,180 @@ def build_target_name(meta: dict, doc_type: str, src: Path) -> str:
     key = meta.get("invoice_no") or meta.get("merchant") or src.stem
     return f"{date}_{_slug(str(key))}{src.suffix.lower()}"
 
-def route(path: str, doc_type: str, meta: dict, cfg) -> str:
+class RouteIndex:
+    """Names already used in each routing directory.
+
+    Each directory is listed once (os.scandir) on first use; afterwards
+    suffixes (__1, __2, ...) come from memory under a lock, with a per-name
+    counter so repeated collisions don't re-probe. When files are really
+    moved the name is claimed with O_CREAT|O_EXCL, so another process or
+    host writing the same directory can never be overwritten."""
+
+    def __init__(self):
+        self._used = {}   # dir -> set of names
+        self._next = {}   # (dir, name) -> next suffix to try
+        self._lock = threading.Lock()
+
+    def _names(self, target_dir: Path) -> set:
+        key = str(target_dir)
+        if key not in self._used:
+            target_dir.mkdir(parents=True, exist_ok=True)
+            self._used[key] = {e.name for e in os.scandir(target_dir)}
+        return self._used[key]
+
+    def _candidate(self, target_dir: Path, name: str) -> str:
+        used = self._names(target_dir)
+        if name not in used:
+            return name
+        stem, suf = os.path.splitext(name)
+        k = (str(target_dir), name)
+        i = self._next.get(k, 1)
+        while f"{stem}__{i}{suf}" in used:
+            i += 1
+        self._next[k] = i + 1
+        return f"{stem}__{i}{suf}"
+
+    def reserve(self, target_dir: Path, name: str, claim=False) -> Path:
+        with self._lock:
+            while True:
+                cand = self._candidate(target_dir, name)
+                self._names(target_dir).add(cand)
+                dst = target_dir / cand
+                if not claim:
+                    return dst
+                try:
+                    os.close(os.open(dst, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644))
+                    return dst
+                except FileExistsError:  # written by someone else since we listed the dir
+                    continue
+
+    def release(self, dst: Path):
+        with self._lock:
+            self._used.get(str(dst.parent), set()).discard(dst.name)
+
+_INDEX = RouteIndex()
+
+def route(path: str, doc_type: str, meta: dict, cfg, index: RouteIndex = None) -> str:
     src = Path(path)
     out_root = Path(cfg["paths"]["out_root"])
     subdir = cfg["routing"].get(f"{doc_type}s", doc_type)
     target_dir = out_root / subdir
-    target_dir.mkdir(parents=True, exist_ok=True)
     name = build_target_name(meta, doc_type, src)
-    dst = target_dir / name
-    i = 1
-    while dst.exists():
-        stem, suf = os.path.splitext(name)
-        dst = target_dir / f"{stem}__{i}{suf}"
-        i += 1
-    if not cfg["run"]["dry_run"]:
-        src.replace(dst)
+    index = index or _INDEX
+    dry_run = cfg["run"]["dry_run"]
+    dst = index.reserve(target_dir, name, claim=not dry_run)
+    if not dry_run:
+        try:
+            src.replace(dst)  # atomically replaces the empty placeholder
+        except OSError:
+            dst.unlink(missing_ok=True)
+            index.release(dst)
+            raise
     return str(dst)
 
-def append_logs(rows: list, cfg):
-    out_root = Path(cfg["paths"]["out_root"])
-    logs = out_root / "logs"
-    logs.mkdir(parents=True, exist_ok=True)
-    # CSV
-    csv_path = logs / "events.csv"
-    write_header = not csv_path.exists()
-    with open(csv_path, "a", newline="", encoding="utf-8") as f:
-        w = csv.DictWriter(f, fieldnames=sorted(rows[0].keys()))
-        if write_header: w.writeheader()
-        for r in rows: w.writerow(r)
-    # JSONL
-    jsonl_path = logs / "events.jsonl"
-    with open(jsonl_path, "a", encoding="utf-8") as f:
-        for r in rows: f.write(json.dumps(r, ensure_ascii=False) + "\n")
+# CSV columns for a fresh events.csv; an existing file keeps its own header.
+# Keys outside the schema only go to events.jsonl, missing ones are left empty.
+LOG_FIELDS = ["confidence", "currency", "dest", "doc_type", "file", "kibocsatas_datum",
+              "osszeg_brutto", "osszeg_netto", "src", "szamlaszam", "teljesites_datum"]
+LOG_BATCH = 100
+
+class LogWriter:
+    """events.csv / events.jsonl kept open for a whole run.
+
+    Records are buffered and written every `batch` records or `interval`
+    seconds; each flush is fsync'ed, so a crash loses at most one batch.
+    `store` (store.ResultStore) gets every flushed batch as well; with
+    flat=False it is the only log."""
+
+    def __init__(self, out_root, batch=LOG_BATCH, interval=5.0, fields=None, store=None, flat=True):
+        logs = Path(out_root) / "logs"
+        logs.mkdir(parents=True, exist_ok=True)
+        self.batch, self.interval = max(1, int(batch)), float(interval)
+        self._buf, self._last = [], time.monotonic()
+        self._lock = threading.Lock()
+        self.store = store
+        self.csv_path, self.jsonl_path = logs / "events.csv", logs / "events.jsonl"
+        self.fields = (self._existing_header() if flat else None) or None
+        self._default_fields = list(fields or LOG_FIELDS)
+        self._csv = open(self.csv_path, "a", newline="", encoding="utf-8") if flat else None
+        self._jsonl = open(self.jsonl_path, "a", encoding="utf-8") if flat else None
+        self._w = None
+
+    @classmethod
+    def from_config(cls, cfg):
+        # logs.store: SQLite path (default out/logs/events.sqlite), false = flat files only
+        log_cfg = cfg.get("logs") or {}
+        out_root = cfg["paths"]["out_root"]
+        store, path = None, log_cfg.get("store", str(Path(out_root) / "logs" / "events.sqlite"))
+        if path:
+            from store import ResultStore
+            store = ResultStore(path)
+        return cls(out_root, batch=log_cfg.get("batch_size", LOG_BATCH),
+                   interval=log_cfg.get("flush_seconds", 5.0), store=store,
+                   flat=store is None or log_cfg.get("flat_files", True))
+
+    def _existing_header(self):
+        if not self.csv_path.exists() or self.csv_path.stat().st_size == 0:
+            return []
+        with open(self.csv_path, newline="", encoding="utf-8") as f:
+            return next(csv.reader(f), [])
+
+    def write(self, rec: dict):
+        with self._lock:
+            self._buf.append(rec)
+            due = len(self._buf) >= self.batch or time.monotonic() - self._last >= self.interval
+        if due:
+            self.flush()
+
+    def write_many(self, rows):
+        for r in rows:
+            self.write(r)
+
+    def tick(self):
+        # idle loops call this so a half-full buffer still lands within `interval`
+        if self._buf and time.monotonic() - self._last >= self.interval:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            rows, self._buf, self._last = self._buf, [], time.monotonic()
+            if not rows:
+                return
+            if self.store is not None:
+                self.store.write_many(rows)
+            if self._csv is None:
+                return
+            if self._w is None:
+                if self.fields is None:  # new file: schema fixed by the first batch
+                    nested = {k for r in rows for k, v in r.items() if isinstance(v, (dict, list))}
+                    self.fields = sorted(set(self._default_fields).union(*rows) - nested)
+                    self._w = csv.DictWriter(self._csv, fieldnames=self.fields,
+                                             restval="", extrasaction="ignore")
+                    self._w.writeheader()
+                else:
+                    self._w = csv.DictWriter(self._csv, fieldnames=self.fields,
+                                             restval="", extrasaction="ignore")
+            self._w.writerows(rows)
+            self._jsonl.write("".join(json.dumps(r, ensure_ascii=False) + "\n" for r in rows))
+            for f in (self._csv, self._jsonl):
+                f.flush()
+                os.fsync(f.fileno())
+
+    def close(self):
+        self.flush()
+        for f in (self._csv, self._jsonl, self.store):
+            if f is not None:
+                f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def append_logs(rows, cfg):
+    # one-shot helper; accepts a single record or a list of them
+    if isinstance(rows, dict):
+        rows = [rows]
+    with LogWriter.from_config(cfg) as w:
+        w.write_many(rows)
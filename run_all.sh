@@ -6,7 +6,8 @@ echo "== Convert PDFs to TXT in $DIR =="
 for f in "$DIR"/*.pdf; do
   [ -e "$f" ] || continue
   out="${f%.pdf}.txt"
-  if [ ! -s "$out" ]; then pdftotext -layout "$f" "$out" || true; fi
+  # missing, empty or older than its PDF
+  if [ ! -s "$out" ] || [ "$f" -nt "$out" ]; then pdftotext -layout "$f" "$out" || true; fi
 done
 
 echo "== Extract =="
@@ -0,0 +1,206 @@
+import argparse, csv, json, sqlite3, sys, time
+from pathlib import Path
+
+from extract_invoices import norm_date
+
+# Indexed result store: one SQLite row per routed document, written by
+# routing.LogWriter next to (or instead of) events.csv / events.jsonl.
+#
+# The full log record is kept verbatim as JSON (`record`), so exports give back
+# exactly the lines events.jsonl would have had. The lookup keys are copied into
+# indexed columns: invoice number, seller tax number (seller_tax_id, digits
+# only; "adoszam" in the record is just the first one in the text), issue and
+# fulfilment dates (ISO), content hash. "Was ALG-1001 routed?" or "seller X in
+# January" are index range scans, milliseconds at millions of rows.
+DEFAULT_PATH = "out/logs/events.sqlite"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY, ts REAL NOT NULL,
+    file TEXT, doc_type TEXT, szamlaszam TEXT, adoszam TEXT, seller TEXT,
+    kibocsatas_datum TEXT, teljesites_datum TEXT, osszeg_brutto TEXT, currency TEXT,
+    confidence REAL, sha256 TEXT, dest TEXT, record TEXT NOT NULL);
+CREATE INDEX IF NOT EXISTS events_szamlaszam ON events(szamlaszam);
+CREATE INDEX IF NOT EXISTS events_adoszam ON events(adoszam, kibocsatas_datum);
+CREATE INDEX IF NOT EXISTS events_kibocsatas ON events(kibocsatas_datum);
+CREATE INDEX IF NOT EXISTS events_teljesites ON events(teljesites_datum);
+CREATE INDEX IF NOT EXISTS events_sha256 ON events(sha256);
+"""
+DATE_FIELDS = ("kibocsatas_datum", "teljesites_datum")
+
+def taxno(s) -> str:
+    # "12345678-2-42", "HU12345678" -> digits; 8 digits = törzsszám (matches every suffix)
+    return "".join(ch for ch in str(s or "") if ch.isdigit())
+
+def _row(rec: dict, now: float) -> tuple:
+    return (now, rec.get("file"), rec.get("doc_type"), rec.get("szamlaszam") or rec.get("invoice_no") or None,
+            taxno(rec.get("seller_tax_id")) or None, rec.get("seller"),
+            norm_date(rec.get("kibocsatas_datum") or rec.get("issue_date") or "") or None,
+            norm_date(rec.get("teljesites_datum") or "") or None,
+            rec.get("osszeg_brutto") or None, rec.get("currency") or None,
+            rec.get("confidence"), rec.get("sha256"), rec.get("dest"),
+            json.dumps(rec, ensure_ascii=False))
+
+class ResultStore:
+    def __init__(self, path=DEFAULT_PATH):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.db = sqlite3.connect(str(self.path), timeout=30, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.executescript(_SCHEMA)
+
+    def write_many(self, rows):
+        now = time.time()
+        with self.db:  # one transaction (one fsync) per LogWriter flush
+            self.db.executemany(
+                "INSERT INTO events (ts, file, doc_type, szamlaszam, adoszam, seller, kibocsatas_datum,"
+                " teljesites_datum, osszeg_brutto, currency, confidence, sha256, dest, record)"
+                " VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?)", (_row(r, now) for r in rows))
+
+    def write(self, rec: dict):
+        self.write_many([rec])
+
+    def _where(self, szamlaszam=None, adoszam=None, sha256=None, doc_type=None, seller=None,
+               date_from=None, date_to=None, date_field="kibocsatas_datum"):
+        if date_field not in DATE_FIELDS:
+            raise ValueError(f"date_field must be one of {DATE_FIELDS}")
+        cond, args = [], []
+        if szamlaszam:
+            cond.append("szamlaszam = ?"); args.append(szamlaszam)
+        if adoszam:
+            d = taxno(adoszam)
+            if len(d) == 8:  # törzsszám: every suffix, still an index range
+                cond.append("adoszam >= ? AND adoszam < ?"); args += [d, d + ":"]
+            else:
+                cond.append("adoszam = ?"); args.append(d)
+        if sha256:
+            cond.append("sha256 = ?"); args.append(sha256)
+        if doc_type:
+            cond.append("doc_type = ?"); args.append(doc_type)
+        if seller:
+            cond.append("seller LIKE ?"); args.append(f"%{seller}%")
+        if date_from:
+            cond.append(f"{date_field} >= ?"); args.append(norm_date(date_from))
+        if date_to:
+            cond.append(f"{date_field} <= ?"); args.append(norm_date(date_to))
+        return (" WHERE " + " AND ".join(cond) if cond else ""), args
+
+    def iter_records(self, limit=None, **filters):
+        """Stored log records (dicts) in write order, filtered like find()."""
+        for (js,) in self._select("record", limit, **filters):
+            yield json.loads(js)
+
+    def _select(self, cols, limit=None, **filters):
+        where, args = self._where(**filters)
+        sql = f"SELECT {cols} FROM events{where} ORDER BY id"
+        if limit:
+            sql += f" LIMIT {int(limit)}"
+        return self.db.execute(sql, args)
+
+    def find(self, limit=None, **filters) -> list:
+        """Records matching all given keys: szamlaszam, adoszam (full or 8-digit
+        törzsszám), sha256, doc_type, seller (substring), date_from/date_to on
+        date_field (kibocsatas_datum or teljesites_datum)."""
+        return list(self.iter_records(limit, **filters))
+
+    def count(self, **filters) -> int:
+        where, args = self._where(**filters)
+        return self.db.execute(f"SELECT COUNT(*) FROM events{where}", args).fetchone()[0]
+
+    def routed(self, szamlaszam=None, sha256=None) -> bool:
+        """Was this invoice number / file content already routed?"""
+        return self.db.execute(
+            "SELECT 1 FROM events WHERE szamlaszam = ? OR sha256 = ? LIMIT 1",
+            (szamlaszam or None, sha256 or None)).fetchone() is not None
+
+    def export(self, out, fmt="jsonl", fields=None, **filters) -> int:
+        """Write matching records in the events.jsonl / events.csv format."""
+        rows = self._select("record", **filters)
+        n = 0
+        if fmt == "jsonl":
+            for (js,) in rows:
+                out.write(js + "\n")
+                n += 1
+            return n
+        if fmt != "csv":
+            raise ValueError(f"unknown export format {fmt!r}")
+        from itertools import chain, islice
+        from routing import LOG_FIELDS, LOG_BATCH
+        recs = map(json.loads, (js for (js,) in rows))
+        if fields is None:  # same rule as a fresh events.csv: schema of the first batch
+            head = list(islice(recs, LOG_BATCH))
+            nested = {k for r in head for k, v in r.items() if isinstance(v, (dict, list))}
+            fields = sorted(set(LOG_FIELDS).union(*head) - nested)
+            recs = chain(head, recs)
+        w = csv.DictWriter(out, fieldnames=fields, restval="", extrasaction="ignore")
+        w.writeheader()
+        for r in recs:
+            w.writerow(r)
+            n += 1
+        return n
+
+    def import_jsonl(self, path, batch=10000) -> int:
+        """Backfill from an existing events.jsonl."""
+        n, buf = 0, []
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    buf.append(json.loads(line))
+                if len(buf) >= batch:
+                    self.write_many(buf); n += len(buf); buf = []
+        if buf:
+            self.write_many(buf); n += len(buf)
+        return n
+
+    def close(self):
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Query / export the routed-document store.")
+    ap.add_argument("--db", default=DEFAULT_PATH)
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    filt = argparse.ArgumentParser(add_help=False)
+    filt.add_argument("--szamlaszam")
+    filt.add_argument("--adoszam", help="seller tax number, or its first 8 digits")
+    filt.add_argument("--sha256")
+    filt.add_argument("--doc-type")
+    filt.add_argument("--seller", help="substring of the seller name (not indexed)")
+    filt.add_argument("--from", dest="date_from", help="YYYY-MM-DD, inclusive")
+    filt.add_argument("--to", dest="date_to", help="YYYY-MM-DD, inclusive")
+    filt.add_argument("--date-field", default="kibocsatas_datum", choices=DATE_FIELDS)
+    find = sub.add_parser("find", parents=[filt], help="matching records as JSON lines")
+    find.add_argument("--limit", type=int, default=100, help="0 = all")
+    sub.add_parser("count", parents=[filt], help="number of matching records")
+    exp = sub.add_parser("export", parents=[filt], help="events.csv / events.jsonl format")
+    exp.add_argument("--format", choices=("jsonl", "csv"), default="jsonl")
+    exp.add_argument("--out", help="file (default: stdout)")
+    imp = sub.add_parser("import", help="backfill from an events.jsonl")
+    imp.add_argument("jsonl")
+    args = ap.parse_args(argv)
+
+    with ResultStore(args.db) as st:
+        if args.cmd == "import":
+            print(f"imported {st.import_jsonl(args.jsonl)} records into {args.db}")
+            return
+        filters = {k: getattr(args, k) for k in ("szamlaszam", "adoszam", "sha256", "doc_type",
+                                                 "seller", "date_from", "date_to", "date_field")}
+        if args.cmd == "count":
+            print(st.count(**filters))
+        elif args.cmd == "find":
+            for rec in st.iter_records(args.limit or None, **filters):
+                print(json.dumps(rec, ensure_ascii=False))
+        elif args.out:
+            with open(args.out, "w", encoding="utf-8", newline="") as f:
+                n = st.export(f, args.format, **filters)
+            print(f"exported {n} records to {args.out}", file=sys.stderr)
+        else:
+            st.export(sys.stdout, args.format, **filters)
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,103 @@
+import os, sys, threading, time
+
+import pytest
+import yaml
+
+import claim, middleware_demo
+from claim import Claimer, shard_of
+
+def _inbox(tmp_path, n=40, prefix="f"):
+    inbox = tmp_path / "inbox"
+    inbox.mkdir(exist_ok=True)
+    paths = []
+    for i in range(n):
+        p = inbox / f"{prefix}{i:03}.pdf"
+        p.write_bytes(b"%PDF")
+        paths.append(p)
+    return inbox, paths
+
+def _age(path, seconds):
+    t = time.time() - seconds
+    os.utime(path, (t, t))
+
+def test_racing_claims_win_each_file_once(tmp_path):
+    inbox, paths = _inbox(tmp_path, 200)
+    workers = [Claimer(inbox, f"w{i}") for i in range(4)]
+    won, go = {}, threading.Barrier(len(workers))
+
+    def run(c):
+        go.wait()
+        won[c.worker] = c.claim(paths)
+
+    threads = [threading.Thread(target=run, args=(c,)) for c in workers]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    names = [p.name for got in won.values() for p in got]
+    assert sorted(names) == sorted(p.name for p in paths)  # every file, exactly once
+    assert not list(inbox.glob("*.pdf"))
+
+def test_stale_lease_goes_back_to_the_inbox(tmp_path):
+    inbox, paths = _inbox(tmp_path, 5)
+    dead, alive = Claimer(inbox, "dead", lease=10), Claimer(inbox, "alive", lease=10)
+    dead.claim(paths)
+    assert alive.recover() == 0  # lease still running
+    _age(dead.mine / claim.HEARTBEAT, 11)
+    assert alive.recover() == 5
+    assert sorted(inbox.glob("*.pdf")) == sorted(paths) and not dead.mine.exists()
+
+def test_heartbeat_thread_keeps_lease_and_recovers(tmp_path):
+    inbox, paths = _inbox(tmp_path, 3)
+    dead = Claimer(inbox, "dead", lease=0.3)
+    dead.claim(paths)
+    alive = Claimer(inbox, "alive", lease=0.3).start()
+    try:
+        first = (alive.mine / claim.HEARTBEAT).stat().st_mtime
+        deadline = time.time() + 5
+        while list(dead.mine.glob("*.pdf")) and time.time() < deadline:
+            time.sleep(0.05)
+        assert sorted(inbox.glob("*.pdf")) == sorted(paths)  # dead's beat expired
+        assert (alive.mine / claim.HEARTBEAT).stat().st_mtime >= first
+        assert alive.recover() == 0  # our own dir is never recovered
+    finally:
+        alive.close()
+    assert not alive.mine.exists()
+
+def test_shards_defer_then_steal(tmp_path):
+    inbox, paths = _inbox(tmp_path, 40)
+    c = Claimer(inbox, "s0", shards=2, shard=0, steal_after=30)
+    ours = {p.name for p in paths if shard_of(p.name, 2) == 0}
+    assert 0 < len(ours) < len(paths)
+    assert {p.name for p in c.claim(paths)} == ours
+    assert {p.name for p in c.deferred} == {p.name for p in paths} - ours
+    for p in c.deferred:
+        _age(p, 31)  # waited past steal_after: the other shard is missing
+    assert len(c.claim(list(c.deferred))) == len(paths) - len(ours) and not c.deferred
+
+def test_batches_settle_failed_and_release(tmp_path):
+    inbox, paths = _inbox(tmp_path, 4)
+    c = Claimer(inbox, "w")
+    batches = c.batches([paths[:2], paths[2:]])
+    first = next(batches)
+    first[0].unlink()  # routed
+    second = next(batches)  # settles the first batch: the unrouted one failed
+    assert [p.name for p in (inbox / claim.FAILED).iterdir()] == [paths[1].name]
+    batches.close()  # stopped early: the second batch goes back
+    assert sorted(inbox.glob("*.pdf")) == paths[2:] and not any(p.exists() for p in second)
+    dry = Claimer(inbox, "d").batches([paths[2:]], dry_run=True)
+    list(dry)
+    assert sorted(inbox.glob("*.pdf")) == paths[2:]  # dry run: nothing moved for good
+
+def test_failed_startup_drops_the_claim_dir(tmp_path, monkeypatch):
+    inbox, _ = _inbox(tmp_path, 1)
+    cfg = {"paths": {"inbox": str(inbox), "out_root": str(tmp_path / "out")},
+           "routing": {"invoices": "invoices"}, "run": {"dry_run": False},
+           "claim": {"enabled": True, "worker": "w1"},
+           "notify": {"enabled": True, "username": "u", "password_env": "NO_SUCH_SMTP_PASS"}}
+    (tmp_path / "c.yaml").write_text(yaml.safe_dump(cfg), encoding="utf-8")
+    monkeypatch.delenv("NO_SUCH_SMTP_PASS", raising=False)
+    monkeypatch.setattr(sys, "argv", ["middleware_demo.py", "--config", str(tmp_path / "c.yaml")])
+    with pytest.raises(RuntimeError, match="NO_SUCH_SMTP_PASS"):
+        middleware_demo.main()
+    assert not (inbox / claim.PROCESSING / "w1").exists()
@@ -0,0 +1,71 @@
+import pytest
+
+import doctext, middleware_demo
+
+def test_unreadable_pdf_raises(tmp_path):
+    bad = tmp_path / "bad.pdf"
+    bad.write_bytes(b"not a pdf at all")
+    with pytest.raises(Exception):
+        doctext.load(bad)
+
+def test_unreadable_pdf_is_an_error_and_stays(tmp_path, capsys):
+    bad = tmp_path / "bad.pdf"
+    bad.write_bytes(b"%PDF-1.4\ntruncated")
+    cfg = {"paths": {"out_root": str(tmp_path / "out")}, "run": {"dry_run": False}, "routing": {}}
+    metrics = middleware_demo.process_batch([bad], cfg)
+    assert metrics.counters["errors"] == 1 and not metrics.counters["documents"]
+    assert bad.exists() and "❌ Error processing bad.pdf" in capsys.readouterr().out
+
+INVOICE = "Számlaszám: INV-1\nKelt: 2025-01-02\nTeljesítés: 2025-01-02\nVégösszeg: 1 000 Ft\n"
+
+@pytest.fixture
+def fake_pdftotext(monkeypatch):
+    """pdftotext/pdfinfo over in-memory pages: {path: [page text]}; calls records (first, last)."""
+    docs, calls = {}, []
+
+    def pages(pdf_path, layout=True, last_page=None, chunk=0, first_page=None):
+        have, first = docs[str(pdf_path)], first_page or 1
+        calls.append((first, last_page))
+        if first > len(have):
+            raise doctext.subprocess.CalledProcessError(99, "pdftotext")
+        yield from have[first - 1:last_page]
+
+    monkeypatch.setattr(doctext, "iter_pdftotext_pages", pages)
+    monkeypatch.setattr(doctext, "page_count", lambda p: len(docs[str(p)]))
+    return docs, calls
+
+def test_resume_does_not_read_the_probe_page_again(tmp_path, fake_pdftotext):
+    docs, calls = fake_pdftotext
+    for n in (3, 6):
+        p = str(tmp_path / f"{n}.pdf")
+        docs[p] = [f"page {i}\n" for i in range(1, n + 1)]
+        probe = doctext.load(p, max_pages=2)
+        assert not probe.complete and probe.pages == docs[p][:2]
+        full = doctext.load(p, resume=probe)
+        assert full.complete and full.pages == docs[p]
+    # 3 pages: the probe's extra page was the last, nothing else is read
+    assert calls == [(1, 3), (1, 3), (4, None)]
+
+def _analyze(tmp_path, docs, name, pages):
+    p = tmp_path / name
+    p.write_bytes(name.encode())  # hashed only
+    docs[str(p)] = pages
+    return middleware_demo.analyze_pdf(p, {"required": (), "classify": {"probe_pages": 1, "low": 0.2}})
+
+def test_classify_tiers(tmp_path, fake_pdftotext):
+    docs, calls = fake_pdftotext
+    # low: stays "other", the rest is never read
+    meta = _analyze(tmp_path, docs, "low.pdf", ["Használati útmutató\n", "SZÁMLA\n", INVOICE, "x\n"])
+    assert meta["doc_type"] == "other" and meta["probe_only"] and len(calls) == 1
+    # middle: re-scored on the full text
+    meta = _analyze(tmp_path, docs, "mid.pdf", ["SZÁMLA\nAdószám: 11111111-2-41\n", "x\n", INVOICE])
+    assert meta["doc_type"] == "invoice" and meta["confidence"] > 0.6 and not meta["probe_only"]
+    assert meta["szamlaszam"] == "INV-1" and meta["pages"] == 3
+    # high: kept, with the fields of the later pages
+    meta = _analyze(tmp_path, docs, "high.pdf", ["SZÁMLA\nAdószám: 11111111-2-41\nSzámlaszám: INV-2\n",
+                                                 "x\n", "Végösszeg: 2 000 Ft\n"])
+    assert meta["doc_type"] == "invoice" and meta["osszeg_brutto"] == "2 000"
+    # high on the probe, below it on the full text: the full text decides
+    meta = _analyze(tmp_path, docs, "minutes.pdf", ["SZÁMLA\nAdószám: 11111111-2-41\nSzámlaszám: INV-3\n",
+                                                    "x\n", "Jegyzőkönyv\n"])
+    assert meta["doc_type"] == "other" and meta["confidence"] < 0.6
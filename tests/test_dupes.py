@@ -0,0 +1,56 @@
+from pathlib import Path
+
+import dupes, middleware_demo
+from dupes import DupeIndex
+
+INV = {"file": "a.pdf", "doc_type": "invoice", "sha256": "aa", "szamlaszam": "ALG-1",
+       "osszeg_brutto": "12 700", "kibocsatas_datum": "2025-01-05", "seller_tax_id": "11111111-2-41"}
+
+def kinds(meta):
+    return [k for k, _ in dupes.keys(meta)]
+
+def test_keys_without_seller():
+    assert kinds(INV) == ["exact", "invoice", "near"]
+    no_seller = {**INV, "seller_tax_id": ""}
+    assert kinds(no_seller) == ["exact", "invoice"]  # invoice no. + gross, no near key
+    assert kinds({**no_seller, "osszeg_brutto": ""}) == ["exact"]
+    assert kinds({**INV, "doc_type": "other"}) == ["exact"]
+
+def test_resend_found_across_instances_and_reopen(tmp_path):
+    path = tmp_path / "d.sqlite"
+    a, b = DupeIndex(path), DupeIndex(path)
+    a.add(INV, "out/invoices/a.pdf")
+    resend = {**INV, "file": "a2.pdf", "sha256": "bb"}
+    assert b.check(resend)["kind"] == "invoice"  # b's filter catches up on a's rows
+    misread = {**resend, "szamlaszam": "ALG-7"}
+    assert b.check(misread) == {"kind": "near", "file": "a.pdf", "dest": "out/invoices/a.pdf",
+                                "sha256": "aa"}
+    a.close(); b.close()
+    assert Path(str(path) + ".bloom").exists()
+    c = DupeIndex(path)
+    assert c.seq > 0 and c.check({"sha256": "aa", "doc_type": "other"})["kind"] == "exact"
+    assert c.check({**INV, "sha256": "cc", "szamlaszam": "X-1", "osszeg_brutto": "1"}) is None
+    c.close()
+    Path(str(path) + ".bloom").unlink()  # lost filter: rebuilt from the table
+    assert DupeIndex(path).check(resend)["kind"] == "invoice"
+
+def test_duplicates_are_routed_aside(tmp_path):
+    inbox, out = tmp_path / "inbox", tmp_path / "out"
+    inbox.mkdir()
+    cfg = {"paths": {"out_root": str(out)}, "run": {"dry_run": False},
+           "routing": {"invoices": "invoices", "duplicates": "duplicates"},
+           "dupes": {"enabled": True, "path": str(tmp_path / "d.sqlite")}}
+    dests = []
+    try:
+        for name in ("a.pdf", "b.pdf"):
+            (inbox / name).write_bytes(b"%PDF same bytes")
+            meta = {**INV, "file": name, "confidence": 1.0}
+            dests.append(Path(middleware_demo.route_and_log(inbox / name, meta, cfg, log=_Log())))
+    finally:
+        middleware_demo.close_dupes()
+    assert [d.parent.name for d in dests] == ["invoices", "duplicates"]
+    assert meta["duplicate_of"]["file"] == "a.pdf"
+
+class _Log:
+    def write(self, rec):
+        pass
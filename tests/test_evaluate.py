@@ -0,0 +1,13 @@
+from evaluate import evaluate_rows
+
+def test_strip_only_keeps_date_format():
+    truth = [{"file": "a.pdf", "teljesites_datum": "2024-03-05"}]
+    pred = [{"file": "a.pdf", "teljesites_datum": " 2024.03.05 "}]
+    assert evaluate_rows(truth, pred, ["teljesites_datum"]).outcomes["teljesites_datum"]["correct"] == 1
+    strict = evaluate_rows(truth, pred, ["teljesites_datum"], strip_only=True)
+    assert strict.outcomes["teljesites_datum"]["wrong"] == 1
+
+def test_duplicate_stems_last_wins():
+    truth = [{"file": "x/Számla.pdf", "szamlaszam": "A-1"}, {"file": "y/szamla.pdf", "szamlaszam": "A-2"}]
+    report = evaluate_rows(truth, [{"file": "szamla.txt", "szamlaszam": "A-2"}], ["szamlaszam"])
+    assert report.by_stem == 1 and report.outcomes["szamlaszam"]["correct"] == 1
@@ -0,0 +1,15 @@
+from doctext import DocText
+from extractors.hu_invoice import extract_invoice
+
+TEXT = ("SZÁMLA\nSzámlaszám: INV-2025-7\nKelt: 2025-01-02\nNettó: 10 000 Ft\n"
+        "ÁFA összeg: 2 700 Ft\nVégösszeg: 12 700 Ft\n")
+
+def test_missing_seller_name_runs_one_backend():
+    # the name is an extra field: labels (the cheapest with it) misses it, ocr_tolerant is not asked
+    meta = extract_invoice("x.txt", DocText("x.txt", [TEXT]))
+    assert meta["invoice_no"] == "INV-2025-7" and meta["gross"] == 12700
+    assert meta["extractor"] == "patterns+labels" and meta["seller"] is None
+
+def test_missing_wanted_field_falls_through():
+    meta = extract_invoice("x.txt", DocText("x.txt", [TEXT.replace("Számlaszám: INV-2025-7\n", "")]))
+    assert meta["extractor"] == "patterns+amounts+labels+ocr_tolerant"
@@ -0,0 +1,35 @@
+import json
+from pathlib import Path
+
+import extract_invoices, invoice_extract_hu, invoice_extract_hu_v2
+from patternset import PatternSet
+
+ROOT = Path(__file__).resolve().parent.parent
+PATTERNS = json.loads((ROOT / "patterns_hu.json").read_text(encoding="utf-8"))
+
+def test_invoice_number_after_accented_label():
+    for text in ("Számlaszám: INV-2024-001", "SZÁMLA\n\nSzámlaszám: INV-2024-001"):
+        assert extract_invoices.extract_from_text(text)["szamlaszam"] == "INV-2024-001"
+        assert invoice_extract_hu.extract_fields(text)["szamlaszam"] == "INV-2024-001"
+    assert invoice_extract_hu_v2.extract_fields("SZÁMLA\n\nSzámlaszám: ALG-100002")["szamlaszam"] == "ALG-100002"
+    assert extract_invoices.extract_from_text("Számla sorszáma: ABC-1")["szamlaszam"] == "ABC-1"
+
+def test_label_words_are_not_values():
+    assert "szamlaszam" not in extract_invoices.extract_from_text("SZÁMLA\n\nSzámlaszám")
+
+def test_folded_patterns_keep_value_classes():
+    folded, plain = PatternSet(PATTERNS, fold=True), PatternSet(PATTERNS)
+    for text in ("SZÁMLASZÁM: SZÁMLASZÁM: X-12", "Számla no. Sorszám 1.234",
+                 "Számlaszám: ÉK-12", "Végösszeg (bruttó): 12 700 Ft"):
+        assert folded.extract(text) == plain.extract(text)
+    # labels still match without accents, values still come from the original text
+    assert folded.extract("SZAMLASZAM: alg-7")["szamlaszam"] == "alg-7"
+
+def test_blank_values_are_no_match():
+    # "Vegosszeg HUF": the amount alternative [0-9\s]+ would capture one space
+    for fold in (False, True):
+        ps = PatternSet(PATTERNS, fold=fold)
+        for text in ("Vegosszeg HUF", "Végösszeg HUF"):
+            assert ps.extract(text)["osszeg_brutto"] is None
+        values = ps.extract("Végösszeg HUF\nVégösszeg: 12 700 Ft")
+        assert values["osszeg_brutto"] == "12 700"  # searched on, and stripped
@@ -0,0 +1,98 @@
+import smtplib, time
+
+import pytest
+
+import notify
+from notify import Mailer, Notifier
+
+CONF = {"smtp_host": "localhost", "smtp_port": 1025, "mail_from": "a@x", "mail_to": "b@x",
+        "username": "", "backoff": 0.01, "digest_seconds": 60}
+
+class FakeSMTP:
+    """smtplib.SMTP stand-in: `failures` are raised by send_message in order."""
+    connections, sent, failures = 0, [], []
+
+    def __init__(self, host, port, timeout=None):
+        FakeSMTP.connections += 1
+        self.logins = 0
+
+    def starttls(self):
+        pass
+
+    def login(self, user, password):
+        self.logins += 1
+
+    def send_message(self, msg):
+        if FakeSMTP.failures:
+            raise FakeSMTP.failures.pop(0)
+        FakeSMTP.sent.append(msg)
+
+    def quit(self):
+        pass
+
+    def close(self):
+        pass
+
+@pytest.fixture(autouse=True)
+def fake_smtp(monkeypatch):
+    FakeSMTP.connections, FakeSMTP.sent, FakeSMTP.failures = 0, [], []
+    monkeypatch.setattr(notify.smtplib, "SMTP", FakeSMTP)
+
+def _records(n):
+    return [{"doc_type": "invoice", "file": f"{i}.pdf", "dest": f"out/{i}.pdf"} for i in range(n)]
+
+def test_missing_credentials_fail_at_startup(monkeypatch):
+    monkeypatch.delenv("NO_SUCH_SMTP_PASS", raising=False)
+    with pytest.raises(RuntimeError, match="NO_SUCH_SMTP_PASS"):
+        Notifier({**CONF, "username": "u", "password_env": "NO_SUCH_SMTP_PASS"})
+    monkeypatch.setenv("NO_SUCH_SMTP_PASS", "secret")
+    assert Mailer({**CONF, "username": "u", "password_env": "NO_SUCH_SMTP_PASS"}).password == "secret"
+
+def test_digests_batch_over_one_connection():
+    n = Notifier({**CONF, "digest_max": 3})
+    for rec in _records(7):
+        n.add(rec)
+    n.close()
+    sizes = [int(m["Subject"].split("(")[1].split()[0]) for m in FakeSMTP.sent]
+    assert sizes == [3, 3, 1] and n.sent == 7 and n.digests == 3
+    assert FakeSMTP.connections == 1
+
+def test_digest_window_sends_without_close():
+    n = Notifier({**CONF, "digest_seconds": 0.1})
+    n.add(_records(1)[0])
+    deadline = time.time() + 5
+    while not FakeSMTP.sent and time.time() < deadline:
+        time.sleep(0.02)
+    assert n.sent == 1
+    n.close()
+
+def test_transient_failures_retry_with_backoff():
+    FakeSMTP.failures = [smtplib.SMTPResponseException(421, b"busy"), OSError("reset")]
+    n = Notifier(CONF)
+    n.add(_records(1)[0])
+    n.close()
+    assert n.sent == 1 and n.failed == 0
+    assert FakeSMTP.connections == 2  # the network error dropped the connection, the 4xx did not
+
+def test_permanent_and_exhausted_failures_drop_the_digest():
+    FakeSMTP.failures = [smtplib.SMTPResponseException(550, b"no")]
+    n = Notifier(CONF)
+    n.add(_records(1)[0])
+    n.close()
+    assert n.failed == 1 and not FakeSMTP.failures  # not retried
+    FakeSMTP.failures = [smtplib.SMTPResponseException(421, b"busy")] * 5
+    n = Notifier({**CONF, "retries": 2})
+    n.add(_records(1)[0])
+    n.close()
+    assert n.failed == 1 and len(FakeSMTP.failures) == 2  # 1 try + 2 retries
+
+def test_close_is_bounded_by_the_flush_timeout(capsys):
+    FakeSMTP.failures = [smtplib.SMTPResponseException(421, b"busy")] * 100
+    n = Notifier({**CONF, "backoff": 30, "flush_timeout": 0.2})
+    n.add(_records(1)[0])
+    t0 = time.monotonic()
+    n.close()
+    assert time.monotonic() - t0 < 5
+    assert "still pending after the flush timeout" in capsys.readouterr().err
+    n._thread.join(5)  # aborted backoff: the worker gives up
+    assert not n._thread.is_alive() and n.failed == 1
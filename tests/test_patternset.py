@@ -0,0 +1,21 @@
+import json
+from pathlib import Path
+
+from patternset import PatternSet
+
+ROOT = Path(__file__).resolve().parent.parent
+PATTERNS = json.loads((ROOT / "patterns_hu.json").read_text(encoding="utf-8"))
+
+def test_extract_pages_keeps_pattern_priority():
+    # page 1 only has the third szamlaszam pattern ("Sorszám"), page 2 the first
+    pages = ["SZÁMLA\nSorszám: S-0001\nKelt: 2025-01-02\n", "Számlaszám: INV-2025-7\nVégösszeg: 1 000 Ft\n"]
+    for fold in (False, True):
+        ps = PatternSet(PATTERNS, fold=fold)
+        values, read = ps.extract_pages(iter(pages))
+        assert values == ps.extract("".join(pages))
+        assert values["szamlaszam"] == "INV-2025-7" and read == 2
+
+def test_extract_pages_stops_once_settled():
+    ps = PatternSet({"szamlaszam": PATTERNS["szamlaszam"]}, fold=True)
+    pages = iter(["Számlaszám: INV-1\n", "Számlaszám: INV-2\n"])
+    assert ps.extract_pages(pages) == ({"szamlaszam": "INV-1"}, 1)
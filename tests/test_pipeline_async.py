@@ -0,0 +1,61 @@
+import asyncio, os, random, signal, threading, time
+from pathlib import Path
+from types import SimpleNamespace
+
+from metrics import Metrics
+from pipeline_async import Pipeline
+
+class Probe(Pipeline):
+    """Real queues, workers and reorder buffer; stages only sleep."""
+
+    def __init__(self, *a):
+        super().__init__(*a)
+        self.active = self.most_active = self.most_queued = 0
+
+    async def extract(self, item):
+        self.active += 1
+        self.most_active = max(self.most_active, self.active)
+        self.most_queued = max(self.most_queued, *(q.qsize() for q in
+                                                   (self.q_extract, self.q_analyze, self.q_route)))
+        await asyncio.sleep(random.uniform(0, 0.003))
+        self.active -= 1
+        return self.q_analyze, item
+
+    async def analyze(self, item):
+        await asyncio.sleep(random.uniform(0, 0.003))
+        seq, p = item
+        return self.q_route, (seq, p, {"doc_type": "other"}, None)
+
+def _md(routed):
+    return SimpleNamespace(analysis_opts=lambda cfg: {}, Metrics=Metrics,
+                           route_and_log=lambda p, meta, cfg, log, metrics: routed.append(p.name))
+
+def test_bounded_queues_and_input_order():
+    routed = []
+    cfg = {"pipeline": {"extract": 3, "analyze": 2, "queue_size": 2}}
+    names = [f"{i:03}.pdf" for i in range(60)]
+    pipe = Probe(_md(routed), cfg, None, Metrics())
+    asyncio.run(pipe.run([names[:25], names[25:]]))
+    assert routed == names  # out-of-order stages, routed in input order
+    assert pipe.most_active <= 3 and pipe.most_queued <= 2
+    assert pipe.metrics.counters["documents"] == 60
+
+def test_stop_waits_for_the_pending_batch_pull():
+    stop, state = threading.Event(), {}
+
+    def batches():  # like InboxWatcher.batches(): next() blocks until files or stop
+        yield ["a.pdf"]
+        os.kill(os.getpid(), signal.SIGTERM)  # the pipeline's handler calls on_stop
+        stop.wait(5)
+        time.sleep(0.2)  # still inside next() when the pipeline is told to stop
+        state["returned"] = True
+
+    async def run_then_close():
+        await pipe.run(gen, on_stop=stop.set)
+        assert state.get("returned") and not gen.gi_running
+        gen.close()  # run_continuous does this next: no "generator already executing"
+
+    gen, routed = batches(), []
+    pipe = Probe(_md(routed), {}, None, Metrics())
+    asyncio.run(run_then_close())
+    assert routed == ["a.pdf"]
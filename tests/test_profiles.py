@@ -0,0 +1,50 @@
+import json
+from pathlib import Path
+
+from patternset import PatternSet
+from profiles import ProfileStore
+
+ROOT = Path(__file__).resolve().parent.parent
+PS = PatternSet(json.loads((ROOT / "patterns_hu.json").read_text(encoding="utf-8")), fold=True)
+OWN = ["99999999-2-42"]
+# the buyer (us) comes first, as on most incoming invoices
+DOC = ("SZÁMLA\nVevő adószám: 99999999-2-42\nEladó adószám: 11111111-2-41\n"
+       "Számlaszám: INV-1\nKelt: 2025-01-02\nVégösszeg: 1 000 Ft\n")
+
+def test_learn_then_hint(tmp_path):
+    st = ProfileStore(tmp_path / "p.sqlite", "v1", OWN)
+    values, info = st.extract(PS, DOC)
+    assert values == PS.extract(DOC)
+    assert info["supplier"] == "11111111" and not info["known"]
+    values, info = st.extract(PS, DOC.replace("INV-1", "INV-2"))
+    assert values["szamlaszam"] == "INV-2"
+    assert info["known"] and info["hint_hits"] == 4 and info["hint_misses"] == 0
+    st.close()
+    # persisted: another process (same version) starts from the learned profile
+    again = ProfileStore(tmp_path / "p.sqlite", "v1", OWN)
+    assert again.get("11111111")["szamlaszam"]["pattern"] == 0
+    assert ProfileStore(tmp_path / "p.sqlite", "v2", OWN).get("11111111") == {}
+
+def test_miss_falls_back_and_relearns():
+    st = ProfileStore(":memory:", "v1", OWN)
+    st.extract(PS, DOC)
+    moved = "-\n" * 1500 + DOC  # same layout, long header: outside every hint window
+    values, info = st.extract(PS, moved)
+    assert values == PS.extract(moved)
+    assert info["hint_misses"] == 4 and info["hint_hits"] == 0
+    assert st.get("11111111")["szamlaszam"]["hi"] > 3000  # window widened
+    # another pattern now: restarts the field's region
+    other = DOC.replace("Számlaszám", "Sorszám")
+    values, info = st.extract(PS, other)
+    assert values["szamlaszam"] == "INV-1" and info["hint_misses"] == 1
+    region = st.get("11111111")["szamlaszam"]
+    assert region["pattern"] == 2 and region["lo"] == region["hi"]
+
+def test_no_own_tax_numbers_no_profile():
+    st = ProfileStore(":memory:", "v1")
+    for _ in range(2):
+        values, info = st.extract(PS, DOC)
+        assert values == PS.extract(DOC)
+        assert info["supplier"] is None and not info["known"]
+    st.flush()
+    assert st.profiles == {} and st.report() == []
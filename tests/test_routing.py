@@ -0,0 +1,118 @@
+import csv, threading, time
+
+import routing
+from routing import LogWriter, RouteIndex, route
+
+def _cfg(tmp_path, dry_run=False):
+    return {"paths": {"out_root": str(tmp_path / "out")}, "routing": {"invoices": "invoices"},
+            "run": {"dry_run": dry_run}}
+
+def _src(tmp_path, name):
+    inbox = tmp_path / "inbox"
+    inbox.mkdir(exist_ok=True)
+    p = inbox / name
+    p.write_bytes(name.encode())
+    return p
+
+META = {"issue_date": "2025-01-02", "invoice_no": "ALG 1"}
+
+def test_collisions_get_suffixes(tmp_path):
+    index, cfg = RouteIndex(), _cfg(tmp_path)
+    dests = [route(str(_src(tmp_path, f"{i}.pdf")), "invoice", META, cfg, index) for i in range(3)]
+    assert [d.rsplit("/", 1)[1] for d in dests] == \
+        ["2025-01-02_ALG_1.pdf", "2025-01-02_ALG_1__1.pdf", "2025-01-02_ALG_1__2.pdf"]
+    assert [open(d, "rb").read() for d in dests] == [b"0.pdf", b"1.pdf", b"2.pdf"]
+
+def test_suffixes_continue_across_runs(tmp_path):
+    cfg = _cfg(tmp_path)
+    for i in range(2):
+        route(str(_src(tmp_path, f"{i}.pdf")), "invoice", META, cfg, RouteIndex())
+    # a new run (new index) lists the directory and does not overwrite
+    dest = route(str(_src(tmp_path, "2.pdf")), "invoice", META, cfg, RouteIndex())
+    assert dest.endswith("2025-01-02_ALG_1__2.pdf")
+
+def test_placeholder_written_by_someone_else(tmp_path):
+    index, target = RouteIndex(), tmp_path / "out" / "invoices"
+    assert index.reserve(target, "a.pdf", claim=True).name == "a.pdf"
+    assert (target / "a.pdf").exists()  # O_EXCL placeholder, replaced by the move
+    (target / "b.pdf").write_bytes(b"other host")  # after our listing
+    assert index.reserve(target, "b.pdf", claim=True).name == "b__1.pdf"
+    assert (target / "b.pdf").read_bytes() == b"other host"
+
+def test_concurrent_reserve_never_shares_a_name(tmp_path):
+    target = tmp_path / "out" / "invoices"
+    indexes = [RouteIndex() for _ in range(4)]  # four processes sharing one directory
+    got, go = [], threading.Barrier(len(indexes))
+
+    def run(index):
+        go.wait()
+        for _ in range(25):
+            got.append(index.reserve(target, "x.pdf", claim=True).name)
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in indexes]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(got) == len(set(got)) == 100
+    assert len(list(target.iterdir())) == 100
+
+def test_dry_run_moves_and_creates_nothing(tmp_path):
+    index, cfg = RouteIndex(), _cfg(tmp_path, dry_run=True)
+    srcs = [_src(tmp_path, f"{i}.pdf") for i in range(2)]
+    dests = [route(str(s), "invoice", META, cfg, index) for s in srcs]
+    assert dests[1].endswith("__1.pdf")  # suffixes still planned within the run
+    assert all(s.exists() for s in srcs)
+    assert not list((tmp_path / "out" / "invoices").iterdir())
+
+def test_failed_move_releases_the_name(tmp_path):
+    index, cfg = RouteIndex(), _cfg(tmp_path)
+    missing = tmp_path / "inbox" / "gone.pdf"
+    try:
+        route(str(missing), "invoice", META, cfg, index)
+    except OSError:
+        pass
+    assert not list((tmp_path / "out" / "invoices").iterdir())
+    assert route(str(_src(tmp_path, "0.pdf")), "invoice", META, cfg, index).endswith("ALG_1.pdf")
+
+def _rows(path):
+    with open(path, newline="", encoding="utf-8") as f:
+        return list(csv.reader(f))
+
+def test_log_schema_stays_with_an_existing_header(tmp_path):
+    with LogWriter(tmp_path, batch=10) as w:
+        w.write({"file": "a.pdf", "doc_type": "invoice", "timings_ms": {"hash": 1}})
+    header = _rows(tmp_path / "logs" / "events.csv")[0]
+    assert "timings_ms" not in header and "dest" in header  # nested values: jsonl only
+    with LogWriter(tmp_path, batch=10) as w:  # next run: new keys are not new columns
+        w.write({"file": "b.pdf", "doc_type": "other", "new_key": "x"})
+    rows = _rows(tmp_path / "logs" / "events.csv")
+    assert rows[0] == header and len(rows) == 3 and all(len(r) == len(header) for r in rows)
+    assert (tmp_path / "logs" / "events.jsonl").read_text(encoding="utf-8").count("\n") == 2
+
+def test_log_flushes_by_count_interval_and_close(tmp_path, monkeypatch):
+    synced = []
+    real = routing.os.fsync
+    monkeypatch.setattr(routing.os, "fsync", lambda fd: (synced.append(fd), real(fd)))
+    jsonl = tmp_path / "logs" / "events.jsonl"
+    lines = lambda: jsonl.read_text(encoding="utf-8").count("\n")
+    w = LogWriter(tmp_path, batch=3, interval=3600)
+    for i in range(2):
+        w.write({"file": f"{i}.pdf"})
+    assert lines() == 0 and not synced
+    w.write({"file": "2.pdf"})  # batch full
+    assert lines() == 3 and len(synced) == 2  # csv + jsonl
+    w.interval = 0.5
+    w.write({"file": "3.pdf"})
+    w.tick()
+    assert lines() == 3  # interval not over yet
+    time.sleep(0.6)
+    w.tick()  # idle loop (watcher on_idle): interval over
+    assert lines() == 4 and len(synced) == 4
+    time.sleep(0.6)
+    w.write({"file": "4.pdf"})  # a write after the interval flushes right away
+    assert lines() == 5 and len(synced) == 6
+    w.interval = 3600
+    w.write({"file": "5.pdf"})
+    w.close()
+    assert lines() == 6 and len(synced) == 8
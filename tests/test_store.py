@@ -0,0 +1,39 @@
+import csv, io, json
+
+from store import ResultStore
+
+RECS = [
+    {"file": "a.pdf", "doc_type": "invoice", "szamlaszam": "ALG-1001", "seller_tax_id": "11111111-2-41",
+     "kibocsatas_datum": "2025.01.05", "osszeg_brutto": "12 700", "sha256": "aa", "dest": "out/invoice/a.pdf",
+     "timings_ms": {"hash": 0.1}},
+    {"file": "b.pdf", "doc_type": "invoice", "szamlaszam": "ALG-1002", "seller_tax_id": "11111111-1-13",
+     "kibocsatas_datum": "2025-02-01", "sha256": "bb", "dest": "out/invoice/b.pdf"},
+    {"file": "c.pdf", "doc_type": "other", "sha256": "cc", "dest": "out/other/c.pdf"},
+]
+
+def test_find_and_count(tmp_path):
+    with ResultStore(tmp_path / "e.sqlite") as st:
+        st.write_many(RECS)
+        assert [r["file"] for r in st.find(szamlaszam="ALG-1001")] == ["a.pdf"]
+        assert st.count(adoszam="11111111") == 2          # törzsszám: every suffix
+        assert st.count(adoszam="11111111-1-13") == 1
+        assert st.count(adoszam="11111111", date_from="2025-01-01", date_to="2025.01.31") == 1
+        assert st.count(doc_type="other") == 1 and st.count() == 3
+        assert st.find(limit=1)[0] == RECS[0]             # verbatim record, nested values too
+        assert st.routed(sha256="cc") and not st.routed(szamlaszam="ALG-9")
+
+def test_export_import_round_trip(tmp_path):
+    with ResultStore(tmp_path / "e.sqlite") as st:
+        st.write_many(RECS)
+        out = io.StringIO()
+        assert st.export(out, "jsonl") == 3
+        (tmp_path / "events.jsonl").write_text(out.getvalue(), encoding="utf-8")
+        buf = io.StringIO()
+        assert st.export(buf, "csv", doc_type="invoice") == 2
+    rows = list(csv.DictReader(io.StringIO(buf.getvalue())))
+    assert [r["szamlaszam"] for r in rows] == ["ALG-1001", "ALG-1002"]
+    assert "timings_ms" not in rows[0] and rows[1]["osszeg_brutto"] == ""
+    with ResultStore(tmp_path / "again.sqlite") as st:
+        assert st.import_jsonl(tmp_path / "events.jsonl", batch=2) == 3
+        assert st.find() == [json.loads(l) for l in out.getvalue().splitlines()] == RECS
+        assert st.count(adoszam="11111111") == 2
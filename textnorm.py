@@ -0,0 +1,139 @@
+import re, unicodedata
+
+# Accent-folded text view. fold() casefolds and strips accents ("Végösszeg",
+# "VEGÖSSZEG", "Vegosszeg" -> "vegosszeg"), so a pattern written as a plain
+# ASCII literal matches every spelling without [áa]-style classes or (?i).
+# Folded(text) keeps an offset map back to the original text so captured
+# values (names, invoice numbers) are sliced from the original, accents and
+# case intact. Text in which every character folds to exactly one character
+# (ASCII, Hungarian) maps 1:1 and carries no map at all.
+
+def strip_accents(s: str) -> str:
+    return "".join(c for c in unicodedata.normalize("NFD", s) if unicodedata.category(c) != "Mn")
+
+_NON_ASCII = re.compile(r"[^\x00-\x7f]")
+_FOLDS = {}   # non-ASCII char -> its folded form, filled as chars are seen
+
+def _fold_char(c: str) -> str:
+    f = _FOLDS.get(c)
+    if f is None:
+        f = _FOLDS[c] = strip_accents(c.casefold())
+    return f
+
+def _fold_match(m):
+    return _fold_char(m.group())
+
+def fold(s: str) -> str:
+    """Casefolded, accent-stripped s."""
+    # str.lower() covers ASCII at C speed; only the non-ASCII chars go through
+    # _fold_char (a few percent of a Hungarian text)
+    s = s.lower()
+    return s if s.isascii() else _NON_ASCII.sub(_fold_match, s)
+
+class Folded:
+    """fold(text) plus the map from folded offsets back to text."""
+    __slots__ = ("text", "folded", "offsets")
+
+    def __init__(self, text: str):
+        self.text = text
+        low = text.lower()
+        self.folded = low if low.isascii() else _NON_ASCII.sub(_fold_match, low)
+        self.offsets = None  # None: offsets are the same in both
+        if len(low) != len(text) or any(len(_fold_char(c)) != 1 for c in set(_NON_ASCII.findall(low))):
+            offsets = []  # some char folds to 0 or 2+ chars ("ß", combining marks)
+            for i, ch in enumerate(text):
+                offsets.extend([i] * len(fold(ch)))
+            offsets.append(len(text))
+            self.offsets = offsets
+
+    def span(self, start: int, end: int):
+        """Original (start, end) of folded[start:end]."""
+        if self.offsets is None:
+            return start, end
+        return self.offsets[start], self.offsets[end]
+
+    def slice(self, start: int, end: int) -> str:
+        s, e = self.span(start, end)
+        return self.text[s:e]
+
+    def group(self, m, n=0):
+        """Original text of group n of a match on .folded (None if it did not take part)."""
+        s, e = m.span(n)
+        return None if s < 0 else self.slice(s, e)
+
+    def match(self, m, vm=None):
+        return None if m is None else FoldedMatch(m, self, vm)
+
+class FoldedMatch:
+    """A match on Folded.folded that reports the original text. vm: the
+    pattern's value part matched on the original text (patternset.value_pattern);
+    groups 1.. come from it when given."""
+    __slots__ = ("m", "view", "vm")
+
+    def __init__(self, m, view, vm=None):
+        self.m, self.view, self.vm = m, view, vm
+
+    def group(self, *ns):
+        if len(ns) > 1:
+            return tuple(self.group(n) for n in ns)
+        n = ns[0] if ns else 0
+        if self.vm is None:
+            return self.view.group(self.m, n)
+        if n == 0:
+            s, e = self.span()
+            return self.view.text[s:e]
+        return self.vm.group(n)
+
+    def groups(self, default=None):
+        return tuple(default if g is None else g
+                     for g in (self.group(n) for n in range(1, self.m.re.groups + 1)))
+
+    def span(self, n=0):
+        if self.vm is not None:
+            if n != 0:
+                return self.vm.span(n)
+            return self.view.span(self.m.start(), self.m.start())[0], self.vm.end()
+        s, e = self.m.span(n)
+        return (-1, -1) if s < 0 else self.view.span(s, e)
+
+    def start(self, n=0):
+        return self.span(n)[0]
+
+    def end(self, n=0):
+        return self.span(n)[1]
+
+    @property
+    def lastindex(self):
+        return (self.m if self.vm is None else self.vm).lastindex
+
+    @property
+    def re(self):
+        return self.m.re
+
+    def __getitem__(self, n):
+        return self.group(n)
+
+_FLAGS = re.compile(r"^\(\?([aiLmsux]+)\)")
+
+def fold_pattern(src: str) -> str:
+    """Regex source rewritten for folded text: literals folded ("Számla" ->
+    "szamla"), a leading (?i) dropped. Escapes (\\S, \\D, \\W, ...) and group
+    names are kept as written."""
+    m = _FLAGS.match(src)
+    if m:
+        flags = m.group(1).replace("i", "")
+        src = (f"(?{flags})" if flags else "") + src[m.end():]
+    out, i = [], 0
+    while i < len(src):
+        c = src[i]
+        if c == "\\":
+            out.append(src[i:i + 2])
+            i += 2
+        elif src.startswith("(?P<", i) or src.startswith("(?P=", i):
+            j = src.find(">" if src[i + 3] == "<" else ")", i) + 1
+            out.append(src[i:j])
+            i = j
+        else:
+            out.append(fold(c))
+            i += 1
+    return "".join(out)
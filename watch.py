@@ -0,0 +1,123 @@
+import os, time, threading
+from pathlib import Path
+
+# inotify is optional: `pip install inotify_simple`; otherwise we poll the inbox
+try:
+    from inotify_simple import INotify, flags as _IN
+except ImportError:  # non-Linux or package not installed
+    INotify = None
+
+class InboxWatcher:
+    """Yield batches of inbox files once they are fully written.
+
+    A file is ready when its writer closed it (inotify IN_CLOSE_WRITE /
+    IN_MOVED_TO) or, when polling, when size and mtime did not change for
+    `settle` seconds. Each (name, size, mtime) is yielded once. on_idle is
+    called after every pass that found nothing (e.g. LogWriter.tick)."""
+
+    def __init__(self, inbox, pattern="*.pdf", interval=2.0, settle=1.0, use_inotify=True,
+                 on_idle=None):
+        self.inbox = Path(inbox)
+        self.pattern = pattern
+        self.interval = float(interval)
+        self.settle = float(settle)
+        self.stop_event = threading.Event()
+        self.on_idle = on_idle
+        self._seen = {}      # name -> (size, mtime) already yielded
+        self._pending = {}   # name -> ((size, mtime), first seen unchanged at)
+        self._retry = set()  # names handed back by retry(): rescanned until they leave
+        self._inotify = None
+        if use_inotify and INotify is not None:
+            try:
+                self._inotify = INotify()
+                self._inotify.add_watch(str(self.inbox), _IN.CLOSE_WRITE | _IN.MOVED_TO)
+            except OSError:  # e.g. watch limit reached, NFS
+                self._inotify = None
+
+    @property
+    def mode(self) -> str:
+        return "inotify" if self._inotify is not None else "poll"
+
+    def stop(self):
+        self.stop_event.set()
+
+    def retry(self, paths):
+        """Yield these files again on a later pass (e.g. deferred claims)."""
+        for p in paths:
+            self._seen.pop(Path(p).name, None)
+            self._retry.add(Path(p).name)
+
+    def _stat(self, p: Path):
+        try:
+            st = p.stat()
+        except FileNotFoundError:
+            return None
+        return st.st_size, st.st_mtime_ns
+
+    def _mark(self, p: Path, sig):
+        if sig is None or self._seen.get(p.name) == sig:
+            return False
+        self._seen[p.name] = sig
+        return True
+
+    def _scan(self, now):
+        """Polling readiness: unchanged size/mtime for `settle` seconds."""
+        ready = []
+        names = set()
+        for p in sorted(self.inbox.glob(self.pattern)):
+            names.add(p.name)
+            sig = self._stat(p)
+            if sig is None or self._seen.get(p.name) == sig:
+                continue
+            prev = self._pending.get(p.name)
+            if prev is None or prev[0] != sig:
+                self._pending[p.name] = (sig, now)
+            elif now - prev[1] >= self.settle and sig[0] > 0:
+                del self._pending[p.name]
+                if self._mark(p, sig):
+                    ready.append(p)
+        self._forget(names)
+        return ready
+
+    def _forget(self, names=None):
+        # drop files that left the inbox (routed away) so a re-drop is processed
+        if names is None:
+            names = {p.name for p in self.inbox.glob(self.pattern)}
+        for d in (self._seen, self._pending):
+            for name in [n for n in d if n not in names]:
+                del d[name]
+        self._retry &= names
+
+    def _events(self):
+        ready = []
+        for ev in self._inotify.read(timeout=int(self.interval * 1000)):
+            p = self.inbox / ev.name
+            if ev.name and p.match(self.pattern) and self._mark(p, self._stat(p)):
+                ready.append(p)
+        return ready
+
+    def batches(self):
+        # files already sitting in the inbox go through the polling settle check
+        startup = time.monotonic() + self.settle
+        while not self.stop_event.is_set():
+            now = time.monotonic()
+            if self._inotify is not None:
+                batch = self._events()
+                if now <= startup + self.interval or self._retry:
+                    batch += [p for p in self._scan(now) if p not in batch]
+            else:
+                batch = self._scan(now)
+            if batch:
+                yield batch
+                continue
+            if self.on_idle is not None:
+                self.on_idle()
+            if self._inotify is None:
+                self.stop_event.wait(self.interval)
+            else:
+                self._forget()
+
+    def close(self):
+        if self._inotify is not None:
+            self._inotify.close()
+            self._inotify = None